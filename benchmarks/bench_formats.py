@@ -0,0 +1,85 @@
+"""Compare file size and save/load time of the data file formats
+
+Usage: python benchmarks/bench_formats.py [--years 1 10 50] [--repeat 3]
+
+Formats compared:
+    pretty   indented JSON with checksum (the default 'json' format)
+    minified JSON without indentation or spaces
+    compact  the binary format of financial_tracker/codec.py
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from financial_tracker.atomic import decode_snapshot, encode_snapshot  # noqa: E402
+from financial_tracker.synthetic import generate  # noqa: E402
+
+
+def encode_minified(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_minified(raw: bytes) -> dict:
+    return json.loads(raw.decode('utf-8'))
+
+
+FORMATS = {
+    'pretty': (lambda data: encode_snapshot(data, 'json'), decode_snapshot),
+    'minified': (encode_minified, decode_minified),
+    'compact': (lambda data: encode_snapshot(data, 'compact'), decode_snapshot),
+}
+
+
+def best_time(func, repeat: int) -> float:
+    """Fastest of `repeat` runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(years_list, repeat: int):
+    results = []
+    for years in years_list:
+        data = generate(years=years)
+        for name, (encode, decode) in FORMATS.items():
+            raw = encode(data)
+            assert decode(raw)['monthly_data'] == data['monthly_data']
+            results.append({
+                'years': years,
+                'format': name,
+                'bytes': len(raw),
+                'save_ms': best_time(lambda: encode(data), repeat) * 1000,
+                'load_ms': best_time(lambda: decode(raw), repeat) * 1000
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.years, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'years':>5}  {'format':<9}{'size KB':>10}{'save ms':>10}{'load ms':>10}")
+    for row in results:
+        print(f"{row['years']:>5}  {row['format']:<9}{row['bytes'] / 1024:>10.1f}"
+              f"{row['save_ms']:>10.1f}{row['load_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Benchmark the ledger hot paths on synthetic data
+
+Usage: python benchmarks/bench_ledger.py [--years 1 10] [--expenses 30]
+                                         [--modes json journal sharded sqlite]
+                                         [--runs 50] [--output results.json]
+
+For every dataset size and storage mode it measures:
+
+    load        store.load() + Ledger() (what load_data does at startup)
+    save        change one month, commit it and write the changed months
+    navigate    commit the current month and open the next one
+    totals      calculate_totals of an open month
+    recur_add   add an indefinite recurring expense (creates a rule)
+    recur_stop  turn its recurrence off again (ends the rule)
+
+and reports throughput, latency percentiles and the peak Python memory
+(tracemalloc, measured in a separate pass so it does not slow the timing).
+--output writes everything as JSON for tracking regressions.
+"""
+
+import argparse
+import copy
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from financial_tracker import Ledger, create_store  # noqa: E402
+from financial_tracker.synthetic import generate, make_indefinite  # noqa: E402
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies) -> dict:
+    """Throughput and latency statistics of a list of durations in seconds"""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'runs': len(ordered),
+        'ops_per_sec': len(ordered) / total if total > 0 else None,
+        'mean_ms': total / len(ordered) * 1000,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': ordered[-1] * 1000
+    }
+
+
+class Scenario:
+    """Fixture shared by the operations of one dataset and storage mode"""
+
+    def __init__(self, data, mode: str, directory: Path, seed: int = 7):
+        self.mode = mode
+        self.data_file = directory / 'financial_data.json'
+        self.rng = random.Random(seed)
+        self.keys = sorted(data['monthly_data'])
+
+        store = create_store(self.data_file, mode)
+        store.import_data(copy.deepcopy(data))
+        store.close()
+
+        self.store = create_store(self.data_file, mode)
+        self.ledger = Ledger.from_store(self.store)
+        self.month = self.ledger.open_month(self.keys[0])
+        self.position = 0
+
+    def close(self):
+        self.store.close()
+
+    def random_key(self) -> str:
+        return self.rng.choice(self.keys)
+
+    def load(self):
+        store = create_store(self.data_file, self.mode)
+        Ledger.from_store(store)
+        store.close()
+
+    def save(self):
+        month = self.ledger.open_month(self.random_key())
+        if month.expenses:
+            index = self.rng.randrange(len(month.expenses))
+            expense = dict(month.expenses[index])
+            expense['status'] = self.rng.choice(['Achitat', 'Neachitat', 'Rezervat'])
+            self.ledger.update_expense(month, index, expense)
+        self.ledger.commit_month(month)
+        self.ledger.save(self.store)
+
+    def navigate(self):
+        self.ledger.commit_month(self.month)
+        self.position = (self.position + 1) % len(self.keys)
+        self.month = self.ledger.open_month(self.keys[self.position])
+
+    def totals(self):
+        self.ledger.calculate_totals(self.month)
+
+    def recurring(self):
+        """Add and stop a recurring expense, return both durations"""
+        month = self.ledger.open_month(self.random_key())
+        expense = make_indefinite(self.rng, f"Bench {self.rng.random()}")
+
+        start = time.perf_counter()
+        self.ledger.add_expense(month, expense)
+        added = time.perf_counter()
+        stopped = dict(expense, recurring_indefinite=False, is_indefinite_recurring=False)
+        self.ledger.update_expense(month, len(month.expenses) - 1, stopped)
+        end = time.perf_counter()
+        return added - start, end - added
+
+
+def time_operation(func, runs: int):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def peak_memory_kb(func) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_dataset(data, years: int, mode: str, runs: int):
+    directory = Path(tempfile.mkdtemp(prefix='ft-bench-'))
+    scenario = Scenario(data, mode, directory)
+    results = []
+    try:
+        # The first load also warms up the OS file cache
+        scenario.load()
+        operations = [
+            ('load', scenario.load, max(runs // 10, 3)),
+            ('save', scenario.save, runs),
+            ('navigate', scenario.navigate, runs),
+            ('totals', scenario.totals, runs * 10),
+        ]
+        for name, func, count in operations:
+            row = {'operation': name, 'years': years, 'mode': mode}
+            row.update(summarize(time_operation(func, count)))
+            row['peak_kb'] = peak_memory_kb(func)
+            results.append(row)
+
+        pairs = [scenario.recurring() for _ in range(runs)]
+        peak = peak_memory_kb(scenario.recurring)
+        for name, latencies in (('recur_add', [pair[0] for pair in pairs]),
+                                ('recur_stop', [pair[1] for pair in pairs])):
+            row = {'operation': name, 'years': years, 'mode': mode}
+            row.update(summarize(latencies))
+            row['peak_kb'] = peak
+            results.append(row)
+    finally:
+        scenario.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--expenses', type=int, default=30, help="expenses per month")
+    parser.add_argument('--modes', nargs='+', default=['json', 'journal', 'sharded', 'sqlite'])
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for years in args.years:
+        data = generate(years=years, expenses_per_month=args.expenses, seed=args.seed)
+        for mode in args.modes:
+            results.extend(run_dataset(data, years, mode, args.runs))
+
+    print(f"{'years':>5}  {'mode':<8}{'operation':<11}{'ops/s':>10}{'p50 ms':>9}"
+          f"{'p95 ms':>9}{'p99 ms':>9}{'peak KB':>10}")
+    for row in results:
+        print(f"{row['years']:>5}  {row['mode']:<8}{row['operation']:<11}"
+              f"{row['ops_per_sec'] or 0:>10.0f}{row['p50_ms']:>9.3f}{row['p95_ms']:>9.3f}"
+              f"{row['p99_ms']:>9.3f}{row['peak_kb']:>10.0f}")
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'args': vars(args)
+            },
+            'results': results
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
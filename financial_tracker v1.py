@@ -1,13 +1,274 @@
-import json
-import os
-from datetime import datetime, timedelta
-from typing import Dict, List
+import re
+from datetime import datetime
+from typing import Dict
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from calendar import monthrange, month_name
-import locale
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from calendar import month_name
+import queue
 from pathlib import Path
 
+from financial_tracker import CorruptDataError, JournalStore, SaveWorker, instrument, open_store
+from financial_tracker import categorize
+from financial_tracker.analytics import report
+from financial_tracker.exporters import export
+from financial_tracker.importers import StatementError, import_file
+from financial_tracker.ledger import Ledger
+from financial_tracker.locking import ConflictError
+from financial_tracker.undo import UndoError, UndoHistory
+
+# How often to look for changes saved by other windows or programs
+SYNC_INTERVAL_MS = 2000
+
+class TreeSync:
+    """Keep a Treeview in step with a list of dicts, touching only changed rows
+    
+    Every dict gets a stable Treeview item for as long as it is in the
+    list (items are matched by identity, not by position). `sync()` renders
+    each dict with `render` and then deletes, inserts or moves only the
+    rows that changed position and rewrites only the cells whose text
+    changed, e.g. just the translated columns after a language switch.
+    """
+    
+    def __init__(self, tree, render):
+        self.tree = tree
+        self.render = render
+        # id(item) -> [item, item id in the tree, rendered values]
+        self._rows = {}
+        # ids in the order of the rows in the tree
+        self._order = []
+    
+    def sync(self, items):
+        """Update the tree so it shows the given items in this order"""
+        tree = self.tree
+        keys = [id(item) for item in items]
+        
+        wanted = set(keys)
+        if len(wanted) != len(keys):
+            # The same dict twice cannot have two stable rows; start over
+            self.clear()
+        for key in self._order:
+            if key not in wanted:
+                tree.delete(self._rows.pop(key)[1])
+        order = [key for key in self._order if key in self._rows]
+        
+        for index, item in enumerate(items):
+            key = keys[index]
+            values = self.render(item)
+            row = self._rows.get(key)
+            if row is None:
+                iid = tree.insert('', index, values=values)
+                self._rows[key] = [item, iid, values]
+                order.insert(index, key)
+                continue
+            
+            if order[index] != key:
+                tree.move(row[1], '', index)
+                order.remove(key)
+                order.insert(index, key)
+            
+            if row[2] != values:
+                for column, (old, new) in enumerate(zip(row[2], values)):
+                    if old != new:
+                        tree.set(row[1], column, new)
+                row[2] = values
+        
+        self._order = order
+    
+    def clear(self):
+        """Remove every row"""
+        for key in self._order:
+            self.tree.delete(self._rows[key][1])
+        self._rows = {}
+        self._order = []
+
+
+class ExpenseListView:
+    """Expense table that switches to a virtual list for very long months
+    
+    Rows are shown in the order of `items`, or sorted in Python by the
+    column whose heading was clicked last (click again to reverse). Up to
+    VIRTUAL_THRESHOLD rows are kept in the Treeview through TreeSync.
+    Above that the Treeview only holds as many items as it has visible
+    lines; they are refilled from the list as the scrollbar, mouse wheel or
+    arrow keys move the window, so memory and render time do not depend on
+    the number of expenses.
+    """
+    
+    VIRTUAL_THRESHOLD = 500
+    WHEEL_ROWS = 3
+    
+    def __init__(self, tree, scrollbar, render, sort_key=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.render = render
+        self.sort_key = sort_key or (lambda item, column: render(item)[column])
+        self.sync_view = TreeSync(tree, render)
+        
+        self.items = []
+        # display position -> index in items
+        self.order = []
+        self.sort_column = None
+        self.sort_reverse = False
+        
+        self.virtual = False
+        self.offset = 0
+        self._pool = []
+        self._pool_values = []
+        # The selected dict in virtual mode, kept while it is scrolled away
+        self._selected_item = None
+        
+        for column, name in enumerate(tree['columns']):
+            tree.heading(name, command=lambda column=column: self.sort_by(column))
+        tree.bind('<<TreeviewSelect>>', self._on_select, add='+')
+        tree.bind('<MouseWheel>', self._on_wheel, add='+')
+        tree.bind('<Button-4>', self._on_wheel, add='+')
+        tree.bind('<Button-5>', self._on_wheel, add='+')
+        tree.bind('<Up>', lambda event: self._on_arrow(-1), add='+')
+        tree.bind('<Down>', lambda event: self._on_arrow(1), add='+')
+    
+    def sync(self, items):
+        """Show the given list of expenses"""
+        self.items = items
+        order = list(range(len(items)))
+        if self.sort_column is not None:
+            order.sort(key=lambda index: self.sort_key(items[index], self.sort_column),
+                       reverse=self.sort_reverse)
+        self.order = order
+        
+        virtual = len(items) > self.VIRTUAL_THRESHOLD
+        if virtual != self.virtual:
+            self._set_virtual(virtual)
+        
+        if self.virtual:
+            self._render_window()
+        else:
+            self.sync_view.sync([items[index] for index in order])
+    
+    def sort_by(self, column):
+        """Sort by a column, reversing the order when it is already sorted by it"""
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self.sync(self.items)
+    
+    def selected_index(self):
+        """Index in items of the selected expense, or None"""
+        if self.virtual:
+            for index, item in enumerate(self.items):
+                if item is self._selected_item:
+                    return index
+            return None
+        
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        return self.order[self.tree.index(selection[0])]
+    
+    def _set_virtual(self, virtual):
+        """Move between the plain and the virtual representation"""
+        if virtual:
+            self.sync_view.clear()
+            self.tree.configure(yscrollcommand='')
+            self.scrollbar.configure(command=self.yview)
+            self.offset = 0
+        else:
+            for iid in self._pool:
+                self.tree.delete(iid)
+            self._pool = []
+            self._pool_values = []
+            self._selected_item = None
+            self.tree.configure(yscrollcommand=self.scrollbar.set)
+            self.scrollbar.configure(command=self.tree.yview)
+        self.virtual = virtual
+    
+    def _window_size(self):
+        return min(int(self.tree.cget('height')), len(self.order))
+    
+    def _render_window(self):
+        """Fill the visible rows from the list starting at self.offset"""
+        tree = self.tree
+        total = len(self.order)
+        size = self._window_size()
+        self.offset = max(0, min(self.offset, total - size))
+        
+        while len(self._pool) < size:
+            self._pool.append(tree.insert('', 'end', values=()))
+            self._pool_values.append(None)
+        while len(self._pool) > size:
+            tree.delete(self._pool.pop())
+            self._pool_values.pop()
+        
+        selected_iid = None
+        for row in range(size):
+            item = self.items[self.order[self.offset + row]]
+            values = self.render(item)
+            if values != self._pool_values[row]:
+                tree.item(self._pool[row], values=values)
+                self._pool_values[row] = values
+            if item is self._selected_item:
+                selected_iid = self._pool[row]
+        
+        if selected_iid is not None:
+            if tree.selection() != (selected_iid,):
+                tree.selection_set(selected_iid)
+        elif tree.selection():
+            tree.selection_remove(tree.selection())
+        
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + size) / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def yview(self, *args):
+        """Scrollbar command in virtual mode"""
+        total = len(self.order)
+        if args[0] == 'moveto':
+            self.offset = int(round(float(args[1]) * total))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= max(self._window_size() - 1, 1)
+            self.offset += amount
+        self._render_window()
+    
+    def _on_wheel(self, event):
+        if not self.virtual:
+            return None
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.offset -= self.WHEEL_ROWS
+        else:
+            self.offset += self.WHEEL_ROWS
+        self._render_window()
+        return 'break'
+    
+    def _on_select(self, event):
+        if not self.virtual:
+            return
+        selection = self.tree.selection()
+        # An empty selection also comes from scrolling the row out of view
+        if selection and selection[0] in self._pool:
+            row = self._pool.index(selection[0])
+            self._selected_item = self.items[self.order[self.offset + row]]
+    
+    def _on_arrow(self, step):
+        """Scroll when the arrow keys would leave the visible rows"""
+        if not self.virtual or not self._pool:
+            return None
+        selection = self.tree.selection()
+        edge = self._pool[-1] if step > 0 else self._pool[0]
+        if not selection or selection[0] != edge:
+            return None
+        position = self.offset + (len(self._pool) - 1 if step > 0 else 0) + step
+        if not 0 <= position < len(self.order):
+            return 'break'
+        self._selected_item = self.items[self.order[position]]
+        self.offset += step
+        self._render_window()
+        return 'break'
+
+
 class FinancialTrackerGUI:
     def __init__(self, root):
         self.root = root
@@ -17,7 +278,24 @@ class FinancialTrackerGUI:
         # Use user's home directory for data file
         home_dir = Path.home()
         self.data_file = home_dir / 'financial_data.json'
-        self.data = self.load_data()
+        self.store = open_store(self.data_file)
+        
+        # All month and expense logic lives in the headless ledger engine
+        self.ledger = Ledger(self.load_data())
+        self.data = self.ledger.data
+        # Every change can be taken back, also after moving to another month
+        self.ledger.history = UndoHistory()
+        if self.ledger.migrated_rules:
+            print("Converted recurring expenses to rules stored with their months")
+        
+        # Disk writes happen on a background thread. Its results go through a
+        # queue polled with root.after: the worker must never call into Tk
+        # itself, or closing the window while it writes could deadlock
+        self.save_results = queue.Queue()
+        self.save_worker = SaveWorker(self.store, on_done=self.save_results.put)
+        self._save_check_id = None
+        self._sync_check_id = None
+        self._closing = False
         
         # Language translations
         self.translations = {
@@ -30,6 +308,9 @@ class FinancialTrackerGUI:
                 'add_expense': 'Adaugă Cheltuială',
                 'delete_expense': 'Șterge Cheltuială',
                 'duplicate_expense': 'Duplică Cheltuială',
+                'import_statement': 'Importă Extras',
+                'category_rules': 'Reguli Categorii',
+                'export': 'Exportă',
                 'income': 'Venituri',
                 'monthly_income': 'Venitul Lunar:',
                 'update': 'Actualizează',
@@ -97,6 +378,9 @@ class FinancialTrackerGUI:
                 'add_expense': 'Add Expense',
                 'delete_expense': 'Delete Expense',
                 'duplicate_expense': 'Duplicate Expense',
+                'import_statement': 'Import Statement',
+                'category_rules': 'Category Rules',
+                'export': 'Export',
                 'income': 'Income',
                 'monthly_income': 'Monthly Income:',
                 'update': 'Update',
@@ -157,102 +441,197 @@ class FinancialTrackerGUI:
             }
         }
         
+        # Categories can be searched by their name in either language
+        self.ledger.search_index.set_synonyms(
+            {key: [self.translations[lang]['categories'][key] for lang in self.translations]
+             for key in self.translations['en']['categories']})
+        
         # Current settings
         self.current_date = datetime.now()
         self.language = tk.StringVar(value='ro')
         self.currency = tk.StringVar(value='LEI')
         
-        # Initialize monthly data structure
-        if 'monthly_data' not in self.data:
-            self.data['monthly_data'] = {}
-        
         # Load current month data or create new
         self.load_current_month()
         
         self.setup_ui()
         self.update_displays()
+        
+        # Other windows or programs may save the same data file
+        self._sync_check_id = self.root.after(SYNC_INTERVAL_MS, self.poll_other_processes)
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def load_data(self) -> Dict:
-        """Load data from JSON file or create default structure"""
+        """Load data from the configured store (the default structure when there is none)
+
+        Quits when the data exists but cannot be read: starting with empty
+        data would overwrite it with the first save.
+        """
         try:
-            if self.data_file.exists():
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            with instrument.timer('store.load'):
+                return self.store.load()
+        except CorruptDataError as e:
+            message = f"Datele nu au putut fi citite:\n{e}"
         except Exception as e:
             print(f"Error loading data: {e}")
+            message = f"Eroare la încărcarea datelor: {e}"
         
-        return {
-            'monthly_data': {},
-            'settings': {
-                'language': 'ro',
-                'currency': 'LEI'
-            }
-        }
+        # Never start silently with empty data: the user has to know
+        messagebox.showerror("Eroare", message + "\n\nAplicația se va închide.")
+        self.store.close()
+        self.root.destroy()
+        raise SystemExit(1)
     
     def save_data(self):
-        """Save data to JSON file"""
+        """Queue the changed months for writing on the background save thread"""
         try:
             # Save current month data
             self.save_current_month_data()
             
+            # Take in what others saved first, so this save does not conflict
+            if self.sync_with_disk():
+                self.load_current_month()
+            
             # Ensure the parent directory exists
             self.data_file.parent.mkdir(parents=True, exist_ok=True)
             
-            # Write to file with UTF-8 encoding
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            # Capture the changed months now; the disk I/O happens later
+            self.save_worker.submit(self.ledger.prepare_save(self.store))
+            self.schedule_save_check()
             
             return True
-        except PermissionError:
+        except Exception as e:
+            messagebox.showerror("Eroare", f"Eroare la salvarea datelor: {e}")
+            return False
+    
+    def schedule_save_check(self):
+        """Look for finished background saves shortly"""
+        if self._save_check_id is None:
+            self._save_check_id = self.root.after(200, self.check_save_results)
+    
+    def check_save_results(self):
+        """Report results of background saves, return False if one failed"""
+        if self._save_check_id is not None:
+            self.root.after_cancel(self._save_check_id)
+            self._save_check_id = None
+        
+        ok = True
+        while True:
+            try:
+                error = self.save_results.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(error, ConflictError):
+                self.resave_after_conflict()
+            elif error is not None:
+                ok = False
+                self.handle_save_error(error)
+        
+        if self.save_worker.busy():
+            self.schedule_save_check()
+        return ok
+    
+    def handle_save_error(self, error):
+        """Tell the user about a failed background save"""
+        if isinstance(error, PermissionError):
             messagebox.showerror("Eroare de Permisiuni", 
                                f"Nu am permisiunea să salvez fișierul în:\n{self.data_file}\n\n"
                                f"Încerc să salvez în directorul curent...")
             try:
                 fallback_file = Path('financial_data.json')
-                with open(fallback_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.data, f, indent=2, ensure_ascii=False)
+                fallback_store = JournalStore(fallback_file)
+                fallback_store.compact(self.data)
+                
+                self.save_worker.close()
+                self.store.close()
+                self.store = fallback_store
+                self.save_worker = SaveWorker(self.store, on_done=self.save_results.put)
                 self.data_file = fallback_file
+                self.ledger.dirty_months.clear()
                 messagebox.showinfo("Succes", f"Date salvate în: {fallback_file.absolute()}")
-                return True
             except Exception as e2:
                 messagebox.showerror("Eroare", f"Nu pot salva datele: {e2}")
-                return False
+        else:
+            messagebox.showerror("Eroare", f"Eroare la salvarea datelor: {error}")
+    
+    def resave_after_conflict(self):
+        """Save again after another window or program saved first"""
+        if self.sync_with_disk():
+            self.load_current_month()
+            self.update_displays()
+        if not self._closing:
+            self.save_data()
+            return
+        try:
+            self.ledger.save(self.store)
         except Exception as e:
             messagebox.showerror("Eroare", f"Eroare la salvarea datelor: {e}")
+    
+    def sync_with_disk(self):
+        """Take in what other windows or programs saved
+        
+        Returns True when the open month changed and has to be loaded again.
+        """
+        try:
+            result = self.ledger.sync(self.store)
+        except Exception as e:
+            print(f"Error reading changes saved elsewhere: {e}")
             return False
+        
+        if result['months'] or result['keys']:
+            print(f"Changed elsewhere: {', '.join(result['months'] + result['keys'])}")
+        if result['conflicts']:
+            ro = self.language.get() == 'ro'
+            names = ', '.join(result['conflicts'])
+            messagebox.showwarning("Atenție" if ro else "Warning",
+                                   f"Au fost modificate și în altă fereastră: {names}.\n"
+                                   f"Se păstrează modificările de aici." if ro else
+                                   f"Also changed in another window: {names}.\n"
+                                   f"The changes made here are kept.")
+        if result['unsaved'] and not self._closing:
+            self.save_worker.submit(self.ledger.prepare_save(self.store))
+            self.schedule_save_check()
+        
+        return self.month.key in result['months'] or 'recurring_rules' in result['keys']
+    
+    def poll_other_processes(self):
+        """Show what other windows or programs saved, checked every few seconds"""
+        self._sync_check_id = self.root.after(SYNC_INTERVAL_MS, self.poll_other_processes)
+        # Never change the data under an open dialog
+        if self.root.grab_current() is not None or not self.store.changed_elsewhere():
+            return
+        # Edits of the open month become a conflict instead of being lost
+        self.save_current_month_data()
+        if self.sync_with_disk():
+            self.load_current_month()
+            self.update_displays()
+    
+    def on_close(self):
+        """Finish pending saves before closing the window"""
+        if self._sync_check_id is not None:
+            self.root.after_cancel(self._sync_check_id)
+            self._sync_check_id = None
+        self._closing = True
+        self.save_worker.close()
+        self.check_save_results()
+        self.store.close()
+        self.root.destroy()
     
     def get_month_key(self):
         """Get the key for current month"""
         return f"{self.current_date.year}_{self.current_date.month:02d}"
     
+    @instrument.timed('gui.load_month')
     def load_current_month(self):
         """Load data for current month"""
         month_key = self.get_month_key()
         print(f"Loading month: {month_key}")
         
-        if month_key in self.data.get('monthly_data', {}):
-            month_data = self.data['monthly_data'][month_key]
-            self.current_month_data = month_data
-            print(f"Loaded existing month data with {len(month_data.get('expenses', []))} expenses")
-            
-            # Check if we need to add indefinite recurring expenses
-            # (in case they were added to previous month after this month was created)
-            self.check_and_add_indefinite_recurring()
-        else:
-            print(f"Month {month_key} doesn't exist, creating new")
-            # Create new month data
-            self.current_month_data = {
-                'income': {'monthly_income': 2000.0},
-                'expenses': [],
-                'family_income': [],
-                'other_income': [],
-                'meal_tickets': {'worked_days': 20, 'value_per_day': 35.0}
-            }
-            
-            # Check for indefinite recurring expenses from previous month
-            self.copy_indefinite_recurring_expenses()
-            
-            print(f"After copying recurring: {len(self.current_month_data['expenses'])} expenses")
+        # One-off expenses of the month followed by the recurring ones
+        self.month = self.ledger.open_month(month_key)
+        self.current_month_data = self.month.data
+        print(f"Loaded month data with {len(self.month.expenses)} expenses")
     
     
     def show_about(self):
@@ -281,106 +660,85 @@ class FinancialTrackerGUI:
             messagebox.showinfo("About", about_text)
 
  
-    def check_and_add_indefinite_recurring(self):
-        """Check if we need to add indefinite recurring expenses to existing month"""
-        # Get previous month
-        if self.current_date.month == 1:
-            prev_month = 12
-            prev_year = self.current_date.year - 1
-        else:
-            prev_month = self.current_date.month - 1
-            prev_year = self.current_date.year
+    def export_history(self):
+        """Export all months (or a range) to CSV or columnar files"""
+        ro = self.language.get() == 'ro'
+        self.save_current_month_data()
         
-        prev_month_key = f"{prev_year}_{prev_month:02d}"
+        months = sorted(self.data['monthly_data'])
+        dialog = ExportDialog(self.root, self.language.get(),
+                              months[0] if months else '', months[-1] if months else '')
+        if not dialog.result:
+            return
         
-        print(f"Checking existing month for missing recurring from {prev_month_key}")
+        directory = filedialog.askdirectory(title="Alegeți dosarul" if ro else "Choose a folder")
+        if not directory:
+            return
         
-        if prev_month_key in self.data.get('monthly_data', {}):
-            prev_month_data = self.data['monthly_data'][prev_month_key]
-            
-            # Get names of expenses already in current month
-            current_expense_names = {exp['name'] for exp in self.current_month_data.get('expenses', [])}
-            
-            # Check for indefinite recurring that aren't already here
-            added_count = 0
-            for expense in prev_month_data.get('expenses', []):
-                if (expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring')) and \
-                   expense['name'] not in current_expense_names:
-                    # Create a copy and add it
-                    expense_copy = expense.copy()
-                    self.current_month_data['expenses'].append(expense_copy)
-                    added_count += 1
-                    print(f"Added missing recurring expense: {expense['name']}")
-            
-            if added_count > 0:
-                print(f"Added {added_count} recurring expenses to existing month")
-                # Save the updated month data
-                self.save_current_month_data()
-                self.save_data()
-    
-    def copy_indefinite_recurring_expenses(self):
-        """Copy indefinite recurring expenses from previous month"""
-        if self.current_date.month == 1:
-            prev_month = 12
-            prev_year = self.current_date.year - 1
-        else:
-            prev_month = self.current_date.month - 1
-            prev_year = self.current_date.year
+        try:
+            counts = export(self.data, directory, dialog.result['fmt'],
+                            start=dialog.result['start'], end=dialog.result['end'])
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Eroare" if ro else "Error",
+                                 f"Exportul a eșuat:\n{e}" if ro else f"The export failed:\n{e}")
+            return
+        
+        summary = '\n'.join(f"{table}: {count}" for table, count in counts.items())
+        messagebox.showinfo("Succes" if ro else "Success",
+                            f"Exportat în {directory}:\n{summary}" if ro
+                            else f"Exported to {directory}:\n{summary}")
+    
+    def show_analytics(self):
+        """Show yearly and monthly totals of all saved months"""
+        # Include the changes of the month on screen
+        self.save_current_month_data()
+        AnalyticsWindow(self.root, self.language.get(), self.ledger, self.analytics_label)
+    
+    def analytics_label(self, group, label):
+        """Text shown for a status, category or credit type in the analytics"""
+        if group == 'status':
+            return self.t({'paid': 'achitat', 'unpaid': 'neachitat', 'reserved': 'reserved'}[label])
+        names = self.t('categories' if group == 'category' else 'credit_types')
+        return names.get(label, label)
+    
+    def show_search(self):
+        """Search expenses and incomes of all saved months"""
+        # Include the changes of the month on screen
+        self.save_current_month_data()
+        SearchWindow(self.root, self.language.get(), self.ledger.search_index,
+                     self.t('categories'), self.t('months'), self.go_to_month)
+    
+    @instrument.timed('gui.navigate')
+    def go_to_month(self, month_key):
+        """Show the month with the given YYYY_MM key"""
+        self.save_current_month_data()
+        year, month = month_key.split('_')
+        self.current_date = self.current_date.replace(year=int(year), month=int(month), day=1)
         
-        prev_month_key = f"{prev_year}_{prev_month:02d}"
+        month_name = self.t('months')[self.current_date.month - 1]
+        self.date_label.config(text=f"{month_name} {self.current_date.year}")
         
-        if prev_month_key in self.data.get('monthly_data', {}):
-            prev_month_data = self.data['monthly_data'][prev_month_key]
-            
-            for expense in prev_month_data.get('expenses', []):
-                if expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring'):
-                    expense_copy = expense.copy()
-                    self.current_month_data['expenses'].append(expense_copy)
-    
-    def remove_recurring_from_future_months(self, expense_name):
-        """Remove recurring expense from all future months"""
-        current = self.current_date
-        
-        print(f"Removing recurring expense '{expense_name}' from future months")
-        removed_count = 0
-        
-        # Check next 24 months (2 years ahead)
-        for i in range(1, 25):
-            if current.month + i > 12:
-                next_month = (current.month + i - 1) % 12 + 1
-                next_year = current.year + ((current.month + i - 1) // 12)
-            else:
-                next_month = current.month + i
-                next_year = current.year
-            
-            month_key = f"{next_year}_{next_month:02d}"
-            
-            if month_key in self.data.get('monthly_data', {}):
-                month_data = self.data['monthly_data'][month_key]
-                
-                # Find and remove expenses with matching name that have recurring flag
-                expenses_to_remove = []
-                for idx, exp in enumerate(month_data.get('expenses', [])):
-                    if exp['name'] == expense_name and \
-                       (exp.get('recurring_indefinite') or exp.get('is_indefinite_recurring') or 
-                        exp.get('recurring_months') or exp.get('auto_add')):
-                        expenses_to_remove.append(idx)
-                
-                # Remove in reverse order to maintain indices
-                for idx in reversed(expenses_to_remove):
-                    month_data['expenses'].pop(idx)
-                    removed_count += 1
-                    print(f"Removed from {month_key}")
-        
-        if removed_count > 0:
-            print(f"Total removed: {removed_count} instances")
-            self.save_data()
+        self.sync_with_disk()
+        self.load_current_month()
+        self.update_displays()
+    
+    def show_diagnostics(self):
+        """Show the timings and counters of the running application"""
+        DiagnosticsWindow(self.root, self.language.get(), self.diagnostics_context)
     
+    def diagnostics_context(self) -> Dict:
+        """Facts about the data that are written next to the measurements"""
+        return {
+            'data_file': str(self.data_file.absolute()),
+            'store': type(self.store).__name__,
+            'months': len(self.data['monthly_data']),
+            'recurring_rules': len(self.data.get('recurring_rules', {})),
+            'current_month_expenses': len(self.month.expenses)
+        }
+ 
     def save_current_month_data(self):
         """Save current month data to main data structure"""
-        month_key = self.get_month_key()
-        self.data['monthly_data'][month_key] = self.current_month_data.copy()
-        self.data['monthly_data'][month_key]['saved_at'] = datetime.now().isoformat()
+        self.ledger.commit_month(self.month)
     
     def t(self, key):
         """Get translation for current language"""
@@ -430,6 +788,31 @@ class FinancialTrackerGUI:
         about_btn = ttk.Button(top_bar, text="?", width=3, command=self.show_about)
         about_btn.pack(side=tk.RIGHT, padx=5)
         
+        # Diagnostics window with the measured timings
+        diagnostics_btn = ttk.Button(top_bar, text="⏱", width=3, command=self.show_diagnostics)
+        diagnostics_btn.pack(side=tk.RIGHT)
+        
+        # Export of the whole history
+        self.export_btn = ttk.Button(top_bar, text=self.t('export'), command=self.export_history)
+        self.export_btn.pack(side=tk.RIGHT)
+        
+        # Search in all saved months
+        search_btn = ttk.Button(top_bar, text="🔍", width=3, command=self.show_search)
+        search_btn.pack(side=tk.RIGHT)
+        
+        # Undo and redo of the last changes (Ctrl+Z, Ctrl+Y)
+        redo_btn = ttk.Button(top_bar, text="↷", width=3, command=self.redo)
+        redo_btn.pack(side=tk.RIGHT)
+        undo_btn = ttk.Button(top_bar, text="↶", width=3, command=self.undo)
+        undo_btn.pack(side=tk.RIGHT, padx=(5, 0))
+        self.root.bind('<Control-z>', lambda e: self.undo())
+        self.root.bind('<Control-y>', lambda e: self.redo())
+        self.root.bind('<Control-Z>', lambda e: self.redo())
+        
+        # Analytics over all saved months
+        analytics_btn = ttk.Button(top_bar, text="📊", width=3, command=self.show_analytics)
+        analytics_btn.pack(side=tk.RIGHT, padx=5)
+        
         # Main container
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -459,6 +842,8 @@ class FinancialTrackerGUI:
         
         scrollbar = ttk.Scrollbar(self.left_panel, orient=tk.VERTICAL, command=self.expense_tree.yview)
         self.expense_tree.configure(yscroll=scrollbar.set)
+        self.expense_view = ExpenseListView(self.expense_tree, scrollbar, self.expense_row_values,
+                                            self.expense_sort_key)
         
         self.expense_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
@@ -473,6 +858,10 @@ class FinancialTrackerGUI:
         self.del_exp_btn.pack(side=tk.LEFT, padx=2)
         self.dup_exp_btn = ttk.Button(btn_frame, text=self.t('duplicate_expense'), command=self.duplicate_expense)
         self.dup_exp_btn.pack(side=tk.LEFT, padx=2)
+        self.import_btn = ttk.Button(btn_frame, text=self.t('import_statement'), command=self.import_statement)
+        self.import_btn.pack(side=tk.LEFT, padx=2)
+        self.rules_btn = ttk.Button(btn_frame, text=self.t('category_rules'), command=self.show_category_rules)
+        self.rules_btn.pack(side=tk.LEFT, padx=2)
  
         # Note
         self.note_label = ttk.Label(self.left_panel, text=self.t('note'), 
@@ -543,6 +932,7 @@ class FinancialTrackerGUI:
         self.other_tree.heading(self.t('amount'), text=self.t('amount'))
         self.other_tree.bind('<Double-1>', self.edit_other_income)
         self.other_tree.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.other_view = TreeSync(self.other_tree, self.other_income_row_values)
         
         other_btn_frame = ttk.Frame(self.other_frame)
         other_btn_frame.grid(row=1, column=0, pady=(5, 0))
@@ -627,6 +1017,17 @@ class FinancialTrackerGUI:
         self.legend_frame = ttk.Frame(chart_container)
         self.legend_frame.pack(pady=(5, 0))
         
+        # Status, legend label and color of each slice (colors match the summary)
+        self.chart_slices = (
+            ('paid', 'Plătit', '#51CF66'),       # Green
+            ('reserved', 'Rezervat', '#339AF0'), # Blue
+            ('unpaid', 'Neachitat', '#FF922B')   # Orange
+        )
+        
+        # Chart items are created on the first draw and then only updated
+        self.chart_items = None
+        self.chart_key = None
+        
         # Configure grid weights
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(1, weight=1)
@@ -666,6 +1067,9 @@ class FinancialTrackerGUI:
         self.add_exp_btn.config(text=self.t('add_expense'))
         self.del_exp_btn.config(text=self.t('delete_expense'))
         self.dup_exp_btn.config(text=self.t('duplicate_expense'))
+        self.import_btn.config(text=self.t('import_statement'))
+        self.rules_btn.config(text=self.t('category_rules'))
+        self.export_btn.config(text=self.t('export'))
         self.note_label.config(text=self.t('note'))
         
         # Update right panel
@@ -697,6 +1101,7 @@ class FinancialTrackerGUI:
         # Refresh displays
         self.update_displays()
     
+    @instrument.timed('gui.navigate')
     def previous_month(self):
         """Navigate to previous month"""
         # Save current month before switching
@@ -712,10 +1117,12 @@ class FinancialTrackerGUI:
         month_name = self.t('months')[self.current_date.month - 1]
         self.date_label.config(text=f"{month_name} {self.current_date.year}")
         
-        # Load data for this month
+        # Load data for this month, with what others saved meanwhile
+        self.sync_with_disk()
         self.load_current_month()
         self.update_displays()
     
+    @instrument.timed('gui.navigate')
     def next_month(self):
         """Navigate to next month"""
         # Save current month before switching
@@ -734,14 +1141,52 @@ class FinancialTrackerGUI:
         month_name = self.t('months')[self.current_date.month - 1]
         self.date_label.config(text=f"{month_name} {self.current_date.year}")
         
-        # Load data for this month
+        # Load data for this month, with what others saved meanwhile
+        self.sync_with_disk()
         self.load_current_month()
         self.update_displays()
     
+    def undo(self):
+        """Take back the last change, in whichever month it was made"""
+        self.replay_history(redo=False)
+    
+    def redo(self):
+        """Make the last change taken back again"""
+        self.replay_history(redo=True)
+    
+    def replay_history(self, redo):
+        """Undo or redo one step and show the month it changed"""
+        self.save_current_month_data()
+        try:
+            step = self.ledger.redo() if redo else self.ledger.undo()
+        except UndoError as e:
+            print(f"Undo failed: {e}")
+            ro = self.language.get() == 'ro'
+            messagebox.showwarning("Atenție" if ro else "Warning",
+                                   "Modificarea nu mai poate fi anulată: datele au fost "
+                                   "schimbate între timp." if ro else
+                                   "The change can no longer be undone: the data was "
+                                   "changed in the meantime.")
+            return
+        if step is None:
+            self.root.bell()
+            return
+        
+        if step.month != self.month.key:
+            self.go_to_month(step.month)
+        else:
+            self.load_current_month()
+            self.update_displays()
+        self.save_data()
+    
     def save_month(self):
         """Save current month data"""
         self.save_current_month_data()
         if self.save_data():
+            # Explicit save: wait for the disk write before confirming
+            self.save_worker.flush()
+            if not self.check_save_results():
+                return
             month_name = self.t('months')[self.current_date.month - 1]
             messagebox.showinfo("Succes" if self.language.get() == 'ro' else "Success", 
                               f"Luna {month_name} {self.current_date.year} a fost salvată!" if self.language.get() == 'ro' 
@@ -749,11 +1194,10 @@ class FinancialTrackerGUI:
     
     def edit_expense(self, event):
         """Edit expense on double-click"""
-        selection = self.expense_tree.selection()
-        if not selection:
+        idx = self.expense_view.selected_index()
+        if idx is None:
             return
         
-        idx = self.expense_tree.index(selection[0])
         expense = self.current_month_data['expenses'][idx]
         
         # Open edit dialog with current expense data
@@ -764,36 +1208,14 @@ class FinancialTrackerGUI:
                               expense_data=expense)
         
         if dialog.result:
-            # Normalize status (always store in Romanian internally)
-            status = dialog.result['status']
-            if status in ['Achitat', 'Paid']:
-                dialog.result['status'] = 'Achitat'
-            elif status in ['Rezervat', 'Reserved']:
-                dialog.result['status'] = 'Rezervat'
-            else:
-                dialog.result['status'] = 'Neachitat'
-            
-            # Check if recurring flag was removed
-            old_recurring = expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring')
-            new_recurring = dialog.result.get('recurring_indefinite') or dialog.result.get('is_indefinite_recurring')
-            
-            if old_recurring and not new_recurring:
-                # Recurring was turned off - remove from future months
-                print(f"Recurring turned off for '{expense['name']}', removing from future months")
-                self.remove_recurring_from_future_months(expense['name'])
-            
-            # Update the expense
-            self.current_month_data['expenses'][idx] = dialog.result
-            
-            # If it has auto_add flag and is new, add to future months
-            if dialog.result.get('auto_add') and not expense.get('auto_add'):
-                self.auto_add_to_future_months(dialog.result)
+            # Turning indefinite recurrence off stops it in later months
+            removed = self.ledger.update_expense(self.month, idx, dialog.result)
+            if removed:
+                print(f"Recurring turned off for '{expense['name']}', removed {removed} future copies")
             
             self.save_data()
             self.update_displays()
     
-
-    
     def edit_other_income(self, event):
         """Edit other income on double-click"""
         selection = self.other_tree.selection()
@@ -820,60 +1242,12 @@ class FinancialTrackerGUI:
         self.update_displays()
         self.save_data()
     
+    @instrument.timed('gui.update_displays')
     def update_displays(self):
         """Update all displays"""
-        # Clear expense tree
-        for item in self.expense_tree.get_children():
-            self.expense_tree.delete(item)
-        
-        # Populate expense tree
-        for expense in self.current_month_data['expenses']:
-            # Translate status to current language
-            status = expense['status']
-            if status in ['Achitat', 'Paid']:
-                status_text = self.t('achitat')
-            elif status in ['Rezervat', 'Reserved']:
-                status_text = self.t('reserved')
-            else:
-                status_text = self.t('neachitat')
-            
-            # Determine recurring status (just numbers)
-            recurring_text = '-'  # Default: no recurrence
-            if expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring'):
-                recurring_text = '∞'  # Infinity symbol
-            elif expense.get('recurring_months'):
-                recurring_text = str(expense['recurring_months'])  # Just the number
-            elif expense['type'] == 'Credit' and expense.get('remaining_months'):
-                remaining = expense.get('remaining_months', 1)
-                recurring_text = str(remaining)  # Just the number
-            
-            name_display = expense['name']
-            if expense['type'] == 'Credit' and expense.get('credit_type'):
-                credit_type_text = self.translations[self.language.get()]['credit_types'].get(
-                    expense['credit_type'], '')
-                name_display = f"{expense['name']} ({credit_type_text})"
-            
-            # Get category display text
-            category = expense.get('category', 'other')
-            category_text = self.t('categories').get(category, 'Altele')
-
-            self.expense_tree.insert('', 'end', values=(
-                category_text,
-                expense['name'],
-                f"{expense['total_amount']:.2f}",
-                status_text,
-                recurring_text
-            ))
-        
-       
-        # Update other income tree
-        for item in self.other_tree.get_children():
-            self.other_tree.delete(item)
-        for income in self.current_month_data['other_income']:
-            self.other_tree.insert('', 'end', values=(
-                income['source'],
-                f"{income['amount']:.2f}"
-            ))
+        # Only rows that changed are touched
+        self.expense_view.sync(self.current_month_data['expenses'])
+        self.other_view.sync(self.current_month_data['other_income'])
         
         # Update income fields
         self.income_var.set(str(self.current_month_data['income']['monthly_income']))
@@ -883,6 +1257,52 @@ class FinancialTrackerGUI:
         # Update summary
         self.update_summary()
     
+    def expense_row_values(self, expense):
+        """Texts shown in the expense table for one expense"""
+        # Translate status to current language
+        status = expense['status']
+        if status in ['Achitat', 'Paid']:
+            status_text = self.t('achitat')
+        elif status in ['Rezervat', 'Reserved']:
+            status_text = self.t('reserved')
+        else:
+            status_text = self.t('neachitat')
+        
+        # Determine recurring status (just numbers)
+        recurring_text = '-'  # Default: no recurrence
+        if expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring'):
+            recurring_text = '∞'  # Infinity symbol
+        elif expense.get('recurring_months'):
+            recurring_text = str(expense['recurring_months'])  # Just the number
+        elif expense['type'] == 'Credit' and expense.get('remaining_months'):
+            remaining = expense.get('remaining_months', 1)
+            recurring_text = str(remaining)  # Just the number
+        
+        # Get category display text
+        category = expense.get('category', 'other')
+        category_text = self.t('categories').get(category, 'Altele')
+        
+        return (
+            category_text,
+            expense['name'],
+            f"{expense['total_amount']:.2f}",
+            status_text,
+            recurring_text
+        )
+    
+    def expense_sort_key(self, expense, column):
+        """Sort amounts as numbers and the other columns by their text"""
+        if column == 2:
+            return expense['total_amount']
+        return self.expense_row_values(expense)[column].lower()
+    
+    def other_income_row_values(self, income):
+        """Texts shown in the other income table for one entry"""
+        return (
+            income['source'],
+            f"{income['amount']:.2f}"
+        )
+    
     def update_summary(self):
         """Update financial summary"""
         totals = self.calculate_totals()
@@ -950,87 +1370,59 @@ class FinancialTrackerGUI:
         # Update pie chart
         self.draw_pie_chart(totals)
     
-    def draw_pie_chart(self, totals):
-        """Draw an attractive pie chart showing expense breakdown by status"""
-        self.chart_canvas.delete('all')
-        
-        # Clear previous legend
-        for widget in self.legend_frame.winfo_children():
-            widget.destroy()
-        
-        # Get values
-        paid = totals['paid_amount']
-        reserved = totals['reserved_amount']
-        unpaid = totals['unpaid_amount']
-        total_expenses = totals['total_expenses']
-        
-        if total_expenses <= 0:
-            # Draw "No Data" message
-            self.chart_canvas.create_text(100, 100, text="Fără cheltuieli", 
-                                         font=('Arial', 12), fill='gray')
-            return
-        
-        # Colors matching the summary
-        colors = {
-            'paid': '#51CF66',      # Green
-            'reserved': '#339AF0',   # Blue
-            'unpaid': '#FF922B'      # Orange
-        }
+    def create_pie_chart_items(self):
+        """Create the canvas items and legend rows that draw_pie_chart updates"""
+        canvas = self.chart_canvas
         
         # Get background color for transparency effect
         bg_color = self.root.cget('bg')
         
-        # Calculate percentages
-        slices = []
-        if paid > 0:
-            slices.append(('Plătit', paid / total_expenses * 360, colors['paid'], paid))
-        if reserved > 0:
-            slices.append(('Rezervat', reserved / total_expenses * 360, colors['reserved'], reserved))
-        if unpaid > 0:
-            slices.append(('Neachitat', unpaid / total_expenses * 360, colors['unpaid'], unpaid))
-        
-        # Draw pie chart with shadow effect
         center_x, center_y = 100, 100
         radius = 65
+        inner_radius = 35
+        
+        items = {}
+        items['no_data'] = canvas.create_text(center_x, center_y, text="Fără cheltuieli", 
+                                              font=('Arial', 12), fill='gray', state='hidden')
         
         # Shadow
-        self.chart_canvas.create_oval(
+        items['shadow'] = canvas.create_oval(
             center_x - radius + 3, center_y - radius + 3,
             center_x + radius + 3, center_y + radius + 3,
-            fill='#CCCCCC', outline=''
+            fill='#CCCCCC', outline='', state='hidden'
         )
         
-        # Draw slices
-        start_angle = 90
-        for label, extent, color, amount in slices:
-            self.chart_canvas.create_arc(
+        # One slice per status, in drawing order
+        items['slices'] = []
+        for status, label, color in self.chart_slices:
+            arc = canvas.create_arc(
                 center_x - radius, center_y - radius,
                 center_x + radius, center_y + radius,
-                start=start_angle, extent=-extent,
-                fill=color, outline='white', width=3
+                start=90, extent=0,
+                fill=color, outline='white', width=3, state='hidden'
             )
-            start_angle -= extent
+            items['slices'].append(arc)
         
         # Center circle for donut effect
-        inner_radius = 35
-        self.chart_canvas.create_oval(
+        items['donut'] = canvas.create_oval(
             center_x - inner_radius, center_y - inner_radius,
             center_x + inner_radius, center_y + inner_radius,
-            fill=bg_color, outline=''
+            fill=bg_color, outline='', state='hidden'
         )
         
         # Center text - total expenses
-        self.chart_canvas.create_text(center_x, center_y - 10, 
-                                      text="Total", 
-                                      font=('Arial', 9), fill='gray')
-        self.chart_canvas.create_text(center_x, center_y + 8, 
-                                      text=f"{total_expenses:.0f}", 
-                                      font=('Arial', 12, 'bold'), fill='black')
-        
-        # Create legend outside the canvas in the legend_frame
-        for label, extent, color, amount in slices:
+        items['total_label'] = canvas.create_text(center_x, center_y - 10, 
+                                                  text="Total", 
+                                                  font=('Arial', 9), fill='gray', state='hidden')
+        items['total_value'] = canvas.create_text(center_x, center_y + 8, 
+                                                  text="", 
+                                                  font=('Arial', 12, 'bold'), fill='black',
+                                                  state='hidden')
+        
+        # Legend rows, shown only for statuses that have expenses
+        items['legend'] = []
+        for status, label, color in self.chart_slices:
             legend_item = ttk.Frame(self.legend_frame)
-            legend_item.pack(anchor='w', pady=2)
             
             # Color box
             color_canvas = tk.Canvas(legend_item, width=15, height=15, 
@@ -1039,47 +1431,77 @@ class FinancialTrackerGUI:
             color_canvas.create_rectangle(0, 0, 15, 15, fill=color, outline='black')
             
             # Label text
-            ttk.Label(legend_item, text=f"{label} ({amount:.0f})", 
-                     font=('Arial', 9)).pack(side='left')
-    
-    def calculate_totals(self) -> Dict:
-        """Calculate all financial totals"""
-        total_expenses = sum(item['total_amount'] for item in self.current_month_data['expenses'])
+            text_label = ttk.Label(legend_item, text=label, font=('Arial', 9))
+            text_label.pack(side='left')
+            items['legend'].append((legend_item, text_label))
+        items['legend_shown'] = ()
         
-        # Handle both Romanian and English status values
-        paid_amount = sum(item['total_amount'] for item in self.current_month_data['expenses'] 
-                         if item['status'] in ['Achitat', 'Paid'])
-        unpaid_amount = sum(item['total_amount'] for item in self.current_month_data['expenses'] 
-                           if item['status'] in ['Neachitat', 'Unpaid'])
-        reserved_amount = sum(item['total_amount'] for item in self.current_month_data['expenses'] 
-                             if item['status'] in ['Rezervat', 'Reserved'])
+        self.chart_items = items
+    
+    @instrument.timed('gui.draw_pie_chart')
+    def draw_pie_chart(self, totals):
+        """Draw an attractive pie chart showing expense breakdown by status
         
-        # Calculate meal tickets and income
-        meal_tickets_total = (self.current_month_data['meal_tickets']['worked_days'] * 
-                            self.current_month_data['meal_tickets']['value_per_day'])
-        monthly_income = self.current_month_data['income']['monthly_income']
+        The chart items persist between calls and are updated in place;
+        nothing is redrawn when the amounts did not change.
+        """
+        # Get values
+        amounts = {
+            'paid': totals['paid_amount'],
+            'reserved': totals['reserved_amount'],
+            'unpaid': totals['unpaid_amount']
+        }
+        total_expenses = totals['total_expenses']
         
-        # Calculate other income
-        other_income_total = sum(item['amount'] for item in self.current_month_data.get('other_income', []))
-        additional_income = other_income_total
+        key = (amounts['paid'], amounts['reserved'], amounts['unpaid'], total_expenses)
+        if key == self.chart_key:
+            return
+        self.chart_key = key
         
-        # Total household income = Monthly + Additional + Meal tickets
-        total_household_income = monthly_income + additional_income + meal_tickets_total
+        if self.chart_items is None:
+            self.create_pie_chart_items()
+        canvas = self.chart_canvas
+        items = self.chart_items
         
-        # Remaining = Monthly Income - Total Expenses
-        remaining_after_expenses = monthly_income - total_expenses
+        has_data = total_expenses > 0
+        chart_state = 'normal' if has_data else 'hidden'
+        for name in ('shadow', 'donut', 'total_label', 'total_value'):
+            canvas.itemconfigure(items[name], state=chart_state)
+        # "No Data" message
+        canvas.itemconfigure(items['no_data'], state='hidden' if has_data else 'normal')
         
-        return {
-            'total_expenses': total_expenses,
-            'paid_amount': paid_amount,
-            'unpaid_amount': unpaid_amount,
-            'reserved_amount': reserved_amount,
-            'meal_tickets_total': meal_tickets_total,
-            'monthly_income': monthly_income,
-            'additional_income': additional_income,
-            'remaining_after_expenses': remaining_after_expenses,
-            'total_household_income': total_household_income
-        }
+        # Update slices and legend for the statuses that have expenses
+        start_angle = 90
+        shown = []
+        for index, (status, label, color) in enumerate(self.chart_slices):
+            amount = amounts[status]
+            arc = items['slices'][index]
+            if not has_data or amount <= 0:
+                canvas.itemconfigure(arc, state='hidden')
+                continue
+            
+            extent = amount / total_expenses * 360
+            canvas.itemconfigure(arc, start=start_angle, extent=-extent, state='normal')
+            start_angle -= extent
+            
+            items['legend'][index][1].config(text=f"{label} ({amount:.0f})")
+            shown.append(index)
+        
+        if has_data:
+            canvas.itemconfigure(items['total_value'], text=f"{total_expenses:.0f}")
+        
+        # Re-pack the legend only when the set of visible rows changed
+        shown = tuple(shown)
+        if shown != items['legend_shown']:
+            for legend_item, text_label in items['legend']:
+                legend_item.pack_forget()
+            for index in shown:
+                items['legend'][index][0].pack(anchor='w', pady=2)
+            items['legend_shown'] = shown
+    
+    def calculate_totals(self) -> Dict:
+        """Calculate all financial totals"""
+        return self.ledger.calculate_totals(self.month)
     
     def add_expense(self):
         """Add new expense"""
@@ -1087,129 +1509,101 @@ class FinancialTrackerGUI:
         if dialog.result:
             print(f"Received result from dialog: {dialog.result}")
             
-            # Normalize status to internal format (always use Romanian internally)
-            status = dialog.result['status']
-            if status in ['Achitat', 'Paid']:
-                dialog.result['status'] = 'Achitat'
-            elif status in ['Rezervat', 'Reserved']:
-                dialog.result['status'] = 'Rezervat'
-            else:
-                dialog.result['status'] = 'Neachitat'
-            
-            # Add to current month
-            self.current_month_data['expenses'].append(dialog.result)
-            print(f"Added to current month. Auto-add flag: {dialog.result.get('auto_add')}")
-            
-            # Auto-add to future months if applicable
-            if dialog.result.get('auto_add'):
-                print("Calling auto_add_to_future_months...")
-                self.auto_add_to_future_months(dialog.result)
-            else:
-                print("No auto_add flag, skipping future months")
+            # Add to current month; with auto_add it becomes a recurring rule
+            self.ledger.add_expense(self.month, dialog.result)
+            print(f"Added to current month. Recurring rule: {dialog.result.get('rule_id')}")
             
             # Save and update
             saved = self.save_data()
             print(f"Data saved: {saved}")
             self.update_displays()
     
-    def auto_add_to_future_months(self, expense):
-        """Automatically add expense to future months"""
-        print(f"Auto-adding expense: {expense['name']}, Type: {expense.get('type')}, Recurring: {expense.get('recurring_months')}, Indefinite: {expense.get('recurring_indefinite')}")
-        
-        if expense['type'] == 'Credit':
-            # For credit with remaining months
-            remaining = expense.get('remaining_months', 1)
-            print(f"Credit: Adding to {remaining - 1} months")
-            self.add_to_next_months(expense, remaining - 1)  # -1 because current month already has it
-        
-        elif expense.get('recurring_indefinite'):
-            # For indefinite recurring (will be added month by month when navigating)
-            # Mark it as indefinite in the data
-            expense['is_indefinite_recurring'] = True
-            print(f"Marked as indefinite recurring")
-        
-        elif expense.get('recurring_months'):
-            # For fixed number of recurring months
-            months = expense['recurring_months']
-            print(f"Fixed recurring: Adding to {months - 1} months")
-            self.add_to_next_months(expense, months - 1)  # -1 because current month already has it
-    
-    def add_to_next_months(self, expense, num_months):
-        """Add expense to the next N months"""
-        current = self.current_date
-        
-        for i in range(1, num_months + 1):
-            # Calculate next month
-            if current.month + i > 12:
-                next_month = (current.month + i - 1) % 12 + 1
-                next_year = current.year + ((current.month + i - 1) // 12)
-            else:
-                next_month = current.month + i
-                next_year = current.year
-            
-            # Get month key
-            month_key = f"{next_year}_{next_month:02d}"
-            
-            # Create month data if doesn't exist
-            if month_key not in self.data['monthly_data']:
-                self.data['monthly_data'][month_key] = {
-                    'income': self.current_month_data['income'].copy(),
-                    'expenses': [],
-                    'family_income': [],
-                    'other_income': [],
-                    'meal_tickets': self.current_month_data['meal_tickets'].copy()
-                }
-            
-            # Create a copy of the expense for next month
-            expense_copy = expense.copy()
-            
-            # For credit type, decrease remaining months
-            if expense['type'] == 'Credit' and 'remaining_months' in expense_copy:
-                expense_copy['remaining_months'] = expense['remaining_months'] - i
-                if expense_copy['remaining_months'] <= 0:
-                    continue  # Don't add if no months remaining
-            
-            # Add to next month (avoid duplicates)
-            # Check if expense with same name doesn't already exist
-            exists = False
-            for existing_exp in self.data['monthly_data'][month_key]['expenses']:
-                if existing_exp['name'] == expense_copy['name']:
-                    exists = True
-                    break
-            
-            if not exists:
-                self.data['monthly_data'][month_key]['expenses'].append(expense_copy)
-    
     def remove_expense(self):
         """Remove selected expense"""
-        selection = self.expense_tree.selection()
-        if not selection:
+        idx = self.expense_view.selected_index()
+        if idx is None:
             messagebox.showwarning("Atenție" if self.language.get() == 'ro' else "Warning", 
                                  "Selectați o cheltuială de șters!" if self.language.get() == 'ro' else "Select an expense to delete!")
             return
         
-        idx = self.expense_tree.index(selection[0])
         if messagebox.askyesno("Confirmare" if self.language.get() == 'ro' else "Confirmation", 
                               f"Ștergeți '{self.current_month_data['expenses'][idx]['name']}'?" if self.language.get() == 'ro' 
                               else f"Delete '{self.current_month_data['expenses'][idx]['name']}'?"):
-            self.current_month_data['expenses'].pop(idx)
+            # Only this month's occurrence goes away
+            self.ledger.remove_expense(self.month, idx)
             self.save_data()
             self.update_displays()
     
     def duplicate_expense(self):
         """Duplicate selected expense"""
-        selection = self.expense_tree.selection()
-        if not selection:
+        idx = self.expense_view.selected_index()
+        if idx is None:
             messagebox.showwarning("Atenție" if self.language.get() == 'ro' else "Warning", 
                                  "Selectați o cheltuială de duplicat!" if self.language.get() == 'ro' else "Select an expense to duplicate!")
             return
         
-        idx = self.expense_tree.index(selection[0])
-        expense_copy = self.current_month_data['expenses'][idx].copy()
-        expense_copy['name'] = expense_copy['name'] + (" (copie)" if self.language.get() == 'ro' else " (copy)")
-        self.current_month_data['expenses'].append(expense_copy)
+        self.ledger.duplicate_expense(self.month, idx,
+                                      " (copie)" if self.language.get() == 'ro' else " (copy)")
+        self.save_data()
+        self.update_displays()
+    
+    def import_statement(self):
+        """Import the transactions of a CSV or OFX bank statement"""
+        ro = self.language.get() == 'ro'
+        path = filedialog.askopenfilename(
+            title="Importă extras de cont" if ro else "Import bank statement",
+            filetypes=[("Extrase" if ro else "Statements", "*.csv *.ofx *.qfx"),
+                       ("CSV", "*.csv"), ("OFX", "*.ofx *.qfx")])
+        if not path:
+            return
+        
+        # Keep the changes of the month on screen; it is reopened afterwards
+        self.save_current_month_data()
+        try:
+            # Nothing is added when the statement has an error
+            result = import_file(self.ledger, path)
+        except (StatementError, OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Eroare" if ro else "Error",
+                                 f"Extrasul nu a putut fi importat:\n{e}" if ro
+                                 else f"The statement could not be imported:\n{e}")
+            return
+        
+        # One save for the whole statement
+        self.load_current_month()
         self.save_data()
         self.update_displays()
+        print(f"Imported statement {path}: {result}")
+        
+        expenses = result.get('expenses', 0)
+        income = result.get('income', 0)
+        duplicates = result.get('duplicates', 0)
+        months = result.get('months', 0)
+        messagebox.showinfo("Succes" if ro else "Success",
+                            f"Importate {expenses} cheltuieli și {income} venituri în {months} luni.\n"
+                            f"{duplicates} tranzacții importate deja au fost ignorate." if ro else
+                            f"Imported {expenses} expenses and {income} income entries into {months} months.\n"
+                            f"{duplicates} already imported transactions were skipped.")
+    
+    def show_category_rules(self):
+        """Edit the rules that choose the category of imported expenses"""
+        CategoryRulesWindow(self.root, self.language.get(), categorize.get_rules(self.data),
+                            self.t('categories'), self.set_category_rules, self.recategorize_history)
+    
+    def set_category_rules(self, rules):
+        categorize.set_rules(self.data, rules)
+        self.save_data()
+    
+    def recategorize_history(self, only_other=False):
+        """Apply the category rules to all saved expenses, return how many changed"""
+        # The month on screen is changed like the others and shown again
+        self.save_current_month_data()
+        changed = categorize.recategorize(self.ledger, only_other=only_other)
+        print(f"Re-categorized {changed} expenses")
+        if changed:
+            self.load_current_month()
+            self.save_data()
+            self.update_displays()
+        return changed
     
     def update_income(self):
         """Update monthly income"""
@@ -1899,6 +2293,524 @@ class OtherIncomeDialog:
             messagebox.showerror("Eroare" if self.language == 'ro' else "Error", 
                                "Suma invalidă!" if self.language == 'ro' else "Invalid amount!")
 
+class ExportDialog:
+    def __init__(self, parent, language='ro', first_month='', last_month=''):
+        self.result = None
+        self.language = language
+        ro = language == 'ro'
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Exportă Istoricul" if ro else "Export History")
+        
+        ttk.Label(self.dialog, text="Format:").grid(row=0, column=0, padx=10, pady=10, sticky=tk.W)
+        self.format_var = tk.StringVar(value='csv')
+        format_frame = ttk.Frame(self.dialog)
+        format_frame.grid(row=0, column=1, padx=10, pady=10, sticky=tk.W)
+        ttk.Radiobutton(format_frame, text="CSV", value='csv',
+                        variable=self.format_var).pack(side=tk.LEFT)
+        ttk.Radiobutton(format_frame, text="Coloane (.ftc)" if ro else "Columnar (.ftc)",
+                        value='columnar', variable=self.format_var).pack(side=tk.LEFT, padx=(10, 0))
+        
+        ttk.Label(self.dialog, text="De la luna (AAAA_LL):" if ro else "From month (YYYY_MM):").grid(
+            row=1, column=0, padx=10, pady=10, sticky=tk.W)
+        self.start_var = tk.StringVar(value=first_month)
+        ttk.Entry(self.dialog, textvariable=self.start_var, width=12).grid(row=1, column=1, padx=10, pady=10, sticky=tk.W)
+        
+        ttk.Label(self.dialog, text="Până la luna (AAAA_LL):" if ro else "To month (YYYY_MM):").grid(
+            row=2, column=0, padx=10, pady=10, sticky=tk.W)
+        self.end_var = tk.StringVar(value=last_month)
+        ttk.Entry(self.dialog, textvariable=self.end_var, width=12).grid(row=2, column=1, padx=10, pady=10, sticky=tk.W)
+        
+        btn_frame = ttk.Frame(self.dialog)
+        btn_frame.grid(row=3, column=0, columnspan=2, pady=20)
+        ttk.Button(btn_frame, text="OK", command=self.ok).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Anulează" if ro else "Cancel", command=self.dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        # Auto-resize
+        self.dialog.update_idletasks()
+        width = max(350, self.dialog.winfo_reqwidth() + 20)
+        height = self.dialog.winfo_reqheight() + 20
+        self.dialog.geometry(f'{width}x{height}')
+        self.dialog.resizable(False, False)
+        
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        parent.wait_window(self.dialog)
+    
+    def ok(self):
+        start = self.start_var.get().strip() or None
+        end = self.end_var.get().strip() or None
+        for value in (start, end):
+            if value is not None and not re.fullmatch(r'\d{4}_(0[1-9]|1[0-2])', value):
+                messagebox.showerror("Eroare" if self.language == 'ro' else "Error",
+                                     f"Lună invalidă: {value}" if self.language == 'ro'
+                                     else f"Invalid month: {value}")
+                return
+        self.result = {'fmt': self.format_var.get(), 'start': start, 'end': end}
+        self.dialog.destroy()
+
+class CategoryRulesWindow:
+    """List of category rules in priority order, with add/remove/reorder"""
+    
+    def __init__(self, parent, language, rules, category_names, on_change, on_recategorize):
+        self.language = language
+        self.rules = list(rules)
+        self.category_names = category_names
+        self.on_change = on_change
+        self.on_recategorize = on_recategorize
+        ro = language == 'ro'
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Reguli Categorii" if ro else "Category Rules")
+        
+        ttk.Label(self.dialog, text="Prima regulă potrivită decide; urmează regulile implicite." if ro
+                  else "The first matching rule decides; the built-in rules come after these.",
+                  foreground='gray').grid(row=0, column=0, padx=10, pady=(10, 5), sticky=tk.W)
+        
+        columns = ('pattern', 'match', 'category', 'min', 'max')
+        headings = (('Text' if ro else 'Pattern'), ('Potrivire' if ro else 'Match'),
+                    ('Categorie' if ro else 'Category'), 'Min', 'Max')
+        self.tree = ttk.Treeview(self.dialog, columns=columns, show='headings', height=10)
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=200 if column == 'pattern' else 90)
+        self.tree.grid(row=1, column=0, padx=10, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # New rule
+        form = ttk.Frame(self.dialog, padding="5")
+        form.grid(row=2, column=0, padx=5, sticky=tk.W)
+        self.match_names = {'substring': 'Conține' if ro else 'Contains', 'regex': 'Regex'}
+        self.pattern_var = tk.StringVar()
+        self.match_var = tk.StringVar(value=self.match_names['substring'])
+        self.category_var = tk.StringVar(value=category_names['other'])
+        self.min_var = tk.StringVar()
+        self.max_var = tk.StringVar()
+        ttk.Entry(form, textvariable=self.pattern_var, width=24).pack(side=tk.LEFT, padx=2)
+        ttk.Combobox(form, textvariable=self.match_var, state="readonly", width=9,
+                     values=list(self.match_names.values())).pack(side=tk.LEFT, padx=2)
+        ttk.Combobox(form, textvariable=self.category_var, state="readonly", width=14,
+                     values=[category_names[key] for key in categorize.CATEGORIES]).pack(side=tk.LEFT, padx=2)
+        ttk.Entry(form, textvariable=self.min_var, width=8).pack(side=tk.LEFT, padx=2)
+        ttk.Entry(form, textvariable=self.max_var, width=8).pack(side=tk.LEFT, padx=2)
+        ttk.Button(form, text="Adaugă" if ro else "Add", command=self.add).pack(side=tk.LEFT, padx=2)
+        
+        btn_frame = ttk.Frame(self.dialog)
+        btn_frame.grid(row=3, column=0, pady=5)
+        ttk.Button(btn_frame, text="▲", width=3, command=lambda: self.move(-1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="▼", width=3, command=lambda: self.move(1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="Șterge" if ro else "Delete", command=self.remove).pack(side=tk.LEFT, padx=5)
+        
+        recategorize_frame = ttk.Frame(self.dialog)
+        recategorize_frame.grid(row=4, column=0, pady=(5, 10))
+        self.only_other_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(recategorize_frame, text="Doar cheltuielile din 'Altele'" if ro
+                        else "Only expenses in 'Other'", variable=self.only_other_var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(recategorize_frame, text="Recategorizează istoricul" if ro else "Re-categorize history",
+                   command=self.recategorize).pack(side=tk.LEFT, padx=5)
+        ttk.Button(recategorize_frame, text="Închide" if ro else "Close",
+                   command=self.dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        self.dialog.columnconfigure(0, weight=1)
+        self.dialog.rowconfigure(1, weight=1)
+        self.dialog.transient(parent)
+        self.refresh()
+    
+    def refresh(self, selected=None):
+        self.tree.delete(*self.tree.get_children())
+        for index, rule in enumerate(self.rules):
+            self.tree.insert('', 'end', iid=str(index), values=(
+                rule['pattern'], self.match_names.get(rule.get('match'), rule.get('match')),
+                self.category_names.get(rule['category'], rule['category']),
+                '' if rule.get('min_amount') is None else f"{rule['min_amount']:.2f}",
+                '' if rule.get('max_amount') is None else f"{rule['max_amount']:.2f}"))
+        if selected is not None:
+            self.tree.selection_set(str(selected))
+    
+    def selected_index(self):
+        selection = self.tree.selection()
+        return int(selection[0]) if selection else None
+    
+    def add(self):
+        ro = self.language == 'ro'
+        match = next(key for key, name in self.match_names.items() if name == self.match_var.get())
+        category = next(key for key, name in self.category_names.items()
+                        if name == self.category_var.get())
+        try:
+            amounts = [float(var.get().replace(',', '.')) if var.get().strip() else None
+                       for var in (self.min_var, self.max_var)]
+            rule = categorize.make_rule(self.pattern_var.get().strip(), category, match, *amounts)
+        except ValueError as e:
+            messagebox.showerror("Eroare" if ro else "Error", str(e), parent=self.dialog)
+            return
+        if not rule['pattern'] and rule['min_amount'] is None and rule['max_amount'] is None:
+            messagebox.showerror("Eroare" if ro else "Error",
+                                 "Introduceți un text sau o sumă!" if ro else "Enter a pattern or an amount!",
+                                 parent=self.dialog)
+            return
+        
+        self.rules.append(rule)
+        self.on_change(self.rules)
+        self.pattern_var.set('')
+        self.min_var.set('')
+        self.max_var.set('')
+        self.refresh(len(self.rules) - 1)
+    
+    def remove(self):
+        index = self.selected_index()
+        if index is None:
+            return
+        self.rules.pop(index)
+        self.on_change(self.rules)
+        self.refresh()
+    
+    def move(self, step):
+        """Move the selected rule up (-1) or down (1) in priority"""
+        index = self.selected_index()
+        if index is None or not 0 <= index + step < len(self.rules):
+            return
+        self.rules[index], self.rules[index + step] = self.rules[index + step], self.rules[index]
+        self.on_change(self.rules)
+        self.refresh(index + step)
+    
+    def recategorize(self):
+        ro = self.language == 'ro'
+        if not messagebox.askyesno("Confirmare" if ro else "Confirm",
+                                   "Aplicați regulile tuturor cheltuielilor salvate?" if ro
+                                   else "Apply the rules to all saved expenses?", parent=self.dialog):
+            return
+        changed = self.on_recategorize(self.only_other_var.get())
+        messagebox.showinfo("Succes" if ro else "Success",
+                            f"{changed} cheltuieli au primit altă categorie." if ro
+                            else f"{changed} expenses got a new category.", parent=self.dialog)
+
+class SearchWindow:
+    """Search box over all months; double-click a result to open its month"""
+    
+    # Results shown at most, newest first
+    LIMIT = 500
+    
+    def __init__(self, parent, language, index, category_names, month_names, on_open):
+        self.language = language
+        self.index = index
+        self.category_names = category_names
+        self.month_names = month_names
+        self.on_open = on_open
+        ro = language == 'ro'
+        self.kind_names = {
+            'expense': 'Cheltuială' if ro else 'Expense',
+            'other_income': 'Alt venit' if ro else 'Other income',
+            'family_income': 'Venit familie' if ro else 'Family income'
+        }
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Căutare" if ro else "Search")
+        
+        controls = ttk.Frame(self.dialog, padding="5")
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Label(controls, text="Caută:" if ro else "Search:").pack(side=tk.LEFT)
+        self.query_var = tk.StringVar()
+        entry = ttk.Entry(controls, textvariable=self.query_var, width=40)
+        entry.pack(side=tk.LEFT, padx=5)
+        entry.bind('<KeyRelease>', lambda e: self.refresh())
+        entry.focus_set()
+        self.count_label = ttk.Label(controls, text="", foreground='gray')
+        self.count_label.pack(side=tk.LEFT, padx=5)
+        
+        columns = ('month', 'kind', 'text', 'category', 'amount')
+        headings = (('Luna' if ro else 'Month'), ('Tip' if ro else 'Type'),
+                    ('Descriere' if ro else 'Description'), ('Categorie' if ro else 'Category'),
+                    ('Sumă' if ro else 'Amount'))
+        table_frame = ttk.Frame(self.dialog, padding="5")
+        table_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.tree = ttk.Treeview(table_frame, columns=columns, show='headings', height=16)
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=220 if column == 'text' else 110,
+                             anchor=tk.E if column == 'amount' else tk.W)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=scrollbar.set)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+        self.tree.bind('<Double-1>', self.open_selected)
+        
+        ttk.Button(self.dialog, text="Închide" if ro else "Close",
+                   command=self.dialog.destroy).grid(row=2, column=0, pady=(0, 10))
+        
+        self.dialog.columnconfigure(0, weight=1)
+        self.dialog.rowconfigure(1, weight=1)
+        self.dialog.transient(parent)
+    
+    def refresh(self):
+        """Show the results of the current query"""
+        ro = self.language == 'ro'
+        self.tree.delete(*self.tree.get_children())
+        query = self.query_var.get()
+        if not query.strip():
+            self.count_label.config(text="")
+            return
+        
+        hits = self.index.search(query, limit=self.LIMIT + 1)
+        for hit in hits[:self.LIMIT]:
+            year, month = hit['month'].split('_')
+            category = self.category_names.get(hit['category'], hit['category']) if hit['category'] else ''
+            amount = f"{hit['amount']:.2f}" if isinstance(hit['amount'], (int, float)) else ''
+            self.tree.insert('', 'end', values=(
+                f"{self.month_names[int(month) - 1]} {year}", self.kind_names[hit['kind']],
+                hit['text'], category, amount), tags=(hit['month'],))
+        
+        if len(hits) > self.LIMIT:
+            text = f"primele {self.LIMIT} rezultate" if ro else f"first {self.LIMIT} results"
+        else:
+            text = f"{len(hits)} rezultate" if ro else f"{len(hits)} results"
+        self.count_label.config(text=text)
+    
+    def open_selected(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        self.on_open(self.tree.item(selection[0], 'tags')[0])
+
+class AnalyticsWindow:
+    """Totals per category, status or credit type over all saved months"""
+    
+    def __init__(self, parent, language, ledger, label):
+        self.language = language
+        self.ledger = ledger
+        self.label = label
+        ro = language == 'ro'
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Analiză" if ro else "Analytics")
+        
+        self.group_names = {
+            'category': 'Categorie' if ro else 'Category',
+            'status': 'Status',
+            'credit_type': 'Tip credit' if ro else 'Credit type'
+        }
+        self.period_names = {
+            'year': 'Anual' if ro else 'Yearly',
+            'month': 'Lunar' if ro else 'Monthly'
+        }
+        
+        controls = ttk.Frame(self.dialog, padding="5")
+        controls.grid(row=0, column=0, sticky=tk.W)
+        
+        ttk.Label(controls, text="Grupare:" if ro else "Group by:").pack(side=tk.LEFT)
+        self.group_var = tk.StringVar(value=self.group_names['category'])
+        group_combo = ttk.Combobox(controls, textvariable=self.group_var, state="readonly",
+                                   values=list(self.group_names.values()), width=12)
+        group_combo.pack(side=tk.LEFT, padx=5)
+        group_combo.bind('<<ComboboxSelected>>', lambda e: self.refresh())
+        
+        ttk.Label(controls, text="Perioadă:" if ro else "Period:").pack(side=tk.LEFT, padx=(10, 0))
+        self.period_var = tk.StringVar(value=self.period_names['year'])
+        period_combo = ttk.Combobox(controls, textvariable=self.period_var, state="readonly",
+                                    values=list(self.period_names.values()), width=10)
+        period_combo.pack(side=tk.LEFT, padx=5)
+        period_combo.bind('<<ComboboxSelected>>', lambda e: self.refresh())
+        
+        ttk.Label(controls, text="Medie mobilă:" if ro else "Rolling average:").pack(side=tk.LEFT, padx=(10, 0))
+        self.window_var = tk.StringVar(value='3')
+        ttk.Spinbox(controls, from_=1, to=24, width=4, textvariable=self.window_var,
+                    command=self.refresh).pack(side=tk.LEFT, padx=5)
+        
+        # Table with one row per period
+        table_frame = ttk.Frame(self.dialog, padding="5")
+        table_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.tree = ttk.Treeview(table_frame, show='headings', height=12)
+        y_scroll = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        x_scroll = ttk.Scrollbar(table_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(yscroll=y_scroll.set, xscroll=x_scroll.set)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        y_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        x_scroll.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+        
+        # Income vs expenses trend
+        self.canvas = tk.Canvas(self.dialog, width=800, height=240, bg='white', highlightthickness=0)
+        self.canvas.grid(row=2, column=0, padx=5, pady=5)
+        
+        ttk.Button(self.dialog, text="Închide" if ro else "Close",
+                   command=self.dialog.destroy).grid(row=3, column=0, pady=(0, 10))
+        
+        self.dialog.columnconfigure(0, weight=1)
+        self.dialog.rowconfigure(1, weight=1)
+        self.dialog.transient(parent)
+        self.refresh()
+    
+    def refresh(self):
+        """Recompute the report for the selected options"""
+        ro = self.language == 'ro'
+        group = next(key for key, name in self.group_names.items() if name == self.group_var.get())
+        period = next(key for key, name in self.period_names.items() if name == self.period_var.get())
+        try:
+            window = max(int(self.window_var.get()), 1)
+        except ValueError:
+            window = 3
+        
+        result = report(self.ledger.analytics, group, period, window)
+        labels = sorted(result['groups'], key=lambda label: self.label(group, label))
+        
+        columns = ['period'] + labels + ['expenses', 'expenses_average', 'household_income', 'remaining']
+        headings = ([self.period_names[period]] + [self.label(group, label) for label in labels] +
+                    ["Total cheltuieli" if ro else "Total expenses",
+                     "Medie mobilă" if ro else "Rolling average",
+                     "Venit total" if ro else "Total income",
+                     "Venit rămas" if ro else "Remaining"])
+        
+        self.tree.delete(*self.tree.get_children())
+        self.tree['columns'] = columns
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=90, anchor=tk.W if column == 'period' else tk.E)
+        
+        for position, name in enumerate(result['periods']):
+            values = [name.replace('_', '-')]
+            values += [f"{result['groups'][label][position]:.2f}" for label in labels]
+            values += [f"{result[column][position]:.2f}" for column in columns[len(labels) + 1:]]
+            self.tree.insert('', 'end', values=values)
+        
+        self.draw_trend(result)
+    
+    def draw_trend(self, result):
+        """Line chart of income, expenses and their rolling average"""
+        ro = self.language == 'ro'
+        canvas = self.canvas
+        canvas.delete('all')
+        width = int(canvas['width'])
+        height = int(canvas['height'])
+        
+        periods = result['periods']
+        if not periods:
+            canvas.create_text(width / 2, height / 2, text="Nu există date" if ro else "No data",
+                               fill='gray', font=('Arial', 12))
+            return
+        
+        series = [
+            ('household_income', 'darkgreen', None, "Venit total" if ro else "Total income"),
+            ('expenses', '#e74c3c', None, "Cheltuieli" if ro else "Expenses"),
+            ('expenses_average', 'orange', (4, 2), "Medie mobilă" if ro else "Rolling average")
+        ]
+        left, right, top, bottom = 60, 20, 30, 30
+        highest = max(max(result[name]) for name, _, _, _ in series) or 1.0
+        step = (width - left - right) / max(len(periods) - 1, 1)
+        
+        def point(position, value):
+            return (left + position * step,
+                    height - bottom - value / highest * (height - top - bottom))
+        
+        # Axes and labels
+        canvas.create_line(left, height - bottom, width - right, height - bottom, fill='gray')
+        canvas.create_line(left, top, left, height - bottom, fill='gray')
+        canvas.create_text(left - 5, top, text=f"{highest:.0f}", anchor='e', font=('Arial', 8))
+        canvas.create_text(left - 5, height - bottom, text="0", anchor='e', font=('Arial', 8))
+        canvas.create_text(left, height - bottom + 12, text=periods[0].replace('_', '-'),
+                           anchor='w', font=('Arial', 8))
+        canvas.create_text(width - right, height - bottom + 12, text=periods[-1].replace('_', '-'),
+                           anchor='e', font=('Arial', 8))
+        
+        legend_x = left
+        for name, color, dash, text in series:
+            coords = []
+            for position, value in enumerate(result[name]):
+                coords.extend(point(position, value))
+            if len(periods) > 1:
+                canvas.create_line(*coords, fill=color, width=2, dash=dash)
+            else:
+                x, y = coords
+                canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill=color, outline=color)
+            
+            canvas.create_line(legend_x, 12, legend_x + 20, 12, fill=color, width=2, dash=dash)
+            canvas.create_text(legend_x + 25, 12, text=text, anchor='w', font=('Arial', 9))
+            legend_x += 160
+
+class DiagnosticsWindow:
+    """Timings and counters collected by financial_tracker.instrument"""
+    
+    def __init__(self, parent, language='ro', context=None):
+        self.language = language
+        self.context = context
+        ro = language == 'ro'
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Diagnosticare" if ro else "Diagnostics")
+        
+        # Measuring costs (a little) time, so it is only on when asked for
+        self.enabled_var = tk.BooleanVar(value=instrument.enabled())
+        ttk.Checkbutton(self.dialog, text="Măsurători active" if ro else "Measuring enabled",
+                        variable=self.enabled_var, command=self.toggle).grid(
+                            row=0, column=0, padx=10, pady=(10, 5), sticky=tk.W)
+        
+        columns = ('name', 'count', 'total', 'mean', 'p95', 'max')
+        headings = (('Operație' if ro else 'Operation'), ('Apeluri' if ro else 'Calls'),
+                    'Total', ('Medie' if ro else 'Mean'), 'p95', 'Max')
+        self.tree = ttk.Treeview(self.dialog, columns=columns, show='headings', height=16)
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=200 if column == 'name' else 90,
+                             anchor=tk.W if column == 'name' else tk.E)
+        self.tree.grid(row=1, column=0, padx=10, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        btn_frame = ttk.Frame(self.dialog)
+        btn_frame.grid(row=2, column=0, pady=10)
+        ttk.Button(btn_frame, text="Reîmprospătează" if ro else "Refresh",
+                   command=self.refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Resetează" if ro else "Reset",
+                   command=self.reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Salvează în fișier..." if ro else "Save to file...",
+                   command=self.save).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Închide" if ro else "Close",
+                   command=self.dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        self.dialog.columnconfigure(0, weight=1)
+        self.dialog.rowconfigure(1, weight=1)
+        self.dialog.transient(parent)
+        self.refresh()
+    
+    def toggle(self):
+        if self.enabled_var.get():
+            instrument.enable()
+        else:
+            instrument.disable()
+    
+    def refresh(self):
+        """Show the current measurements"""
+        self.tree.delete(*self.tree.get_children())
+        data = instrument.snapshot()
+        
+        for name, stats in data['timings_ms'].items():
+            self.tree.insert('', 'end', values=(
+                name, stats['count'], f"{stats['total']:.1f} ms", f"{stats['mean']:.2f} ms",
+                f"{stats['p95']:.2f} ms", f"{stats['max']:.2f} ms"))
+        for name, stats in data['values'].items():
+            self.tree.insert('', 'end', values=(
+                name, stats['count'], f"{stats['total']:.0f}", f"{stats['mean']:.0f}",
+                f"{stats['p95']:.0f}", f"{stats['max']:.0f}"))
+        for name, value in data['counters'].items():
+            self.tree.insert('', 'end', values=(name, value, '', '', '', ''))
+    
+    def reset(self):
+        instrument.reset()
+        self.refresh()
+    
+    def save(self):
+        """Write the measurements and some facts about the data to a JSON file"""
+        ro = self.language == 'ro'
+        path = filedialog.asksaveasfilename(parent=self.dialog, defaultextension='.json',
+                                            initialfile='financial_tracker_profile.json',
+                                            filetypes=[('JSON', '*.json')])
+        if not path:
+            return
+        try:
+            instrument.dump(path, extra={'context': self.context()} if self.context else None)
+            messagebox.showinfo("Succes" if ro else "Success",
+                                f"Salvat în: {path}" if ro else f"Saved to: {path}", parent=self.dialog)
+        except OSError as e:
+            messagebox.showerror("Eroare" if ro else "Error", str(e), parent=self.dialog)
+
 if __name__ == "__main__":
     try:
         root = tk.Tk()
@@ -0,0 +1,12 @@
+"""Core building blocks of Financial Tracker that do not depend on tkinter"""
+
+from .atomic import CorruptDataError
+from .ledger import Ledger, MonthView, normalize_status
+from .locking import ConflictError
+from .persistence import SaveWorker
+from .storage import (STORAGE_MODES, JournalStore, JsonStore, LazyMonths, ShardedStore, Store,
+                      create_store, default_data, migrate, open_store)
+
+__all__ = ['STORAGE_MODES', 'ConflictError', 'CorruptDataError', 'JournalStore', 'JsonStore',
+           'LazyMonths', 'Ledger', 'MonthView', 'SaveWorker', 'ShardedStore', 'Store',
+           'create_store', 'default_data', 'migrate', 'normalize_status', 'open_store']
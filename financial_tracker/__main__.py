@@ -0,0 +1,8 @@
+"""python -m financial_tracker: the command line interface (see cli.py)"""
+
+import sys
+
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
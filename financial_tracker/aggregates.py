@@ -0,0 +1,78 @@
+from collections import Counter
+from typing import Dict, Iterable
+
+# Status values as stored (Romanian) and as older files may hold them (English)
+STATUS_GROUPS = {
+    'Achitat': 'paid',
+    'Paid': 'paid',
+    'Neachitat': 'unpaid',
+    'Unpaid': 'unpaid',
+    'Rezervat': 'reserved',
+    'Reserved': 'reserved'
+}
+
+
+class MonthAggregate:
+    """Running expense totals of one month by status and category
+
+    Built with one pass over the expenses and then kept up to date with
+    `add()`, `remove()` and `replace()`, so reading the totals does not
+    depend on the number of expenses. A bucket whose last expense is
+    removed is reset to exactly 0 so float rounding cannot pile up.
+    """
+
+    def __init__(self, expenses: Iterable[Dict] = ()):
+        self.rebuild(expenses)
+
+    def rebuild(self, expenses: Iterable[Dict]):
+        """Recompute all totals from scratch"""
+        self.total = 0.0
+        self.by_status = {'paid': 0.0, 'unpaid': 0.0, 'reserved': 0.0}
+        self.by_category = {}
+        self._counts = Counter()
+        for expense in expenses:
+            self.add(expense)
+
+    @property
+    def count(self) -> int:
+        return self._counts[None]
+
+    def add(self, expense: Dict):
+        self._apply(expense, 1)
+
+    def remove(self, expense: Dict):
+        self._apply(expense, -1)
+
+    def replace(self, old: Dict, new: Dict):
+        """Account for an edited expense (amount, status or category changed)"""
+        self._apply(old, -1)
+        self._apply(new, 1)
+
+    def _apply(self, expense: Dict, sign: int):
+        amount = expense['total_amount'] * sign
+
+        self._counts[None] += sign
+        self.total = self.total + amount if self._counts[None] else 0.0
+
+        group = STATUS_GROUPS.get(expense.get('status'))
+        if group is not None:
+            self._counts[group] += sign
+            self.by_status[group] = self.by_status[group] + amount if self._counts[group] else 0.0
+
+        category = expense.get('category') or 'other'
+        key = ('category', category)
+        self._counts[key] += sign
+        if self._counts[key]:
+            self.by_category[category] = self.by_category.get(category, 0.0) + amount
+        else:
+            del self._counts[key]
+            self.by_category.pop(category, None)
+
+    def totals(self) -> Dict[str, float]:
+        """Totals in the form used by the summary panel"""
+        return {
+            'total_expenses': self.total,
+            'paid_amount': self.by_status['paid'],
+            'unpaid_amount': self.by_status['unpaid'],
+            'reserved_amount': self.by_status['reserved']
+        }
@@ -0,0 +1,220 @@
+"""Multi-year analytics over a columnar projection of all expenses"""
+
+from array import array
+from typing import Dict, List, Optional
+
+from . import recurring
+from .aggregates import STATUS_GROUPS
+from .storage import read_month
+
+try:
+    import numpy
+except ImportError:  # optional, only makes the sums faster
+    numpy = None
+
+GROUP_COLUMNS = ('status', 'category', 'credit_type')
+
+
+class MonthColumns:
+    """Typed arrays of the expenses of one month and its income figures"""
+
+    __slots__ = ('amount', 'codes', 'monthly_income', 'additional_income', 'meal_tickets')
+
+    def __init__(self):
+        self.amount = array('d')
+        self.codes = {column: array('q') for column in GROUP_COLUMNS}
+        self.monthly_income = 0.0
+        self.additional_income = 0.0
+        self.meal_tickets = 0.0
+
+
+class ExpenseColumns:
+    """Columnar copy of every stored month, kept in step with the data"""
+    # Code 0 means the expense has no value for that column and is left out of the sums
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.labels = {column: [None] for column in GROUP_COLUMNS}
+        self._codes = {column: {} for column in GROUP_COLUMNS}
+        self._months = None
+        self._stale = set()
+        # Concatenated arrays of all months, rebuilt after a change
+        self._combined = None
+
+    def _code(self, column: str, label: Optional[str]) -> int:
+        if label is None:
+            return 0
+        codes = self._codes[column]
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(self.labels[column])
+            self.labels[column].append(label)
+        return code
+
+    def _project(self, month_key: str, month: Dict) -> MonthColumns:
+        columns = MonthColumns()
+        codes = columns.codes
+        for expense in recurring.month_expenses(self.data, month_key, month):
+            columns.amount.append(expense['total_amount'])
+            codes['status'].append(self._code('status', STATUS_GROUPS.get(expense.get('status'))))
+            codes['category'].append(self._code('category', expense.get('category') or 'other'))
+            credit_type = expense.get('credit_type') if expense.get('type') == 'Credit' else None
+            codes['credit_type'].append(self._code('credit_type', credit_type))
+
+        columns.monthly_income = month.get('income', {}).get('monthly_income', 0.0)
+        columns.additional_income = sum(item['amount'] for item in month.get('other_income', []))
+        tickets = month.get('meal_tickets')
+        if tickets:
+            columns.meal_tickets = tickets['worked_days'] * tickets['value_per_day']
+        return columns
+
+    def _ensure_current(self):
+        monthly_data = self.data['monthly_data']
+        if self._months is None:
+            self._months = {key: self._project(key, read_month(monthly_data, key))
+                            for key in sorted(monthly_data)}
+            self._stale.clear()
+            self._combined = None
+        elif self._stale:
+            for key in self._stale:
+                if key in monthly_data:
+                    self._months[key] = self._project(key, read_month(monthly_data, key))
+                else:
+                    self._months.pop(key, None)
+            self._stale.clear()
+            self._combined = None
+
+    def update_month(self, month_key: str):
+        """Mark a month as changed (or deleted)"""
+        if self._months is not None:
+            self._stale.add(month_key)
+
+    def invalidate_from(self, month_key: str):
+        """Mark every stored month from month_key on, after a recurring rule changed"""
+        if self._months is not None:
+            self._stale.update(key for key in self.data['monthly_data'] if key >= month_key)
+
+    def months(self) -> List[str]:
+        self._ensure_current()
+        return sorted(self._months)
+
+    def _columns(self):
+        """(month keys, month positions, amounts, codes per column) of all months"""
+        self._ensure_current()
+        if self._combined is None:
+            keys = sorted(self._months)
+            positions = array('q')
+            amounts = array('d')
+            codes = {column: array('q') for column in GROUP_COLUMNS}
+            for position, key in enumerate(keys):
+                month = self._months[key]
+                positions.extend(array('q', [position]) * len(month.amount))
+                amounts.extend(month.amount)
+                for column in GROUP_COLUMNS:
+                    codes[column].extend(month.codes[column])
+            self._combined = (keys, positions, amounts, codes)
+        return self._combined
+
+    def sums_by(self, column: str) -> Dict[str, List[float]]:
+        """Expense totals per label of a column, one value per month of `months()`"""
+        keys, positions, amounts, codes = self._columns()
+        width = len(self.labels[column])
+        size = len(keys) * width
+
+        if numpy is not None and len(amounts):
+            flat = (numpy.frombuffer(positions, dtype=numpy.int64) * width +
+                    numpy.frombuffer(codes[column], dtype=numpy.int64))
+            sums = numpy.bincount(flat, weights=numpy.frombuffer(amounts, dtype=numpy.float64),
+                                  minlength=size).tolist()
+        else:
+            sums = [0.0] * size
+            for position, code, amount in zip(positions, codes[column], amounts):
+                sums[position * width + code] += amount
+
+        return {label: sums[code::width] for code, label in enumerate(self.labels[column])
+                if label is not None}
+
+    def expense_totals(self) -> List[float]:
+        """Total expenses of every month of `months()`"""
+        keys, positions, amounts, _ = self._columns()
+        if numpy is not None and len(amounts):
+            return numpy.bincount(numpy.frombuffer(positions, dtype=numpy.int64),
+                                  weights=numpy.frombuffer(amounts, dtype=numpy.float64),
+                                  minlength=len(keys)).tolist()
+        totals = [0.0] * len(keys)
+        for position, amount in zip(positions, amounts):
+            totals[position] += amount
+        return totals
+
+    def income(self) -> Dict[str, List[float]]:
+        """Income figures of every month of `months()`"""
+        self._ensure_current()
+        months = [self._months[key] for key in sorted(self._months)]
+        return {
+            'monthly_income': [month.monthly_income for month in months],
+            'additional_income': [month.additional_income for month in months],
+            'meal_tickets': [month.meal_tickets for month in months]
+        }
+
+
+def by_year(months: List[str], values: List[float]) -> Dict[str, float]:
+    """Sum a monthly series per year"""
+    years = {}
+    for month_key, value in zip(months, values):
+        year = month_key[:4]
+        years[year] = years.get(year, 0.0) + value
+    return years
+
+
+def rolling_mean(values: List[float], window: int) -> List[float]:
+    """Trailing average over the last `window` values (fewer at the start)"""
+    result = []
+    running = 0.0
+    for position, value in enumerate(values):
+        running += value
+        if position >= window:
+            running -= values[position - window]
+        result.append(running / min(position + 1, window))
+    return result
+
+
+def report(columns: ExpenseColumns, group: str = 'category', period: str = 'year',
+           window: int = 3, start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    """Expense totals per group and the income/expense trend over time"""
+    months = columns.months()
+    groups = columns.sums_by(group)
+    expenses = columns.expense_totals()
+    income = columns.income()
+    household = [sum(values) for values in zip(income['monthly_income'],
+                                               income['additional_income'],
+                                               income['meal_tickets'])]
+
+    selected = [position for position, key in enumerate(months)
+                if (start is None or key >= start) and (end is None or key <= end)]
+    months = [months[position] for position in selected]
+
+    def pick(values):
+        return [values[position] for position in selected]
+
+    series = {
+        'expenses': pick(expenses),
+        'monthly_income': pick(income['monthly_income']),
+        'household_income': pick(household)
+    }
+    groups = {label: pick(values) for label, values in groups.items()}
+
+    if period == 'year':
+        periods = sorted({key[:4] for key in months})
+        series = {name: list(by_year(months, values).values()) for name, values in series.items()}
+        groups = {label: [by_year(months, values).get(year, 0.0) for year in periods]
+                  for label, values in groups.items()}
+    else:
+        periods = months
+
+    # Only groups that had expenses in the selected months
+    groups = {label: values for label, values in groups.items() if any(values)}
+    series['remaining'] = [income - spent for income, spent in
+                           zip(series['monthly_income'], series['expenses'])]
+    series['expenses_average'] = rolling_mean(series['expenses'], max(window, 1))
+
+    return {'periods': periods, 'groups': groups, **series}
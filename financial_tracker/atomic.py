@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import codec
+
+# 'json' is the readable default; 'compact' is the binary format of codec.py
+SNAPSHOT_FORMATS = ('json', 'compact')
+
+# The checksum is stored as the last key of the JSON object, so snapshot
+# files stay plain JSON that any tool (and older versions) can read
+CHECKSUM_KEY = '_checksum'
+_TRAILER_START = b',\n  "' + CHECKSUM_KEY.encode('ascii') + b'": "sha256:'
+_TRAILER_END = b'"\n}\n'
+_DIGEST_LENGTH = 64
+
+# Journal records carry it the same way, as the last key of their line
+_RECORD_TRAILER_START = b',"' + CHECKSUM_KEY.encode('ascii') + b'":"sha256:'
+_RECORD_TRAILER_END = b'"}'
+
+# Compact snapshots: header, sha256 of the body, then the codec.py body
+_COMPACT_HEADER = b'FTS1'
+_COMPACT_BODY_START = len(_COMPACT_HEADER) + 32
+
+
+class CorruptDataError(Exception):
+    """No readable copy of a data file could be found"""
+
+    def __init__(self, path: Path, moved_to: List[Path], message: Optional[str] = None):
+        self.path = path
+        self.moved_to = moved_to
+        names = ', '.join(str(p) for p in moved_to)
+        super().__init__(message or
+                         f"No valid copy of {path} found; damaged files were kept as: {names}")
+
+
+def _fsync_dir(directory: Path):
+    """Make a rename inside directory durable (not possible on Windows)"""
+    try:
+        fd = os.open(str(directory), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def generation_path(path: Path, generation: int) -> Path:
+    """Path of an older copy: generation 0 is the file itself, 1 the previous one..."""
+    if generation == 0:
+        return path
+    return path.with_name(f"{path.name}.{generation}")
+
+
+def write_file_atomic(path: Path, data, generations: int = 0):
+    """Write text or bytes to path so that a crash never leaves a partial file
+
+    The data goes to a temporary file that is fsynced and then renamed over
+    path. With `generations` > 0 the previous copies are kept as path.1
+    (newest) up to path.<generations> (oldest).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if generations > 0 and path.exists():
+        for generation in range(generations - 1, 0, -1):
+            older = generation_path(path, generation)
+            if older.exists():
+                os.replace(older, generation_path(path, generation + 1))
+        os.replace(path, generation_path(path, 1))
+
+    os.replace(tmp_path, path)
+    _fsync_dir(path.parent)
+
+
+def add_checksum(text: str) -> bytes:
+    """Append the checksum of a JSON object text as its last key"""
+    content = text.rstrip()
+    if not content.startswith('{') or not content.endswith('}'):
+        raise ValueError("Only JSON objects can carry a checksum")
+    content = content[:-1].rstrip().encode('utf-8')
+    if content == b'{':
+        # Nothing to protect, and no key to put the comma after
+        return b'{}\n'
+    digest = hashlib.sha256(content).hexdigest().encode('ascii')
+    return content + _TRAILER_START + digest + _TRAILER_END
+
+
+def verify_checksum(raw: bytes) -> Tuple[bool, bool]:
+    """Return (has_checksum, valid) for the raw bytes of a snapshot
+
+    Only the bytes are hashed; nothing has to be parsed or re-serialized.
+    """
+    idx = raw.rfind(_TRAILER_START)
+    if idx < 0:
+        return False, True
+    digest_start = idx + len(_TRAILER_START)
+    digest = raw[digest_start:digest_start + _DIGEST_LENGTH]
+    if raw[digest_start + _DIGEST_LENGTH:] != _TRAILER_END:
+        return True, False
+    return True, hashlib.sha256(raw[:idx]).hexdigest().encode('ascii') == digest
+
+
+def encode_record(record: Dict) -> bytes:
+    """One journal line: the record as compact JSON with its checksum as last key"""
+    content = json.dumps(record, ensure_ascii=False, separators=(',', ':'),
+                         default=json_default).encode('utf-8')
+    if not content.startswith(b'{') or content == b'{}':
+        raise ValueError("Only non-empty JSON objects can carry a checksum")
+    content = content[:-1]
+    digest = hashlib.sha256(content).hexdigest().encode('ascii')
+    return content + _RECORD_TRAILER_START + digest + _RECORD_TRAILER_END + b'\n'
+
+
+def decode_record(line: bytes) -> Dict:
+    """Verify and decode one journal line, raising ValueError if damaged
+
+    Lines written before records had a checksum are read as they are.
+    """
+    line = line.rstrip(b'\r\n')
+    idx = line.rfind(_RECORD_TRAILER_START)
+    if idx >= 0:
+        digest_start = idx + len(_RECORD_TRAILER_START)
+        digest = line[digest_start:digest_start + _DIGEST_LENGTH]
+        if (line[digest_start + _DIGEST_LENGTH:] != _RECORD_TRAILER_END
+                or hashlib.sha256(line[:idx]).hexdigest().encode('ascii') != digest):
+            raise ValueError("Checksum mismatch")
+    record = json.loads(line.decode('utf-8'))
+    if not isinstance(record, dict):
+        raise ValueError("Unexpected content")
+    record.pop(CHECKSUM_KEY, None)
+    return record
+
+
+def json_default(value):
+    """Let json serialize lazily loaded mappings such as LazyMonths"""
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_snapshot(data: Dict, fmt: str = 'json') -> bytes:
+    """Serialize a data structure in one of SNAPSHOT_FORMATS with a checksum"""
+    if fmt == 'json':
+        return add_checksum(json.dumps(data, indent=2, ensure_ascii=False, default=json_default))
+    if fmt == 'compact':
+        body = codec.encode(data)
+        return _COMPACT_HEADER + hashlib.sha256(body).digest() + body
+    raise ValueError(f"Unknown data format: {fmt}")
+
+
+def decode_snapshot(raw: bytes) -> Dict:
+    """Verify and decode a snapshot in any of SNAPSHOT_FORMATS
+
+    Raises ValueError when the content is damaged.
+    """
+    if raw[:len(_COMPACT_HEADER)] == _COMPACT_HEADER:
+        body = raw[_COMPACT_BODY_START:]
+        if hashlib.sha256(body).digest() != raw[len(_COMPACT_HEADER):_COMPACT_BODY_START]:
+            raise ValueError("Checksum mismatch")
+        data = codec.decode(body)
+    else:
+        has_checksum, valid = verify_checksum(raw)
+        if not valid:
+            raise ValueError("Checksum mismatch")
+        data = json.loads(raw.decode('utf-8'))
+    if not isinstance(data, dict):
+        raise ValueError("Unexpected content")
+    data.pop(CHECKSUM_KEY, None)
+    return data
+
+
+def _read_valid(path: Path) -> Dict:
+    """Read and verify a single snapshot file, raising ValueError if damaged"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        return decode_snapshot(raw)
+    except ValueError as e:
+        raise ValueError(f"{e} in {path}")
+
+
+def read_snapshot(path: Path, generations: int = 0) -> Dict:
+    """Read the newest valid copy of a snapshot
+
+    Normally only the current file is read and verified. If it is missing
+    (a crash between the rotation renames) or damaged, older generations
+    are tried from newest to oldest. When no copy is valid the damaged files
+    are renamed to '<name>.corrupt' so new saves cannot overwrite them, and
+    CorruptDataError is raised. A missing file without older copies is not
+    an error: FileNotFoundError is raised for the caller to handle.
+    """
+    path = Path(path)
+    candidates = [generation_path(path, g) for g in range(generations + 1)]
+    existing = [candidate for candidate in candidates if candidate.exists()]
+    if not existing:
+        raise FileNotFoundError(str(path))
+
+    for candidate in existing:
+        try:
+            data = _read_valid(candidate)
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"Skipping damaged data file {candidate}: {e}")
+            continue
+        if candidate != path:
+            print(f"Recovered data from older copy {candidate}")
+        return data
+
+    moved_to = []
+    for candidate in existing:
+        target = candidate.with_name(candidate.name + '.corrupt')
+        os.replace(candidate, target)
+        moved_to.append(target)
+    raise CorruptDataError(path, moved_to)
@@ -0,0 +1,283 @@
+"""Automatic expense categories from user-defined rules
+
+A rule maps expenses to one of CATEGORIES:
+
+    {'match': 'substring' | 'regex', 'pattern': str, 'category': str,
+     'min_amount': float or None, 'max_amount': float or None}
+
+Patterns are matched against the expense name ignoring case; an empty
+pattern matches every name, so a rule can select by amount alone. Rules
+are tried in order and the first one that matches decides. The user's
+rules are kept in data['category_rules'] and come before DEFAULT_RULES.
+
+`Categorizer` compiles the substring rules into a single regular
+expression shaped like a trie of their keywords (common prefixes are
+written once), so the regex engine follows one branch per character
+instead of trying every keyword. The match at a position is the longest
+keyword starting there and every shorter one starting there is a prefix of
+it, so one scan of a name finds all matching keywords. Regex rules and
+rules with an amount range are tested one by one; there are usually few.
+The part of the result that depends only on the name is cached.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+from . import recurring
+from .storage import month_in_range, read_month
+
+RULES_KEY = 'category_rules'
+
+# Category keys known to the application
+CATEGORIES = ('bills', 'transport', 'food', 'health', 'entertainment', 'clothing',
+              'education', 'other')
+
+MATCH_TYPES = ('substring', 'regex')
+
+# Keywords of common Romanian merchants, used after the user's rules
+DEFAULT_KEYWORDS = {
+    'bills': ('enel', 'engie', 'electrica', 'e.on', 'apa nova', 'digi', 'rcs', 'orange',
+              'vodafone', 'telekom', 'factura', 'utilitati'),
+    'food': ('lidl', 'kaufland', 'carrefour', 'mega image', 'profi', 'auchan', 'penny',
+             'restaurant', 'glovo', 'tazz', 'bolt food', 'supermarket', 'market'),
+    'transport': ('omv', 'petrom', 'rompetrol', 'lukoil', 'uber', 'bolt', 'metrorex',
+                  'stb', 'cfr', 'parcare', 'parking', 'fuel'),
+    'health': ('farmacia', 'pharmacy', 'catena', 'sensiblu', 'regina maria', 'medlife',
+               'clinica', 'dental'),
+    'entertainment': ('netflix', 'spotify', 'hbo', 'cinema', 'steam', 'playstation', 'youtube'),
+    'clothing': ('zara', 'h&m', 'decathlon', 'pepco', 'about you', 'fashion'),
+    'education': ('librarie', 'carturesti', 'udemy', 'coursera', 'scoala', 'school')
+}
+
+DEFAULT_RULES = [{'match': 'substring', 'pattern': keyword, 'category': category}
+                 for category, keywords in DEFAULT_KEYWORDS.items() for keyword in keywords]
+
+
+def make_rule(pattern: str, category: str, match: str = 'substring',
+              min_amount: Optional[float] = None, max_amount: Optional[float] = None) -> Dict:
+    """A validated rule; raises ValueError for an unknown category or a bad regex"""
+    if category not in CATEGORIES:
+        raise ValueError(f"Unknown category {category!r}")
+    if match not in MATCH_TYPES:
+        raise ValueError(f"Unknown match type {match!r}")
+    if match == 'regex':
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression {pattern!r}: {e}") from e
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise ValueError("The minimum amount is larger than the maximum")
+    return {'match': match, 'pattern': pattern, 'category': category,
+            'min_amount': min_amount, 'max_amount': max_amount}
+
+
+def get_rules(data: Dict) -> List[Dict]:
+    """The user's rules in priority order"""
+    return data.get(RULES_KEY, [])
+
+
+def set_rules(data: Dict, rules: List[Dict]):
+    data[RULES_KEY] = list(rules)
+
+
+def _has_range(rule: Dict) -> bool:
+    return rule.get('min_amount') is not None or rule.get('max_amount') is not None
+
+
+def _in_range(rule: Dict, amount: Optional[float]) -> bool:
+    if not _has_range(rule):
+        return True
+    if amount is None:
+        return False
+    if rule.get('min_amount') is not None and amount < rule['min_amount']:
+        return False
+    if rule.get('max_amount') is not None and amount > rule['max_amount']:
+        return False
+    return True
+
+
+def trie_pattern(keywords: Iterable[str]) -> str:
+    """Regular expression matching any of the keywords, longest first"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A keyword ends here; try the longer ones first
+            pattern = '(?:' + pattern + ')?'
+        return pattern
+
+    return emit(trie)
+
+
+class Categorizer:
+    """Compiled form of a list of rules"""
+
+    def __init__(self, rules: Iterable[Dict]):
+        self.rules = list(rules)
+        self._cache = {}
+
+        # Lowercase keyword -> index of the first substring rule using it
+        self._keywords = {}
+        # (index, compiled regex) of regex rules, tested one by one
+        self._regexes = []
+        # (index, rule, compiled regex) of rules with an amount range
+        self._ranged = []
+        # A rule matching every name; rules after it can never win
+        self._fallback = None
+        for index, rule in enumerate(self.rules):
+            pattern = rule['pattern']
+            if rule.get('match') != 'regex':
+                pattern = re.escape(pattern)
+            if _has_range(rule):
+                self._ranged.append((index, rule, re.compile(pattern, re.IGNORECASE)))
+            elif not rule['pattern']:
+                self._fallback = index
+                break
+            elif rule.get('match') == 'regex':
+                self._regexes.append((index, re.compile(pattern, re.IGNORECASE)))
+            else:
+                self._keywords.setdefault(rule['pattern'].lower(), index)
+
+        # A match is the longest keyword at its position; the shorter keywords
+        # matching there are its prefixes, so the first rule among them is
+        # known in advance for every keyword
+        self._first_rule = {}
+        for keyword in self._keywords:
+            self._first_rule[keyword] = min(index for prefix, index in self._keywords.items()
+                                            if keyword.startswith(prefix))
+        self._combined = re.compile(trie_pattern(self._keywords)) if self._keywords else None
+
+    def _by_name(self, name: str) -> Optional[int]:
+        """Index of the first rule without amount range matching name"""
+        best = self._fallback
+        if self._combined is not None:
+            text = name.lower()
+            search = self._combined.search
+            match = search(text)
+            while match is not None:
+                index = self._first_rule[match.group()]
+                if best is None or index < best:
+                    best = index
+                match = search(text, match.start() + 1)
+
+        for index, regex in self._regexes:
+            if best is not None and index > best:
+                break
+            if regex.search(name):
+                best = index
+                break
+        return best
+
+    def match(self, name: str, amount: Optional[float] = None) -> Optional[Dict]:
+        """The first rule matching an expense name and amount, or None"""
+        name = name or ''
+        try:
+            best = self._cache[name]
+        except KeyError:
+            best = self._by_name(name)
+            if len(self._cache) < 100000:
+                self._cache[name] = best
+
+        for index, rule, regex in self._ranged:
+            if best is not None and index > best:
+                break
+            if _in_range(rule, amount) and regex.search(name):
+                best = index
+                break
+        return None if best is None else self.rules[best]
+
+    def category(self, name: str, amount: Optional[float] = None) -> Optional[str]:
+        """Category of the first matching rule, or None"""
+        rule = self.match(name, amount)
+        return None if rule is None else rule['category']
+
+
+def for_data(data: Dict, defaults: bool = True) -> Categorizer:
+    """Categorizer of the user's rules, followed by DEFAULT_RULES"""
+    rules = list(get_rules(data))
+    if defaults:
+        rules += DEFAULT_RULES
+    return Categorizer(rules)
+
+
+def _new_category(expense: Dict, categorizer: Categorizer, only_other: bool) -> Optional[str]:
+    """Category the rules give an expense, None when it keeps its own"""
+    if only_other and expense.get('category', 'other') != 'other':
+        return None
+    category = categorizer.category(expense.get('name'), expense.get('total_amount'))
+    if category is not None and category != expense.get('category'):
+        return category
+    return None
+
+
+def recategorize(ledger, categorizer: Optional[Categorizer] = None, start: Optional[str] = None,
+                 end: Optional[str] = None, only_other: bool = False) -> int:
+    """Apply the rules to the stored expenses, return how many changed
+
+    Covers one-off expenses of the months between start and end and the
+    recurring rules (and their edited instances). Expenses no rule matches
+    keep their category; with only_other only those in 'other' are changed.
+    All changes go through the ledger and are undone as one step.
+    """
+    if categorizer is None:
+        categorizer = for_data(ledger.data)
+    data = ledger.data
+    monthly_data = data['monthly_data']
+    changed = 0
+    last_month = None
+
+    for month_key in sorted(monthly_data):
+        if not month_in_range(month_key, start, end):
+            continue
+        month = read_month(monthly_data, month_key)
+        categories = {position: _new_category(expense, categorizer, only_other)
+                      for position, expense in enumerate(month.get('expenses', []))}
+        categories = {position: category for position, category in categories.items()
+                      if category is not None}
+        # Edited instances of recurring expenses are kept with their month
+        overrides = month.get('overrides') or {}
+        override_categories = {rule_id: _new_category(override, categorizer, only_other)
+                               for rule_id, override in overrides.items() if override}
+        override_categories = {rule_id: category for rule_id, category
+                               in override_categories.items() if category is not None}
+        if categories or override_categories:
+            # The expenses that keep their category are shared
+            replaced = dict(month)
+            if categories:
+                replaced['expenses'] = [dict(expense, category=categories[position])
+                                        if position in categories else expense
+                                        for position, expense in enumerate(month['expenses'])]
+            if override_categories:
+                replaced['overrides'] = {
+                    rule_id: dict(override, category=override_categories[rule_id])
+                    if rule_id in override_categories else override
+                    for rule_id, override in overrides.items()}
+            ledger.replace_month(month_key, replaced)
+            changed += len(categories) + len(override_categories)
+            last_month = month_key
+
+    # Recurring expenses change from the month their rule starts; a rule
+    # that starts before the range keeps its category
+    rules = recurring.get_rules(data)
+    for rule_id, rule in list(rules.items()):
+        if not month_in_range(rule['start'], start, end):
+            continue
+        category = _new_category(rule['template'], categorizer, only_other)
+        if category is not None:
+            template = dict(rule['template'], category=category)
+            ledger.replace_rule(rule_id, dict(rule, template=template))
+            changed += 1
+            last_month = max(last_month or rule['start'], rule['start'])
+
+    if last_month is not None:
+        ledger.record_change(last_month)
+    return changed
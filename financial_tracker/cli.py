@@ -0,0 +1,394 @@
+"""Command line interface that works on the data file of the application
+
+    python -m financial_tracker summary 2025_03
+    python -m financial_tracker add "Cinema" 45 --category entertainment
+    python -m financial_tracker import statement.csv
+    python -m financial_tracker batch < commands.txt
+
+Nothing here imports tkinter, so it runs without a display. Changes are
+saved once, when the command (or the whole batch) has finished; a batch
+that stops at an error saves nothing.
+"""
+
+import argparse
+import json
+import math
+import os
+import shlex
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from . import instrument, recurring
+from .categorize import CATEGORIES
+from .ledger import Ledger
+from .locking import ConflictError
+from .storage import STORAGE_MODES, open_store
+
+# Status names accepted on the command line and their stored form
+STATUSES = {'paid': 'Achitat', 'unpaid': 'Neachitat', 'reserved': 'Rezervat'}
+
+
+class CommandError(Exception):
+    """A command that cannot be carried out; the message is shown to the user"""
+
+
+class _Parser(argparse.ArgumentParser):
+    # Batch lines are parsed with the same parser, so errors must not exit
+    def error(self, message):
+        raise CommandError(f"{self.prog}: {message}")
+
+
+def month_key(text: Optional[str]) -> str:
+    """YYYY_MM key of a month written as YYYY_MM or YYYY-MM (default: this month)"""
+    if not text:
+        return datetime.now().strftime('%Y_%m')
+    try:
+        parsed = datetime.strptime(text.replace('-', '_'), '%Y_%m')
+    except ValueError:
+        raise CommandError(f"Invalid month {text!r}, use YYYY_MM") from None
+    return parsed.strftime('%Y_%m')
+
+
+def amount(text: str) -> float:
+    """Finite amount given on the command line"""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid amount {text!r}") from None
+    if not math.isfinite(value):
+        raise argparse.ArgumentTypeError(f"the amount must be a finite number, not {text!r}")
+    return value
+
+
+class Session:
+    """Ledger of a data file and whether it has to be saved"""
+
+    def __init__(self, ledger: Ledger, store=None, out=None):
+        self.ledger = ledger
+        self.store = store
+        self.out = out or sys.stdout
+        self.changed = False
+
+    def print(self, *values):
+        try:
+            print(*values, file=self.out)
+        except BrokenPipeError:
+            # The reader stopped (e.g. `| head`); finish the command silently
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, self.out.fileno())
+            os.close(devnull)
+
+    def print_json(self, value):
+        self.print(json.dumps(value, indent=2, ensure_ascii=False))
+
+
+def cmd_summary(session: Session, args):
+    month = session.ledger.open_month(month_key(args.month))
+    totals = Ledger.calculate_totals(month)
+    if args.json:
+        session.print_json({'month': month.key, **totals})
+        return
+    session.print(f"Month {month.key}")
+    for name, value in totals.items():
+        session.print(f"  {name.replace('_', ' '):<26}{value:>12.2f}")
+
+
+def cmd_list(session: Session, args):
+    month = session.ledger.open_month(month_key(args.month))
+    if args.json:
+        session.print_json({'month': month.key, 'expenses': month.expenses})
+        return
+    session.print(f"Month {month.key}: {len(month.expenses)} expenses")
+    for number, expense in enumerate(month.expenses, start=1):
+        flag = 'R' if expense.get('rule_id') else ' '
+        session.print(f"{number:>4} {flag} {expense.get('name', '')[:32]:<32} "
+                      f"{expense.get('total_amount', 0.0):>10.2f}  "
+                      f"{expense.get('status', ''):<10} {expense.get('category') or ''}")
+
+
+def cmd_add(session: Session, args):
+    if args.months is not None and args.months < 1:
+        raise CommandError("--months must be at least 1")
+    ledger = session.ledger
+    month = ledger.open_month(month_key(args.month))
+    expense = {
+        'name': args.name,
+        'type': 'Normal',
+        'base_amount': args.amount,
+        'total_amount': args.amount,
+        'status': STATUSES[args.status],
+        'reserved': False,
+        'category': args.category
+    }
+    if args.months is not None:
+        expense['recurring_months'] = args.months
+        expense['auto_add'] = True
+    elif args.indefinite:
+        expense['recurring_indefinite'] = True
+        expense['auto_add'] = True
+
+    ledger.add_expense(month, expense)
+    ledger.commit_month(month)
+    session.changed = True
+    session.print(f"Added {args.name} ({args.amount:.2f}) to {month.key}")
+
+
+def cmd_remove(session: Session, args):
+    ledger = session.ledger
+    month = ledger.open_month(month_key(args.month))
+    if args.number is not None:
+        if not 1 <= args.number <= len(month.expenses):
+            raise CommandError(f"{month.key} has no expense number {args.number}")
+        positions = [args.number - 1]
+    else:
+        positions = [position for position, expense in enumerate(month.expenses)
+                     if expense.get('name') == args.name]
+        if not positions:
+            raise CommandError(f"{month.key} has no expense named {args.name!r}")
+
+    # From the end, so the remaining positions stay valid
+    for position in reversed(positions):
+        expense = ledger.remove_expense(month, position)
+        session.print(f"Removed {expense.get('name')} from {month.key}")
+    ledger.commit_month(month)
+    session.changed = True
+
+
+def cmd_import(session: Session, args):
+    from .importers import StatementError, import_file
+
+    options = {key: value for key, value in (('encoding', args.encoding),
+                                             ('date_format', args.date_format),
+                                             ('delimiter', args.delimiter)) if value}
+    try:
+        result = import_file(session.ledger, args.file, include_income=not args.no_income,
+                             **options)
+    except (StatementError, OSError, UnicodeDecodeError) as e:
+        raise CommandError(f"Cannot import {args.file}: {e}") from e
+    session.changed = session.changed or bool(result.get('months'))
+    if args.json:
+        session.print_json(result)
+    else:
+        session.print(f"Imported {result.get('expenses', 0)} expenses and "
+                      f"{result.get('income', 0)} income entries into {result.get('months', 0)} "
+                      f"months, skipped {result.get('duplicates', 0)} duplicates")
+
+
+def cmd_export(session: Session, args):
+    from .exporters import export
+
+    try:
+        counts = export(session.ledger.data, args.directory, args.format, tables=args.tables,
+                        start=args.start and month_key(args.start),
+                        end=args.end and month_key(args.end))
+    except (OSError, ValueError) as e:
+        raise CommandError(f"Export failed: {e}") from e
+    if args.json:
+        session.print_json(counts)
+    else:
+        for table, count in counts.items():
+            session.print(f"{table}: {count} rows")
+
+
+def cmd_recurring(session: Session, args):
+    data = session.ledger.data
+    rules = recurring.get_rules(data)
+    if args.expand is None:
+        if args.json:
+            session.print_json(rules)
+            return
+        for rule_id, rule in rules.items():
+            count = 'indefinite' if rule['count'] is None else f"{rule['count']} months"
+            template = rule['template']
+            session.print(f"{rule_id}  {template.get('name', '')[:32]:<32} "
+                          f"{template.get('total_amount', 0.0):>10.2f}  from {rule['start']}, {count}")
+        return
+
+    # Expenses the rules produce in every month of the range
+    start = month_key(args.expand[0])
+    end = month_key(args.expand[1]) if len(args.expand) > 1 else start
+    if end < start:
+        raise CommandError("The end month comes before the start month")
+    months = {}
+    key = start
+    while key <= end:
+        months[key] = recurring.expand_rules(data, key)
+        key = recurring.add_months(key, 1)
+
+    if args.json:
+        session.print_json(months)
+        return
+    for key, expenses in months.items():
+        total = sum(expense.get('total_amount', 0.0) for expense in expenses)
+        session.print(f"{key}: {len(expenses)} recurring expenses, {total:.2f}")
+        for expense in expenses:
+            session.print(f"    {expense.get('name', '')[:32]:<32} {expense.get('total_amount', 0.0):>10.2f}")
+
+
+def cmd_search(session: Session, args):
+    hits = session.ledger.search_index.search(' '.join(args.query), limit=args.limit)
+    if args.json:
+        session.print_json(hits)
+        return
+    for hit in hits:
+        amount = f"{hit['amount']:.2f}" if isinstance(hit['amount'], (int, float)) else ''
+        session.print(f"{hit['month']}  {hit['kind']:<13} {hit['text'][:32]:<32} {amount:>10}")
+
+
+def cmd_serve(session: Session, args):
+    from .server import serve
+
+    serve(session.ledger, session.store, args.host, args.port, args.token)
+
+
+def cmd_batch(session: Session, args):
+    """Run one command per line of a file or of the standard input"""
+    parser = build_parser()
+    try:
+        lines = sys.stdin if args.file in (None, '-') else open(args.file, encoding='utf-8')
+    except OSError as e:
+        raise CommandError(f"Cannot read {args.file}: {e}") from e
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            try:
+                line_args = parser.parse_args(shlex.split(line))
+                if line_args.command in ('batch', 'serve'):
+                    raise CommandError(f"{line_args.command} cannot be used in a batch")
+                # Options given to the batch apply to every line
+                line_args.json = line_args.json or args.json
+                line_args.handler(session, line_args)
+            except CommandError as e:
+                raise CommandError(f"line {line_number}: {e}") from e
+            except Exception as e:
+                # The batch stops like for any other error, without a traceback
+                raise CommandError(f"line {line_number}: {type(e).__name__}: {e}") from e
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = _Parser(prog='financial_tracker', description="Financial Tracker without the window")
+    parser.add_argument('--data', help="data file (default: ~/financial_data.json)")
+    parser.add_argument('--storage', choices=STORAGE_MODES,
+                        help="storage mode (default: detected, like the application)")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    commands = parser.add_subparsers(dest='command', parser_class=_Parser)
+
+    def command(name, handler, help_text):
+        sub = commands.add_parser(name, help=help_text, description=help_text)
+        # Also accepted after the command; SUPPRESS keeps a --json given before it
+        sub.add_argument('--json', action='store_true', default=argparse.SUPPRESS,
+                         help=argparse.SUPPRESS)
+        sub.set_defaults(handler=handler)
+        return sub
+
+    sub = command('summary', cmd_summary, "totals of a month")
+    sub.add_argument('month', nargs='?', help="YYYY_MM (default: this month)")
+
+    sub = command('list', cmd_list, "expenses of a month, numbered")
+    sub.add_argument('month', nargs='?', help="YYYY_MM (default: this month)")
+
+    sub = command('add', cmd_add, "add an expense")
+    sub.add_argument('name')
+    sub.add_argument('amount', type=amount)
+    sub.add_argument('--month', help="YYYY_MM (default: this month)")
+    sub.add_argument('--category', choices=CATEGORIES, default='other')
+    sub.add_argument('--status', choices=list(STATUSES), default='unpaid')
+    recurrence = sub.add_mutually_exclusive_group()
+    recurrence.add_argument('--months', type=int, help="repeat in this many months")
+    recurrence.add_argument('--indefinite', action='store_true', help="repeat every month")
+
+    sub = command('remove', cmd_remove, "remove expenses from a month")
+    target = sub.add_mutually_exclusive_group(required=True)
+    target.add_argument('number', nargs='?', type=int, help="number shown by list")
+    target.add_argument('--name', help="remove every expense with this name")
+    sub.add_argument('--month', help="YYYY_MM (default: this month)")
+
+    sub = command('import', cmd_import, "import a CSV or OFX bank statement")
+    sub.add_argument('file')
+    sub.add_argument('--no-income', action='store_true', help="skip money received")
+    sub.add_argument('--encoding')
+    sub.add_argument('--date-format', help="strptime format of the dates")
+    sub.add_argument('--delimiter')
+
+    sub = command('export', cmd_export, "export the history to CSV or columnar files")
+    sub.add_argument('directory')
+    sub.add_argument('--format', choices=('csv', 'columnar'), default='csv')
+    sub.add_argument('--tables', nargs='+')
+    sub.add_argument('--start', help="first month, YYYY_MM")
+    sub.add_argument('--end', help="last month, YYYY_MM")
+
+    sub = command('recurring', cmd_recurring, "list the recurring rules or expand them")
+    sub.add_argument('--expand', nargs='+', metavar='MONTH',
+                     help="show the expenses of every month from the first to the second month")
+
+    sub = command('search', cmd_search, "search all months")
+    sub.add_argument('query', nargs='+')
+    sub.add_argument('--limit', type=int, default=50)
+
+    sub = command('serve', cmd_serve, "serve the ledger as an HTTP/JSON API")
+    sub.add_argument('--host', default='127.0.0.1',
+                     help="address to listen on; 0.0.0.0 for the whole LAN")
+    sub.add_argument('--port', type=int, default=8765)
+    sub.add_argument('--token', help="require 'Authorization: Bearer TOKEN' on every request")
+
+    sub = command('batch', cmd_batch, "run commands read from a file or the standard input")
+    sub.add_argument('file', nargs='?', help="file with one command per line (default: stdin)")
+    return parser
+
+
+def save(ledger: Ledger, store, attempts: int = 3):
+    """Save the changes, first taking in what another process saved meanwhile"""
+    for attempt in range(attempts):
+        try:
+            ledger.save(store)
+            return
+        except ConflictError:
+            if attempt == attempts - 1:
+                raise
+            conflicts = ledger.sync(store)['conflicts']
+            if conflicts:
+                print(f"Also changed by another process, keeping this version: "
+                      f"{', '.join(conflicts)}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except CommandError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.command is None:
+        if sys.stdin.isatty():
+            parser.print_help()
+            return 2
+        # Commands piped in without naming the batch command
+        args.command, args.handler, args.file = 'batch', cmd_batch, None
+
+    data_file = Path(args.data) if args.data else Path.home() / 'financial_data.json'
+    store = open_store(data_file, args.storage)
+    try:
+        session = Session(Ledger.from_store(store), store)
+        try:
+            args.handler(session, args)
+        except CommandError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        if session.changed or session.ledger.migrated_rules:
+            data_file.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                save(session.ledger, store)
+            except ConflictError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+    finally:
+        store.close()
+    if instrument.enabled():
+        print(json.dumps(instrument.snapshot()['timings_ms'], indent=2), file=sys.stderr)
+    return 0
@@ -0,0 +1,200 @@
+"""Compact binary encoding for the tracker data
+
+Layout: MAGIC, then the string table (count, then length-prefixed UTF-8
+strings) and finally the root value. Every dict key and every string value
+is written once in the table and referenced by its index afterwards, so
+keys such as 'is_indefinite_recurring' or category names cost one or two
+bytes per use. Integers are zigzag varints; floats holding whole numbers or
+whole cents (typical amounts) are stored as varints as well, other floats
+as 8 byte doubles.
+"""
+
+import math
+import struct
+from collections.abc import Mapping
+from typing import Dict, List
+
+MAGIC = b'FTB1'
+
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_FLOAT = 4
+_FLOAT_WHOLE = 5
+_FLOAT_CENTS = 6
+_STR = 7
+_LIST = 8
+_DICT = 9
+
+_double = struct.Struct('<d')
+
+
+def _write_varint(out: bytearray, value: int):
+    """Append an unsigned integer, 7 bits per byte"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _collect_strings(value, table: Dict[str, int]):
+    """Give every key and string value an index in first-use order"""
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            if item not in table:
+                table[item] = len(table)
+        elif isinstance(item, dict):
+            for key, child in item.items():
+                if key not in table:
+                    table[key] = len(table)
+                stack.append(child)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, Mapping):
+            # Lazily loaded mappings (LazyMonths) are read completely
+            stack.append(dict(item.items()))
+
+
+def encode(value) -> bytes:
+    """Encode JSON-compatible data (dicts with str keys, lists, scalars)"""
+    table = {}
+    _collect_strings(value, table)
+
+    out = bytearray(MAGIC)
+    _write_varint(out, len(table))
+    for text in table:
+        raw = text.encode('utf-8')
+        _write_varint(out, len(raw))
+        out += raw
+
+    def write(item):
+        if item is None:
+            out.append(_NONE)
+        elif item is True:
+            out.append(_TRUE)
+        elif item is False:
+            out.append(_FALSE)
+        elif isinstance(item, str):
+            out.append(_STR)
+            _write_varint(out, table[item])
+        elif isinstance(item, int):
+            out.append(_INT)
+            _write_varint(out, _zigzag(item))
+        elif isinstance(item, float):
+            # -0.0 would come back as 0.0 from the varint forms
+            negative_zero = item == 0 and math.copysign(1.0, item) < 0
+            if item.is_integer() and abs(item) < 2 ** 53 and not negative_zero:
+                out.append(_FLOAT_WHOLE)
+                _write_varint(out, _zigzag(int(item)))
+                return
+            if abs(item) < 2 ** 46 and not negative_zero:
+                cents = round(item * 100)
+                if cents / 100 == item:
+                    out.append(_FLOAT_CENTS)
+                    _write_varint(out, _zigzag(cents))
+                    return
+            out.append(_FLOAT)
+            out.extend(_double.pack(item))
+        elif isinstance(item, dict):
+            out.append(_DICT)
+            _write_varint(out, len(item))
+            for key, child in item.items():
+                _write_varint(out, table[key])
+                write(child)
+        elif isinstance(item, (list, tuple)):
+            out.append(_LIST)
+            _write_varint(out, len(item))
+            for child in item:
+                write(child)
+        elif isinstance(item, Mapping):
+            write(dict(item.items()))
+        else:
+            raise TypeError(f"Cannot encode {type(item).__name__}")
+
+    write(value)
+    return bytes(out)
+
+
+def decode(data: bytes):
+    """Decode bytes produced by `encode()`"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a compact data file")
+
+    buf = memoryview(data)
+    pos = len(MAGIC)
+    unpack_double = _double.unpack_from
+
+    def read_varint():
+        nonlocal pos
+        byte = buf[pos]
+        pos += 1
+        if byte < 0x80:
+            return byte
+        result = byte & 0x7F
+        shift = 7
+        while True:
+            byte = buf[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def read_strings():
+        nonlocal pos
+        strings = []
+        for _ in range(read_varint()):
+            length = read_varint()
+            if pos + length > len(buf):
+                raise ValueError("Truncated compact data")
+            strings.append(str(buf[pos:pos + length], 'utf-8'))
+            pos += length
+        return strings
+
+    def read():
+        nonlocal pos
+        tag = buf[pos]
+        pos += 1
+        if tag == _STR:
+            return strings[read_varint()]
+        if tag == _FLOAT_CENTS:
+            value = read_varint()
+            return (-(value + 1) // 2 if value & 1 else value // 2) / 100
+        if tag == _DICT:
+            return {strings[read_varint()]: read() for _ in range(read_varint())}
+        if tag == _FLOAT_WHOLE:
+            value = read_varint()
+            return float(-(value + 1) // 2 if value & 1 else value // 2)
+        if tag == _INT:
+            value = read_varint()
+            return -(value + 1) // 2 if value & 1 else value // 2
+        if tag == _LIST:
+            return [read() for _ in range(read_varint())]
+        if tag == _FLOAT:
+            value = unpack_double(buf, pos)[0]
+            pos += 8
+            return value
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        raise ValueError(f"Unknown tag {tag} at offset {pos - 1}")
+
+    try:
+        strings: List[str] = read_strings()
+        value = read()
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        # Cut off or garbled: a read past the end or an invalid string
+        raise ValueError("Truncated compact data") from e
+    if pos != len(buf):
+        raise ValueError("Trailing bytes after compact data")
+    return value
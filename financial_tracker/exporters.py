@@ -0,0 +1,299 @@
+"""Export of the whole history to CSV and to a compact columnar format
+
+Rows are produced one month at a time and written in chunks of
+`chunk_rows`, so exporting a long history does not build a second copy of
+it in memory; months of a lazily loaded store are read and dropped again.
+
+Tables (one file each): expenses, other_income, income and meal_tickets.
+Expenses include the instances of recurring rules, as shown in each month.
+
+The columnar format (.ftc) is laid out like a small Parquet file:
+
+    MAGIC, row group, row group, ..., footer (JSON), footer length, MAGIC
+
+Every row group holds up to `chunk_rows` rows stored column by column,
+each column zlib compressed: numbers as little-endian arrays, strings as a
+dictionary of the distinct values plus an array of indexes. The footer
+lists the columns and where each row group starts, so a reader can load
+single row groups or columns.
+"""
+
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import instrument, recurring
+from .storage import month_in_range, read_month
+
+MAGIC = b'FTC1'
+
+# Column name and type ('str', 'float' or 'int') of every table
+TABLES = {
+    'expenses': [
+        ('month', 'str'), ('position', 'int'), ('name', 'str'), ('type', 'str'),
+        ('category', 'str'), ('credit_type', 'str'), ('status', 'str'),
+        ('base_amount', 'float'), ('total_amount', 'float'), ('remaining_months', 'int'),
+        ('indefinite', 'int'), ('rule_id', 'str'), ('bill_total', 'float'),
+        ('bill_paid', 'float'), ('date', 'str')
+    ],
+    'other_income': [
+        ('month', 'str'), ('position', 'int'), ('source', 'str'), ('amount', 'float')
+    ],
+    'income': [
+        ('month', 'str'), ('monthly_income', 'float')
+    ],
+    'meal_tickets': [
+        ('month', 'str'), ('worked_days', 'int'), ('value_per_day', 'float'), ('total', 'float')
+    ]
+}
+
+# Stored in int columns for missing values
+INT_NULL = -2 ** 63
+
+_length = struct.Struct('<I')
+
+
+def iter_months(data: Dict, start: Optional[str] = None,
+                end: Optional[str] = None) -> Iterator[Tuple[str, Dict]]:
+    """(month_key, month) in order, without keeping lazily loaded months"""
+    monthly_data = data['monthly_data']
+    for month_key in sorted(monthly_data):
+        if month_in_range(month_key, start, end):
+            yield month_key, read_month(monthly_data, month_key)
+
+
+def _expense_row(month_key: str, position: int, expense: Dict) -> tuple:
+    return (
+        month_key, position, expense.get('name'), expense.get('type'),
+        expense.get('category'), expense.get('credit_type'), expense.get('status'),
+        expense.get('base_amount'), expense.get('total_amount'),
+        expense.get('remaining_months'),
+        1 if expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring') else 0,
+        expense.get('rule_id'), expense.get('bill_total'), expense.get('bill_paid'),
+        expense.get('date')
+    )
+
+
+def iter_rows(data: Dict, table: str, start: Optional[str] = None,
+              end: Optional[str] = None) -> Iterator[tuple]:
+    """Rows of a table as tuples in the order of TABLES[table]"""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r}; use one of {', '.join(TABLES)}")
+
+    for month_key, month in iter_months(data, start, end):
+        if table == 'expenses':
+            for position, expense in enumerate(recurring.month_expenses(data, month_key, month)):
+                yield _expense_row(month_key, position, expense)
+        elif table == 'other_income':
+            for position, item in enumerate(month.get('other_income', [])):
+                yield month_key, position, item.get('source'), item.get('amount')
+        elif table == 'income':
+            yield month_key, month.get('income', {}).get('monthly_income')
+        elif 'meal_tickets' in month:
+            tickets = month['meal_tickets']
+            yield (month_key, tickets.get('worked_days'), tickets.get('value_per_day'),
+                   tickets.get('worked_days', 0) * tickets.get('value_per_day', 0.0))
+
+
+def chunked(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    """Group rows into lists of at most size rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _open_temporary(path: Path, mode: str, **kwargs):
+    """Open a file next to path; `_finish()` moves it into place"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    return tmp_path, open(tmp_path, mode, **kwargs)
+
+
+def _finish(tmp_path: Path, path: Path, f, ok: bool):
+    f.close()
+    if ok:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink()
+
+
+def write_csv(path, table: str, rows: Iterable[tuple], chunk_rows: int = 5000) -> int:
+    """Write rows of a table to a CSV file with a header, return the row count"""
+    path = Path(path)
+    count = 0
+    tmp_path, f = _open_temporary(path, 'w', newline='', encoding='utf-8')
+    ok = False
+    try:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in TABLES[table]])
+        for chunk in chunked(rows, chunk_rows):
+            writer.writerows(['' if value is None else value for value in row] for row in chunk)
+            count += len(chunk)
+        ok = True
+    finally:
+        _finish(tmp_path, path, f, ok)
+    return count
+
+
+def _encode_column(values: List, kind: str) -> bytes:
+    if kind == 'str':
+        dictionary = {}
+        indexes = array('q', (dictionary.setdefault(value, len(dictionary)) for value in values))
+        header = json.dumps(list(dictionary), ensure_ascii=False).encode('utf-8')
+        body = _le_bytes(indexes)
+        return zlib.compress(_length.pack(len(header)) + header + body)
+    if kind == 'float':
+        column = array('d', (float('nan') if value is None else value for value in values))
+    else:
+        column = array('q', (INT_NULL if value is None else int(value) for value in values))
+    return zlib.compress(_le_bytes(column))
+
+
+def _decode_column(raw: bytes, kind: str) -> List:
+    raw = zlib.decompress(raw)
+    if kind == 'str':
+        size = _length.unpack_from(raw)[0]
+        dictionary = json.loads(raw[4:4 + size].decode('utf-8'))
+        return [dictionary[index] for index in _from_le_bytes('q', raw[4 + size:])]
+    if kind == 'float':
+        return [None if value != value else value for value in _from_le_bytes('d', raw)]
+    return [None if value == INT_NULL else value for value in _from_le_bytes('q', raw)]
+
+
+def _le_bytes(column: array) -> bytes:
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _from_le_bytes(typecode: str, raw: bytes) -> array:
+    column = array(typecode)
+    column.frombytes(raw)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def write_columnar(path, table: str, rows: Iterable[tuple], chunk_rows: int = 5000) -> int:
+    """Write rows of a table to a columnar .ftc file, return the row count"""
+    path = Path(path)
+    schema = TABLES[table]
+    row_groups = []
+    offset = len(MAGIC)
+    tmp_path, f = _open_temporary(path, 'wb')
+    ok = False
+    try:
+        f.write(MAGIC)
+        for chunk in chunked(rows, chunk_rows):
+            sizes = []
+            for position, (_, kind) in enumerate(schema):
+                encoded = _encode_column([row[position] for row in chunk], kind)
+                f.write(encoded)
+                sizes.append(len(encoded))
+            row_groups.append({'offset': offset, 'rows': len(chunk), 'sizes': sizes})
+            offset += sum(sizes)
+
+        footer = json.dumps({
+            'table': table,
+            'columns': [{'name': name, 'type': kind} for name, kind in schema],
+            'row_groups': row_groups
+        }).encode('utf-8')
+        f.write(footer)
+        f.write(_length.pack(len(footer)))
+        f.write(MAGIC)
+        ok = True
+    finally:
+        _finish(tmp_path, path, f, ok)
+    return sum(group['rows'] for group in row_groups)
+
+
+def read_footer(f) -> Dict:
+    """Schema and row group positions of an open .ftc file"""
+    f.seek(-(len(MAGIC) + _length.size), os.SEEK_END)
+    size_raw = f.read(_length.size)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a columnar export file")
+    size = _length.unpack(size_raw)[0]
+    f.seek(-(len(MAGIC) + _length.size + size), os.SEEK_END)
+    return json.loads(f.read(size).decode('utf-8'))
+
+
+def read_columnar(path, columns: Optional[List[str]] = None) -> Iterator[Dict[str, List]]:
+    """Yield {column: values} for every row group of a .ftc file
+
+    Only the requested columns are read and decompressed.
+    """
+    with open(path, 'rb') as f:
+        footer = read_footer(f)
+        schema = footer['columns']
+        wanted = [column['name'] for column in schema]
+        if columns is not None:
+            unknown = set(columns) - set(wanted)
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+            wanted = [name for name in wanted if name in columns]
+
+        for group in footer['row_groups']:
+            values = {}
+            offset = group['offset']
+            for column, size in zip(schema, group['sizes']):
+                if column['name'] in wanted:
+                    f.seek(offset)
+                    values[column['name']] = _decode_column(f.read(size), column['type'])
+                offset += size
+            yield values
+
+
+def read_columnar_rows(path) -> Iterator[Dict]:
+    """Yield the rows of a .ftc file as dicts"""
+    for group in read_columnar(path):
+        names = list(group)
+        for row in zip(*(group[name] for name in names)):
+            yield dict(zip(names, row))
+
+
+FORMATS = {
+    'csv': ('.csv', write_csv),
+    'columnar': ('.ftc', write_columnar)
+}
+
+
+def export(data: Dict, directory, fmt: str = 'csv', tables: Optional[Iterable[str]] = None,
+           start: Optional[str] = None, end: Optional[str] = None,
+           chunk_rows: int = 5000) -> Dict[str, int]:
+    """Write one file per table into directory, return the row count of each
+
+    start/end are YYYY_MM keys limiting the exported months (inclusive).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {', '.join(FORMATS)}")
+    if not isinstance(data.get('monthly_data'), Mapping):
+        raise ValueError("Data has no monthly_data")
+
+    tables = list(tables or TABLES)
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+
+    suffix, writer = FORMATS[fmt]
+    directory = Path(directory)
+    counts = {}
+    with instrument.timer(f'export.{fmt}'):
+        for table in tables:
+            rows = iter_rows(data, table, start, end)
+            counts[table] = writer(directory / f"{table}{suffix}", table, rows, chunk_rows)
+    instrument.count('export.rows', sum(counts.values()))
+    return counts
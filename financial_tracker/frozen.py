@@ -0,0 +1,96 @@
+"""Stored months that cannot be changed in place"""
+
+from typing import Any
+
+
+def _frozen(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} cannot be changed; change a thawed copy")
+
+
+class FrozenDict(dict):
+    """A dict that cannot be changed; copy() gives a mutable (shallow) dict"""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class FrozenList(list):
+    """A list that cannot be changed; copy() gives a mutable (shallow) list"""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _frozen
+    append = extend = insert = pop = remove = reverse = sort = clear = _frozen
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+
+def is_frozen(value) -> bool:
+    return isinstance(value, (FrozenDict, FrozenList))
+
+
+def freeze(value, like: Any = None):
+    """Frozen version of value, sharing what it has in common with `like`"""
+    if is_frozen(value):
+        return value
+    if isinstance(value, dict):
+        old = like if isinstance(like, FrozenDict) else {}
+        items = {key: freeze(child, old.get(key)) for key, child in value.items()}
+        if old is like and len(items) == len(old) and all(
+                key in old and child is old[key] for key, child in items.items()):
+            return like
+        return FrozenDict(items)
+    if isinstance(value, list):
+        old = like if isinstance(like, FrozenList) else ()
+        shortest = min(len(value), len(old))
+        start = 0
+        while start < shortest and _same(value[start], old[start]):
+            start += 1
+        end = 0
+        while end < shortest - start and _same(value[-1 - end], old[-1 - end]):
+            end += 1
+        if old is like and start == len(value) == len(old):
+            return like
+        middle = value[start:len(value) - end]
+        old_middle = old[start:len(old) - end]
+        if len(middle) != len(old_middle):
+            old_middle = [None] * len(middle)
+        return FrozenList(list(old[:start])
+                          + [freeze(item, old_item) for item, old_item in zip(middle, old_middle)]
+                          + list(old[len(old) - end:]))
+    if like is not None and type(like) is type(value) and like == value:
+        return like
+    return value
+
+
+def _same(value, frozen) -> bool:
+    # Equal and of the same type, so the frozen one can stand in for value
+    return value is frozen or (value == frozen and (type(value) is type(frozen)
+                                                    or is_frozen(frozen)))
+
+
+def thaw(value):
+    """Mutable deep copy of a (frozen) value"""
+    if isinstance(value, dict):
+        return {key: thaw(child) for key, child in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
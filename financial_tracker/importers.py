@@ -0,0 +1,301 @@
+"""Bulk import of bank statements (CSV and OFX)
+
+The readers are generators that yield one transaction at a time while
+reading the file in small pieces, so the size of a statement archive does
+not matter. `import_transactions()` turns them into expenses (and other
+income for money received) and adds them to the months they belong to; the
+caller saves once at the end.
+
+A transaction is {'date': date, 'amount': float, 'description': str,
+'id': str or None}; amounts are negative for money spent.
+"""
+
+import csv
+import hashlib
+import re
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from . import categorize as categorization
+from . import instrument
+from .ledger import Ledger
+
+# Header names (lowercase) recognized for each field
+DATE_COLUMNS = ('date', 'data', 'booking date', 'transaction date', 'data tranzactiei',
+                'data tranzacției', 'data operatiunii', 'data operațiunii', 'posted')
+AMOUNT_COLUMNS = ('amount', 'suma', 'sumă', 'valoare', 'value')
+DEBIT_COLUMNS = ('debit', 'debit amount', 'plati', 'plăți')
+CREDIT_COLUMNS = ('credit', 'credit amount', 'incasari', 'încasări')
+DESCRIPTION_COLUMNS = ('description', 'descriere', 'detalii', 'details', 'payee', 'beneficiar',
+                       'merchant', 'name', 'memo', 'explicatie', 'explicație')
+ID_COLUMNS = ('id', 'reference', 'referinta', 'referință', 'transaction id', 'fitid')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%Y%m%d')
+
+
+class StatementError(ValueError):
+    """A statement file that cannot be read"""
+
+
+def parse_amount(text: str) -> float:
+    """Parse amounts written as 1234.56, 1,234.56, 1.234,56 or -12,5"""
+    text = text.strip().replace(' ', '').replace('\xa0', '')
+    for suffix in ('RON', 'LEI', 'EUR', 'USD'):
+        if text.upper().endswith(suffix):
+            text = text[:-len(suffix)]
+    if ',' in text and '.' in text:
+        # The separator that comes last is the decimal one
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.')
+    return float(text)
+
+
+def detect_date_format(text: str) -> str:
+    """The first of DATE_FORMATS that can read a date"""
+    text = text.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            datetime.strptime(text[:len(datetime(2000, 12, 31).strftime(fmt))], fmt)
+            return fmt
+        except ValueError:
+            continue
+    raise ValueError(f"Unknown date format: {text!r}")
+
+
+def parse_date(text: str, date_format: Optional[str] = None) -> date:
+    """Parse a date, ignoring a time that follows it"""
+    text = text.strip()
+    if date_format is None:
+        date_format = detect_date_format(text)
+    if date_format == '%Y-%m-%d':
+        # Much faster than strptime, which matters for large statements
+        return date.fromisoformat(text[:10])
+    return datetime.strptime(text[:len(datetime(2000, 12, 31).strftime(date_format))],
+                             date_format).date()
+
+
+def _find_column(header, names) -> Optional[int]:
+    for position, column in enumerate(header):
+        if column.strip().lower() in names:
+            return position
+    return None
+
+
+def read_csv(path, encoding: str = 'utf-8-sig', date_format: Optional[str] = None,
+             delimiter: Optional[str] = None) -> Iterator[Dict]:
+    """Yield the transactions of a CSV statement with a header row
+
+    The delimiter is detected from the start of the file unless given.
+    Statements with separate debit/credit columns are supported.
+    """
+    with open(path, newline='', encoding=encoding) as f:
+        if delimiter is None:
+            sample = f.read(8192)
+            f.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+            except csv.Error:
+                delimiter = ','
+
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        date_col = _find_column(header, DATE_COLUMNS)
+        amount_col = _find_column(header, AMOUNT_COLUMNS)
+        debit_col = _find_column(header, DEBIT_COLUMNS)
+        credit_col = _find_column(header, CREDIT_COLUMNS)
+        description_col = _find_column(header, DESCRIPTION_COLUMNS)
+        id_col = _find_column(header, ID_COLUMNS)
+        if date_col is None or (amount_col is None and debit_col is None and credit_col is None):
+            raise StatementError(f"{path}: no date or amount column in header {header}")
+
+        for line_number, row in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            try:
+                # All rows of a statement use the format of the first one
+                if date_format is None:
+                    date_format = detect_date_format(row[date_col])
+                if amount_col is not None:
+                    amount = parse_amount(row[amount_col])
+                else:
+                    debit = row[debit_col].strip() if debit_col is not None else ''
+                    credit = row[credit_col].strip() if credit_col is not None else ''
+                    amount = parse_amount(credit) if credit else -abs(parse_amount(debit))
+                yield {
+                    'date': parse_date(row[date_col], date_format),
+                    'amount': amount,
+                    'description': row[description_col].strip() if description_col is not None else '',
+                    'id': row[id_col].strip() or None if id_col is not None else None
+                }
+            except (ValueError, IndexError) as e:
+                raise StatementError(f"{path}, line {line_number}: {e}") from e
+
+
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _ofx_tokens(path, chunk_size: int = 65536) -> Iterator[tuple]:
+    """Yield (closing, tag, text) for every tag of an OFX file, read in chunks"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        pending = ''
+        while True:
+            chunk = f.read(chunk_size)
+            pending += chunk
+            # Keep a tag that may continue in the next chunk
+            cut = max(pending.rfind('<'), 0) if chunk else len(pending)
+            for match in _OFX_TAG.finditer(pending, 0, cut):
+                yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+            pending = pending[cut:]
+            if not chunk:
+                return
+
+
+def read_ofx(path) -> Iterator[Dict]:
+    """Yield the transactions (STMTTRN blocks) of an OFX 1.x or 2.x statement"""
+    current = None
+    for closing, tag, text in _ofx_tokens(path):
+        if tag == 'STMTTRN':
+            if not closing:
+                current = {}
+                continue
+            if current is not None:
+                try:
+                    yield {
+                        'date': parse_date(current['DTPOSTED'][:8], '%Y%m%d'),
+                        'amount': parse_amount(current['TRNAMT']),
+                        'description': current.get('NAME') or current.get('MEMO') or '',
+                        'id': current.get('FITID')
+                    }
+                except (KeyError, ValueError) as e:
+                    raise StatementError(f"{path}: invalid transaction {current}: {e}") from e
+            current = None
+        elif current is not None and not closing and text:
+            current[tag] = text
+
+
+def read_statement(path, **options) -> Iterator[Dict]:
+    """Yield the transactions of a CSV or OFX/QFX file (chosen by extension)"""
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.ofx', '.qfx'):
+        return read_ofx(path)
+    return read_csv(path, **options)
+
+
+def transaction_id(transaction: Dict, occurrence: int = 0) -> str:
+    """Stable id of a transaction, used to skip it when imported again"""
+    if transaction.get('id'):
+        return str(transaction['id'])
+    key = f"{transaction['date'].isoformat()}|{transaction['amount']:.2f}|" \
+          f"{transaction['description']}|{occurrence}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def to_expense(transaction: Dict, categorizer: Optional[categorization.Categorizer] = None) -> Dict:
+    """Expense dict of a payment; statement payments are already paid"""
+    amount = round(abs(transaction['amount']), 2)
+    description = transaction['description'] or 'Import'
+    category = None
+    if categorizer is not None:
+        category = categorizer.category(description, amount)
+    return {
+        'name': description[:60],
+        'type': 'Normal',
+        'base_amount': amount,
+        'total_amount': amount,
+        'status': 'Achitat',
+        'reserved': False,
+        'category': category or 'other',
+        'date': transaction['date'].isoformat()
+    }
+
+
+def import_transactions(ledger: Ledger, transactions: Iterable[Dict],
+                        categorizer: Optional[categorization.Categorizer] = None,
+                        include_income: bool = True) -> Dict:
+    """Add transactions to their months and return counts of what was done
+
+    Payments become expenses, categorized with the rules of the data
+    unless another categorizer is given, and money received becomes other
+    income (unless include_income is False). Transactions imported before, in
+    this or an earlier run, are skipped. Each month is committed to the
+    ledger once the statement moves past it and the whole import is one
+    undo step; when reading fails halfway the months are put back as they
+    were. Saving them is up to the caller.
+    """
+    if categorizer is None:
+        categorizer = categorization.for_data(ledger.data)
+    # Stored form of every month before the import
+    before = {}
+    dirty = set(ledger.dirty_months)
+    seen = {}
+    result = Counter()
+    month = None
+
+    with instrument.timer('import.transactions'):
+        try:
+            for transaction in transactions:
+                month_key = f"{transaction['date'].year}_{transaction['date'].month:02d}"
+                if month is None or month.key != month_key:
+                    if month is not None:
+                        ledger.commit_month(month, record=False)
+                    before.setdefault(month_key, ledger.stored_month(month_key))
+                    month = ledger.open_month(month_key)
+                    if month_key not in seen:
+                        seen[month_key] = ({item['import_id'] for item
+                                            in month.expenses + month.data['other_income']
+                                            if item.get('import_id')}, Counter())
+                ids, occurrences = seen[month_key]
+
+                # Identical transactions on one day are told apart by their order
+                base = (transaction['date'], transaction['amount'], transaction['description'])
+                import_id = transaction_id(transaction, occurrences[base])
+                occurrences[base] += 1
+                if import_id in ids:
+                    result['duplicates'] += 1
+                    continue
+                ids.add(import_id)
+
+                if transaction['amount'] < 0:
+                    expense = to_expense(transaction, categorizer)
+                    expense['import_id'] = import_id
+                    ledger.add_expense(month, expense)
+                    result['expenses'] += 1
+                elif transaction['amount'] > 0 and include_income:
+                    month.data['other_income'].append({
+                        'source': (transaction['description'] or 'Import')[:60],
+                        'amount': round(transaction['amount'], 2),
+                        'import_id': import_id
+                    })
+                    result['income'] += 1
+                else:
+                    result['skipped'] += 1
+        except Exception:
+            for month_key, stored in before.items():
+                if ledger.stored_month(month_key) is not stored:
+                    ledger.replace_month(month_key, stored)
+            ledger.dirty_months.intersection_update(dirty)
+            raise
+
+        if month is not None:
+            ledger.commit_month(month, record=False)
+            ledger.record_change(month.key)
+
+    instrument.count('import.transactions', sum(result.values()))
+    result['months'] = len(before)
+    return dict(result)
+
+
+def import_file(ledger: Ledger, path, **options) -> Dict:
+    """Import a CSV or OFX statement into the ledger"""
+    reader_options = {key: options.pop(key) for key in ('encoding', 'date_format', 'delimiter')
+                      if key in options}
+    return import_transactions(ledger, read_statement(path, **reader_options), **options)
@@ -0,0 +1,64 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .storage import month_in_range, read_month
+
+
+class ExpenseIndex:
+    """Months and positions where each expense name is stored
+
+    Maps name -> {month_key: [positions in month['expenses']]}. Only the
+    expenses stored in months are indexed; recurring rules are a single
+    entry each in data['recurring_rules'] already. Call `update_month()`
+    whenever the expense list of a month is replaced or changed.
+
+    The index is built on first use, which reads every month once.
+    """
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self._by_name = None
+        # month -> names stored in it, to unindex a month without scanning
+        self._by_month = {}
+
+    def _ensure_built(self):
+        if self._by_name is not None:
+            return
+        self._by_name = {}
+        self._by_month = {}
+        monthly_data = self.data['monthly_data']
+        for month_key in list(monthly_data):
+            self._add_month(month_key, read_month(monthly_data, month_key).get('expenses', []))
+
+    def _add_month(self, month_key: str, expenses: Iterable[Dict]):
+        names = set()
+        for position, expense in enumerate(expenses):
+            name = expense.get('name')
+            self._by_name.setdefault(name, {}).setdefault(month_key, []).append(position)
+            names.add(name)
+        if names:
+            self._by_month[month_key] = names
+
+    def _remove_month(self, month_key: str):
+        for name in self._by_month.pop(month_key, ()):
+            months = self._by_name.get(name)
+            if months is None:
+                continue
+            months.pop(month_key, None)
+            if not months:
+                del self._by_name[name]
+
+    def update_month(self, month_key: str, expenses: Optional[Iterable[Dict]] = None):
+        """Re-index one month (pass None when the month was deleted)"""
+        if self._by_name is None:
+            return
+        self._remove_month(month_key)
+        if expenses is not None:
+            self._add_month(month_key, expenses)
+
+    def occurrences(self, name: str, start: Optional[str] = None,
+                    end: Optional[str] = None) -> List[Tuple[str, List[int]]]:
+        """(month_key, positions) for every stored expense with the given name"""
+        self._ensure_built()
+        months = self._by_name.get(name, {})
+        return [(month_key, list(months[month_key])) for month_key in sorted(months)
+                if month_in_range(month_key, start, end)]
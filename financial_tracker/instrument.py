@@ -0,0 +1,197 @@
+"""Opt-in timers and counters for the hot paths of the application
+
+Measuring is off by default; a `timed()` function or a `timer()` block then
+costs a single flag check. It is turned on with `enable()` or by starting
+the application with FINANCIAL_TRACKER_PROFILE=1. The collected numbers are
+shown in the diagnostics window and can be written to a JSON file with
+`dump()`.
+
+    timings   durations of named operations (load, save, navigation, ...)
+    values    sizes of named events, e.g. the bytes written by each save
+    counters  plain event counts
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+# Recent samples kept per metric for the percentiles
+SAMPLES = 1000
+
+
+class Metric:
+    """Count, sum, maximum and the most recent samples of one measurement"""
+
+    __slots__ = ('count', 'total', 'maximum', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+        self.samples.append(value)
+
+    def summary(self, scale: float = 1.0) -> Dict:
+        """Statistics of the metric, values multiplied by scale"""
+        ordered = sorted(self.samples)
+
+        def percentile(fraction):
+            if not ordered:
+                return 0.0
+            return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)] * scale
+
+        return {
+            'count': self.count,
+            'total': self.total * scale,
+            'mean': self.total / self.count * scale if self.count else 0.0,
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'max': self.maximum * scale
+        }
+
+
+class Recorder:
+    """Collected measurements; safe to use from the save thread too"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = datetime.now()
+            self.timings = {}
+            self.values = {}
+            self.counters = Counter()
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            metric = self.timings.get(name)
+            if metric is None:
+                metric = self.timings[name] = Metric()
+            metric.add(seconds)
+
+    def add_value(self, name: str, value: float):
+        with self._lock:
+            metric = self.values.get(name)
+            if metric is None:
+                metric = self.values[name] = Metric()
+            metric.add(value)
+
+    def add_count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def snapshot(self) -> Dict:
+        """Everything collected so far, durations in milliseconds"""
+        with self._lock:
+            return {
+                'started': self.started.isoformat(),
+                'timings_ms': {name: metric.summary(1000.0)
+                               for name, metric in sorted(self.timings.items())},
+                'values': {name: metric.summary() for name, metric in sorted(self.values.items())},
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+
+_recorder = Recorder()
+_enabled = os.environ.get('FINANCIAL_TRACKER_PROFILE', '') not in ('', '0')
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop measuring; what was collected is kept until `reset()`"""
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    _recorder.reset()
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _recorder.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_NO_TIMER = nullcontext()
+
+
+def timer(name: str):
+    """Context manager that times its block under name"""
+    if not _enabled:
+        return _NO_TIMER
+    return _Timer(name)
+
+
+def timed(name: str) -> Callable:
+    """Decorator that times every call of a function under name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _recorder.add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def record(name: str, value: float):
+    """Add a sample of a size (bytes, rows, ...)"""
+    if _enabled:
+        _recorder.add_value(name, value)
+
+
+def count(name: str, n: int = 1):
+    if _enabled:
+        _recorder.add_count(name, n)
+
+
+def snapshot() -> Dict:
+    data = _recorder.snapshot()
+    data['enabled'] = _enabled
+    return data
+
+
+def dump(path, extra: Optional[Dict] = None):
+    """Write the collected measurements to a JSON file"""
+    data = snapshot()
+    data['written'] = datetime.now().isoformat()
+    if extra:
+        data.update(extra)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,664 @@
+"""Ledger engine: the month and expense logic of the application
+
+Everything here is plain Python on the data structure described in the
+README, so it can run without a display: the GUI, command line tools,
+servers and benchmarks all go through the same code.
+"""
+
+from datetime import datetime
+import json
+from typing import Dict, Iterable, List, Optional
+
+from . import instrument, recurring
+from .aggregates import MonthAggregate
+from .analytics import ExpenseColumns
+from .frozen import FrozenDict, freeze, thaw
+from .index import ExpenseIndex
+from .locking import MISSING, merge_month, merge_value
+from .search import SearchIndex
+from .storage import LazyMonths, Store, default_data, dump_compact, read_month
+from .undo import Step, UndoError, diff, patch
+
+# Statuses are always stored in Romanian
+_STATUS_NAMES = {
+    'Achitat': 'Achitat',
+    'Paid': 'Achitat',
+    'Rezervat': 'Rezervat',
+    'Reserved': 'Rezervat'
+}
+
+
+def normalize_status(status: str) -> str:
+    """Internal (Romanian) form of a status given in either language"""
+    return _STATUS_NAMES.get(status, 'Neachitat')
+
+
+def is_indefinite(expense: Dict) -> bool:
+    return bool(expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring'))
+
+
+def new_month() -> Dict:
+    """Data of a month that has not been saved yet"""
+    return {
+        'income': {'monthly_income': 2000.0},
+        'expenses': [],
+        'family_income': [],
+        'other_income': [],
+        'meal_tickets': {'worked_days': 20, 'value_per_day': 35.0}
+    }
+
+
+def _month_form(month: Optional[Dict]) -> Optional[Dict]:
+    """A stored month as compared by undo steps: without its save time"""
+    if month is None:
+        return None
+    return {key: value for key, value in month.items() if key != 'saved_at'}
+
+
+class MonthView:
+    """Working copy of one month
+
+    `data` is the month with its one-off expenses followed by the instances
+    of the recurring rules that cover it; `totals` follows every change made
+    through the Ledger. Changes reach the data structure with
+    `Ledger.commit_month()`.
+    """
+
+    def __init__(self, key: str, data: Dict):
+        self.key = key
+        self.data = data
+        self.totals = MonthAggregate(data['expenses'])
+        # Frozen copy of the data when opened or last committed (None: unknown)
+        self.saved = None
+        # Frozen stored month at that time (None: not stored)
+        self.base = None
+
+    @property
+    def expenses(self) -> List[Dict]:
+        return self.data['expenses']
+
+    def modified(self) -> bool:
+        """Check whether the month changed since it was opened or committed"""
+        return self.saved is None or self.data != self.saved
+
+
+class Ledger:
+    """Months, expenses and recurring rules of one data structure"""
+
+    def __init__(self, data: Optional[Dict] = None):
+        if data is None:
+            data = default_data()
+        if 'monthly_data' not in data:
+            data['monthly_data'] = {}
+        self.data = data
+
+        # Recurring expenses are stored once as rules (see recurring.py);
+        # the months holding the overrides of older versions must be saved
+        self.migrated_rules = recurring.init_rules(data)
+        moved = recurring.move_overrides_to_months(data, new_month)
+        self.migrated_rules += len(moved)
+
+        # Where each expense name is stored, for removals across months
+        self.index = ExpenseIndex(data)
+        # Columnar copy of all months for the analytics, built on first use
+        self.analytics = ExpenseColumns(data)
+        # Words of all expenses and incomes for the search, built on first use
+        self.search_index = SearchIndex(data)
+        # Months changed since the last save (only these get written)
+        self.dirty_months = set(moved)
+        # Changed months as last known on disk (None: not stored), the
+        # common base when another process saved them too
+        self._month_bases = {}
+        # Month -> (base, stored month) of saves that may not be on disk yet
+        self._saving = {}
+
+        # Undo history of the commits (see undo.py), kept only when set
+        self.history = None
+        # Months and rules (both frozen) changed since the last commit, as
+        # they were before (None: not stored)
+        self._touched_months = {}
+        self._touched_rules = {}
+
+    @classmethod
+    def from_store(cls, store: Store) -> 'Ledger':
+        with instrument.timer('store.load'):
+            data = store.load()
+        return cls(data)
+
+    @instrument.timed('ledger.open_month')
+    def open_month(self, month_key: str) -> MonthView:
+        """Working copy of a month, new if it was never saved"""
+        base = self.stored_month(month_key)
+        month = self._new_month(month_key) if base is None else thaw(base)
+        month['expenses'] = recurring.month_expenses(self.data, month_key, month)
+        view = MonthView(month_key, month)
+        view.saved = freeze(month)
+        view.base = base
+        return view
+
+    def _new_month(self, month_key: str) -> Dict:
+        """Data of a month not saved yet
+
+        Like in older versions, a month reached by an expense repeated for
+        a number of months takes the income and meal tickets of the month
+        the expense was added in.
+        """
+        month = new_month()
+        for rule in recurring.get_rules(self.data).values():
+            if rule['count'] is None or rule['start'] == month_key or \
+                    not recurring.rule_covers(rule, month_key):
+                continue
+            source = self.stored_month(rule['start'])
+            if source is not None:
+                for key in ('income', 'meal_tickets'):
+                    if key in source:
+                        month[key] = thaw(source[key])
+                break
+        return month
+
+    def stored_month(self, month_key: str) -> Optional[FrozenDict]:
+        """The stored month, frozen (None: not stored)
+
+        Months read from disk are frozen the first time they are needed;
+        the result can be kept as a snapshot, it never changes.
+        """
+        monthly_data = self.data['monthly_data']
+        if month_key not in monthly_data:
+            return None
+        month = monthly_data[month_key]
+        if not isinstance(month, FrozenDict):
+            month = freeze(month)
+            if isinstance(monthly_data, LazyMonths):
+                monthly_data.replace(month_key, month)
+            else:
+                monthly_data[month_key] = month
+        return month
+
+    @instrument.timed('ledger.commit_month')
+    def commit_month(self, month: MonthView, record: bool = True):
+        """Store a working copy back into the data structure
+
+        A month that did not change is left alone, so just looking at it
+        never overwrites what another process saved. With record=False the
+        change joins the undo step of the next `record_change()`.
+        """
+        if not month.modified():
+            return
+        self._remember_base(month.key, month.base)
+        self._touch_month(month.key, month.base)
+        stored = dict(month.data)
+        # Recurring expenses belong to their rule; only one-off ones and the
+        # instances edited in this month are stored
+        stored['expenses'], overrides = recurring.store_month_expenses(
+            self.data, month.key, month.expenses, month.data.get('overrides'))
+        if overrides:
+            stored['overrides'] = overrides
+        else:
+            stored.pop('overrides', None)
+        stored['saved_at'] = datetime.now().isoformat()
+        # What did not change is shared with the previous version
+        stored = freeze(stored, like=month.base)
+        self.data['monthly_data'][month.key] = stored
+        self.index.update_month(month.key, stored['expenses'])
+        self.analytics.update_month(month.key)
+        self.search_index.update_month(month.key)
+        self.dirty_months.add(month.key)
+        month.saved = freeze(month.data, like=month.saved)
+        month.base = stored
+        if record:
+            self._record_step(month.key, stored)
+
+    def replace_month(self, month_key: str, month: Optional[Dict]) -> Optional[FrozenDict]:
+        """Store a changed version of a month without a working copy (None: delete it)"""
+        previous = self.stored_month(month_key)
+        self._remember_base(month_key, previous)
+        self._touch_month(month_key, previous)
+        monthly_data = self.data['monthly_data']
+        if month is None:
+            stored = None
+            if month_key in monthly_data:
+                del monthly_data[month_key]
+        else:
+            stored = freeze(dict(month, saved_at=datetime.now().isoformat()), like=previous)
+            monthly_data[month_key] = stored
+        self.index.update_month(month_key, None if stored is None else stored.get('expenses', []))
+        self.analytics.update_month(month_key)
+        self.search_index.update_month(month_key)
+        self.dirty_months.add(month_key)
+        return stored
+
+    def replace_rule(self, rule_id: str, rule: Dict):
+        """Store a changed version of a recurring rule"""
+        self._touch_rules([rule_id])
+        rules = recurring.get_rules(self.data)
+        rules[rule_id] = freeze(rule, like=rules.get(rule_id))
+        self.analytics.invalidate_from(rule['start'])
+        self.search_index.invalidate_rules()
+
+    def record_change(self, month_key: str):
+        """Make the changes since the last commit one undo step, shown at month_key"""
+        self._record_step(month_key, self.stored_month(month_key))
+
+    def _remember_base(self, month_key: str, base: Optional[Dict]):
+        """Keep the stored month before its first unsaved change"""
+        if month_key not in self._month_bases and month_key not in self._saving:
+            self._month_bases[month_key] = base
+
+    def _touch_month(self, month_key: str, base=MISSING):
+        """Remember a month as it was before a change, for the undo step"""
+        if self.history is None or month_key in self._touched_months:
+            return
+        if base is MISSING:
+            base = self.stored_month(month_key)
+        self._touched_months[month_key] = base
+
+    def _touch_rules(self, rule_ids: Iterable[str]):
+        """Remember recurring rules as they were before a change, for the undo step"""
+        if self.history is None:
+            return
+        rules = recurring.get_rules(self.data)
+        for rule_id in rule_ids:
+            if rule_id not in self._touched_rules:
+                self._touched_rules[rule_id] = rules.get(rule_id)
+
+    def _record_step(self, month_key: str, stored: Dict):
+        """Turn what changed since the last commit into an undo step"""
+        if self.history is None:
+            return
+        rules = recurring.get_rules(self.data)
+        months = {}
+        for key, before in self._touched_months.items():
+            after = stored if key == month_key else self.stored_month(key)
+            delta = diff(_month_form(before), _month_form(after))
+            if delta is not None:
+                months[key] = delta
+        changed_rules = {}
+        for rule_id, before in self._touched_rules.items():
+            delta = diff(before, rules.get(rule_id))
+            if delta is not None:
+                changed_rules[rule_id] = delta
+        self._touched_months = {}
+        self._touched_rules = {}
+        if months or changed_rules:
+            self.history.record(Step(month_key, months, changed_rules))
+
+    def undo(self) -> Optional[Step]:
+        """Take back the newest step, return it (None: nothing to undo)
+
+        Commit the open month first and open it again afterwards: the step
+        may change any month. Raises UndoError, and forgets the history,
+        when the data changed in the meantime.
+        """
+        return self._replay(redo=False)
+
+    def redo(self) -> Optional[Step]:
+        """Make the newest undone step again, return it (None: nothing to redo)"""
+        return self._replay(redo=True)
+
+    def _replay(self, redo: bool) -> Optional[Step]:
+        if self.history is None:
+            return None
+        step = self.history.pop(redo)
+        if step is None:
+            return None
+        monthly_data = self.data['monthly_data']
+        rules = recurring.get_rules(self.data)
+
+        # Everything is checked before anything changes (patch() leaves
+        # what it is given alone)
+        try:
+            months = {key: patch(_month_form(self.stored_month(key)), delta, reverse=not redo)
+                      for key, delta in step.months.items()}
+            new_rules = {rule_id: patch(rules.get(rule_id), delta, reverse=not redo)
+                         for rule_id, delta in step.rules.items()}
+        except UndoError:
+            self.history.clear()
+            raise
+
+        for key, month in months.items():
+            previous = self.stored_month(key)
+            self._remember_base(key, previous)
+            if month is None:
+                if key in monthly_data:
+                    del monthly_data[key]
+            else:
+                month = freeze(dict(month, saved_at=datetime.now().isoformat()), like=previous)
+                monthly_data[key] = month
+            self.index.update_month(key, None if month is None else month.get('expenses', []))
+            self.analytics.update_month(key)
+            self.search_index.update_month(key)
+            self.dirty_months.add(key)
+
+        if new_rules:
+            starts = [rule['start'] for rule in new_rules.values() if rule is not None]
+            starts += [rules[rule_id]['start'] for rule_id in new_rules if rule_id in rules]
+            for rule_id, rule in new_rules.items():
+                if rule is None:
+                    rules.pop(rule_id, None)
+                else:
+                    rules[rule_id] = freeze(rule, like=rules.get(rule_id))
+            # The rules shape every month from their start
+            self.analytics.invalidate_from(min(starts))
+            self.search_index.invalidate_rules()
+
+        self.history.push(step, redo=not redo)
+        return step
+
+    def add_expense(self, month: MonthView, expense: Dict) -> Dict:
+        """Add an expense; with auto_add it also recurs in later months"""
+        expense['status'] = normalize_status(expense['status'])
+        month.expenses.append(expense)
+        month.totals.add(expense)
+        if expense.get('auto_add'):
+            self.start_recurring(month, expense)
+        return expense
+
+    def update_expense(self, month: MonthView, index: int, expense: Dict) -> int:
+        """Replace an expense with its edited version
+
+        Editing a recurring expense only changes this month. Turning its
+        indefinite recurrence off stops it in later months; the number of
+        removed copies stored by older versions is returned.
+        """
+        old = month.expenses[index]
+        expense['status'] = normalize_status(expense['status'])
+
+        removed = 0
+        if is_indefinite(old) and not is_indefinite(expense):
+            if old.get('rule_id'):
+                # This month keeps the edited expense as a one-off
+                expense.pop('rule_id', None)
+                self._touch_rules([old['rule_id']])
+                with instrument.timer('recurring.end'):
+                    recurring.end_rule(self.data, old['rule_id'], month.key)
+                self.analytics.invalidate_from(month.key)
+                self.search_index.invalidate_rules()
+            else:
+                removed = self.remove_recurring_from_future_months(old['name'], month.key)
+        elif old.get('rule_id'):
+            # Stored as an override of this month only; edits do not carry
+            # the flags set when the rule was created
+            for key in ('auto_add', 'is_indefinite_recurring'):
+                if key in old:
+                    expense.setdefault(key, old[key])
+            expense['rule_id'] = old['rule_id']
+
+        month.expenses[index] = expense
+        month.totals.replace(old, expense)
+
+        if expense.get('auto_add') and not old.get('auto_add'):
+            self.start_recurring(month, expense)
+        return removed
+
+    def remove_expense(self, month: MonthView, index: int) -> Dict:
+        """Remove an expense from this month only"""
+        expense = month.expenses.pop(index)
+        month.totals.remove(expense)
+        if expense.get('rule_id'):
+            recurring.skip_instance(month.data, expense['rule_id'])
+        return expense
+
+    def duplicate_expense(self, month: MonthView, index: int, suffix: str = " (copie)") -> Dict:
+        """Add a one-off copy of an expense"""
+        expense_copy = month.expenses[index].copy()
+        expense_copy.pop('rule_id', None)
+        expense_copy['name'] = expense_copy['name'] + suffix
+        month.expenses.append(expense_copy)
+        month.totals.add(expense_copy)
+        return expense_copy
+
+    @instrument.timed('recurring.start')
+    def start_recurring(self, month: MonthView, expense: Dict) -> Optional[str]:
+        """Turn an expense of the month into a recurring rule, return its id
+
+        Nothing is copied: the rule produces the expense in every month it
+        covers when that month is opened.
+        """
+        if expense['type'] != 'Credit' and expense.get('recurring_indefinite'):
+            # Mark it as indefinite in the data
+            expense['is_indefinite_recurring'] = True
+        elif expense['type'] != 'Credit' and not expense.get('recurring_months'):
+            return None
+
+        rule_id = recurring.create_rule(self.data, expense, month.key,
+                                        recurring.rule_count(expense))
+        expense['rule_id'] = rule_id
+        if self.history is not None:
+            # Undoing the step removes the rule again
+            self._touched_rules.setdefault(rule_id, None)
+        self._skip_named_months(rule_id, month.key)
+        self.analytics.invalidate_from(month.key)
+        self.search_index.invalidate_rules()
+        return rule_id
+
+    def _skip_named_months(self, rule_id: str, month_key: str):
+        """Leave a new rule out of later stored months that have an expense of its name"""
+        rules = recurring.get_rules(self.data)
+        rule = rules[rule_id]
+        name = rule['template'].get('name')
+        next_key = recurring.add_months(month_key, 1)
+        months = {key for key, _ in self.index.occurrences(name, start=next_key)}
+
+        # Instances of other rules of the same name are not in the index
+        others = [(other_id, other) for other_id, other in rules.items()
+                  if other_id != rule_id and other['template'].get('name') == name]
+        if others:
+            monthly_data = self.data['monthly_data']
+            for key in monthly_data:
+                if key < next_key or key in months or not recurring.rule_covers(rule, key):
+                    continue
+                overrides = read_month(monthly_data, key).get('overrides')
+                if any(recurring.rule_instance(other, other_id, key, overrides) is not None
+                       for other_id, other in others):
+                    months.add(key)
+
+        for key in sorted(months):
+            if recurring.rule_covers(rule, key):
+                stored = self.stored_month(key)
+                self.replace_month(key, dict(stored, overrides={**stored.get('overrides', {}),
+                                                                rule_id: None}))
+
+    @instrument.timed('recurring.remove_future')
+    def remove_recurring_from_future_months(self, expense_name: str, month_key: str) -> int:
+        """Stop a recurring expense after month_key, return how many series/copies"""
+        next_key = recurring.add_months(month_key, 1)
+        self._touch_rules(rule_id for rule_id, rule in recurring.get_rules(self.data).items()
+                          if rule['template'].get('name') == expense_name)
+        removed_count = recurring.end_rules_named(self.data, expense_name, next_key)
+        if removed_count:
+            self.analytics.invalidate_from(next_key)
+            self.search_index.invalidate_rules()
+
+        # Copies stored in months by older versions
+        for key, positions in self.index.occurrences(expense_name, start=next_key):
+            month_data = self.stored_month(key)
+
+            # Only the copies that have a recurring flag
+            expenses_to_remove = {idx for idx in positions
+                                  if recurring.is_recurring(month_data['expenses'][idx])}
+            if not expenses_to_remove:
+                continue
+
+            expenses = [expense for idx, expense in enumerate(month_data['expenses'])
+                        if idx not in expenses_to_remove]
+            self.replace_month(key, dict(month_data, expenses=expenses))
+            removed_count += len(expenses_to_remove)
+        return removed_count
+
+    @staticmethod
+    def calculate_totals(month: MonthView) -> Dict:
+        """Calculate all financial totals of a month"""
+        data = month.data
+
+        # Expense totals by status come from the running aggregate
+        totals = month.totals.totals()
+        total_expenses = totals['total_expenses']
+
+        # Calculate meal tickets and income
+        meal_tickets_total = (data['meal_tickets']['worked_days'] *
+                              data['meal_tickets']['value_per_day'])
+        monthly_income = data['income']['monthly_income']
+
+        # Calculate other income
+        additional_income = sum(item['amount'] for item in data.get('other_income', []))
+
+        # Total household income = Monthly + Additional + Meal tickets
+        total_household_income = monthly_income + additional_income + meal_tickets_total
+
+        # Remaining = Monthly Income - Total Expenses
+        remaining_after_expenses = monthly_income - total_expenses
+
+        return {
+            'total_expenses': total_expenses,
+            'paid_amount': totals['paid_amount'],
+            'unpaid_amount': totals['unpaid_amount'],
+            'reserved_amount': totals['reserved_amount'],
+            'meal_tickets_total': meal_tickets_total,
+            'monthly_income': monthly_income,
+            'additional_income': additional_income,
+            'remaining_after_expenses': remaining_after_expenses,
+            'total_household_income': total_household_income
+        }
+
+    def prepare_save(self, store: Store) -> List:
+        """Capture the changed months for `store.commit()` (or a SaveWorker)"""
+        instrument.record('save.months', len(self.dirty_months))
+        with instrument.timer('save.prepare'):
+            unsaved = store.unsaved_months()
+            for key in self.dirty_months:
+                # Frozen, so keeping the month costs nothing
+                self._saving[key] = (self._disk_form(key, unsaved), self.stored_month(key))
+                self._month_bases.pop(key, None)
+            ops = store.prepare(self.data, self.dirty_months)
+        self.dirty_months.clear()
+        return ops
+
+    def _disk_form(self, month_key: str, unsaved: set):
+        """A month as last known on disk (None: not stored, MISSING: not known)"""
+        saving = self._saving.get(month_key)
+        if saving is not None:
+            # The older form while the save is pending or failed
+            return saving[0] if month_key in unsaved else saving[1]
+        return self._month_bases.get(month_key, MISSING)
+
+    def save(self, store: Store):
+        """Write the changed months now"""
+        ops = self.prepare_save(store)
+        if instrument.enabled():
+            instrument.record('save.bytes', store.payload_size(ops))
+        with instrument.timer('save.commit'):
+            store.commit(ops)
+
+    @instrument.timed('ledger.sync')
+    def sync(self, store: Store) -> Dict:
+        """Take in what other processes saved since the data was read
+
+        Months saved elsewhere replace the ones in memory, except months
+        changed here that are not on disk yet: those are kept, reported as
+        conflicts and win with the next save. Top-level keys are merged
+        with their last stored form as the common base, entry by entry for
+        dicts such as the recurring rules.
+
+        Returns {'months': [...], 'keys': [...], 'conflicts': [...],
+        'unsaved': [...]}: the months and keys that changed in memory, the
+        ones kept over another process's version and the merged keys that
+        still have to be saved.
+        """
+        result = {'months': [], 'keys': [], 'conflicts': [], 'unsaved': []}
+        changes = store.pull()
+        if changes is None:
+            return result
+
+        local = self.dirty_months | store.unsaved_months()
+        monthly_data = self.data['monthly_data']
+        lazy = isinstance(monthly_data, LazyMonths)
+        theirs = changes['months']
+        if changes['full']:
+            # Every stored month was read; the others were deleted there
+            theirs.update({key: None for key in monthly_data if key not in theirs})
+
+        unsaved = store.unsaved_months()
+        for key in sorted(theirs):
+            month = theirs[key]
+            if key in local:
+                self._merge_month(key, month, unsaved, result)
+                continue
+            if lazy:
+                if month is None and key not in monthly_data:
+                    continue
+                if monthly_data.is_loaded(key) and monthly_data[key] == month:
+                    continue
+                monthly_data.refresh(key, month)
+            else:
+                if monthly_data.get(key) == month:
+                    continue
+                if month is None:
+                    del monthly_data[key]
+                else:
+                    monthly_data[key] = month
+            self.index.update_month(key, None if month is None else month.get('expenses', []))
+            self.analytics.update_month(key)
+            self.search_index.update_month(key)
+            result['months'].append(key)
+
+        for key, value in changes['keys'].items():
+            base = changes['bases'].get(key)
+            base = MISSING if base is None else json.loads(base)
+            ours = self.data.get(key, MISSING)
+            merged, conflict = merge_value(base, ours, value)
+            if conflict:
+                result['conflicts'].append(key)
+            encoded = dump_compact(merged)
+            if ours is MISSING or encoded != dump_compact(ours):
+                if key == recurring.RULES_KEY and isinstance(merged, dict):
+                    merged = {rule_id: freeze(rule) for rule_id, rule in merged.items()}
+                self.data[key] = merged
+                result['keys'].append(key)
+            if encoded != dump_compact(value):
+                result['unsaved'].append(key)
+
+        if recurring.RULES_KEY in result['keys']:
+            # The rules shape every month from their start
+            self.analytics.invalidate_from('')
+            self.search_index.invalidate_rules()
+
+        # Only the bases of months still waiting to be saved are needed
+        for key in list(self._saving):
+            if key not in unsaved:
+                if key in self.dirty_months:
+                    self._month_bases[key] = self._saving[key][1]
+                del self._saving[key]
+        for key in list(self._month_bases):
+            if key not in self.dirty_months and key not in unsaved:
+                del self._month_bases[key]
+
+        store.synced(changes['generation'])
+        return result
+
+    def _merge_month(self, month_key: str, theirs: Optional[Dict], unsaved: set, result: Dict):
+        """Merge another process's version of a month changed here too"""
+        base = self._disk_form(month_key, unsaved)
+        monthly_data = self.data['monthly_data']
+        ours = self.stored_month(month_key)
+        if theirs is not None:
+            theirs = freeze(theirs, like=ours)
+        merged, conflict = merge_month(base, ours, theirs)
+        if conflict:
+            result['conflicts'].append(month_key)
+
+        if merged != ours:
+            if merged is None:
+                del monthly_data[month_key]
+            else:
+                monthly_data[month_key] = freeze(merged, like=ours)
+            self.index.update_month(month_key, None if merged is None else merged.get('expenses', []))
+            self.analytics.update_month(month_key)
+            self.search_index.update_month(month_key)
+            result['months'].append(month_key)
+        if merged != theirs:
+            result['unsaved'].append(month_key)
+            self.dirty_months.add(month_key)
+
+        # Their version is on disk now; the next save goes over it
+        self._saving.pop(month_key, None)
+        self._month_bases[month_key] = theirs
@@ -0,0 +1,300 @@
+"""Sharing one data file between several processes"""
+
+# <data>.lock is held while the data is read or written; <data>.changes has one
+# line per save. The record of a save is written before its data, so a crash in
+# between only makes other processes read a month that did not change.
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .atomic import write_file_atomic
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Top-level keys missing from one side of a merge
+MISSING = object()
+
+# Month fields holding lists of items without ids, merged item by item
+ITEM_LISTS = ('expenses', 'other_income', 'family_income')
+
+
+class LockTimeout(TimeoutError):
+    """The data stayed locked by another process for too long"""
+
+
+class ConflictError(Exception):
+    """Another process saved some of the same months or keys first"""
+
+    def __init__(self, months: Iterable[str] = (), keys: Iterable[str] = ()):
+        self.months = sorted(months)
+        self.keys = sorted(keys)
+        names = ', '.join(self.months + self.keys) or 'the data'
+        super().__init__(f"Another process saved {names} since it was read")
+
+
+def _try_lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, between processes and threads"""
+
+    def __init__(self, path, timeout: float = 10.0):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise LockTimeout(f"{self.path} is held by another thread")
+        if self._depth == 0:
+            try:
+                self._file = self._lock_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                _unlock(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def _lock_file(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, 'a+b')
+        deadline = time.monotonic() + self.timeout
+        delay = 0.005
+        while True:
+            try:
+                _try_lock(f)
+                return f
+            except OSError:
+                if time.monotonic() >= deadline:
+                    f.close()
+                    raise LockTimeout(f"{self.path} is locked by another process")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+
+
+class ChangeLog:
+    """The <data>.changes file: what every save of every process changed"""
+
+    def __init__(self, path, max_records: int = 1000):
+        self.path = Path(path)
+        self.max_records = max_records
+        # (inode, size, mtime) of the file as last read
+        self._signature = None
+        self._offset = 0
+        # Generation before the first record in the file
+        self._base = 0
+        self._records = []
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def changed(self) -> bool:
+        """Check whether the file changed since it was last read"""
+        return self._stat() != self._signature
+
+    def refresh(self):
+        """Read the records added since the last call"""
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        old, self._signature = self._signature, signature
+        if signature is None:
+            return
+        if old is None or signature[0] != old[0] or signature[1] < self._offset:
+            # A new file: the old one was started over
+            self._offset = 0
+            self._base = 0
+            self._records = []
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        end = chunk.rfind(b'\n') + 1
+        for line in chunk[:end].splitlines():
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # Torn by a crash; the save it announced may not have happened
+                continue
+            if record.get('base'):
+                self._base = record['gen']
+                self._records = []
+            else:
+                self._records.append(record)
+        self._offset += end
+
+    @property
+    def generation(self) -> int:
+        """Generation of the newest record read"""
+        return self._records[-1]['gen'] if self._records else self._base
+
+    def since(self, generation: int, writer: str) -> Optional[List[Dict]]:
+        """Records of other writers newer than generation (None: some of them are gone)"""
+        if generation < self._base:
+            return None
+        return [record for record in self._records
+                if record['gen'] > generation and record.get('by') != writer]
+
+    def append(self, writer: str, months: Iterable[str], keys: Iterable[str],
+               full: bool = False) -> int:
+        """Add the record of a save and return its generation; needs the lock"""
+        self.refresh()
+        generation = self.generation + 1
+        line = json.dumps({'gen': generation, 'by': writer, 'months': sorted(months),
+                           'keys': sorted(keys), 'full': full},
+                          ensure_ascii=False, separators=(',', ':')) + '\n'
+        if len(self._records) >= self.max_records:
+            base = json.dumps({'gen': generation - 1, 'base': True}) + '\n'
+            write_file_atomic(self.path, base + line)
+        else:
+            with open(self.path, 'ab') as f:
+                f.write(line.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+        self.refresh()
+        return generation
+
+
+def conflicts(records: Optional[List[Dict]], months: Iterable[str], keys: Iterable[str],
+              exclusive: bool = False) -> Optional[ConflictError]:
+    """The conflict between a save and the records of other writers, if any"""
+    if records is None:
+        return ConflictError()
+    if not records:
+        return None
+    theirs_months = {key for record in records for key in record.get('months', ())}
+    theirs_keys = {key for record in records for key in record.get('keys', ())}
+    if exclusive or any(record.get('full') for record in records):
+        return ConflictError(theirs_months, theirs_keys)
+    months = theirs_months.intersection(months)
+    keys = theirs_keys.intersection(keys)
+    if months or keys:
+        return ConflictError(months, keys)
+    return None
+
+
+def _encode(value) -> str:
+    if value is MISSING:
+        return ''
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def merge_value(base, ours, theirs) -> Tuple[object, bool]:
+    """Three-way merge of a top-level value, return (merged, conflict)"""
+    base_text, ours_text, theirs_text = _encode(base), _encode(ours), _encode(theirs)
+    if ours_text == base_text or ours_text == theirs_text:
+        return theirs, False
+    if theirs_text == base_text:
+        return ours, False
+    if not (isinstance(ours, dict) and isinstance(theirs, dict)):
+        return ours, True
+
+    base = base if isinstance(base, dict) else {}
+    merged = {}
+    conflict = False
+    for key in list(theirs) + [key for key in ours if key not in theirs]:
+        value, entry_conflict = merge_value(base.get(key, MISSING), ours.get(key, MISSING),
+                                            theirs.get(key, MISSING))
+        conflict = conflict or entry_conflict
+        if value is not MISSING:
+            merged[key] = value
+    return merged, conflict
+
+
+def merge_items(base: List, ours: List, theirs: List) -> Tuple[List, bool]:
+    """Three-way merge of a list of items, return (merged, conflict)"""
+    removed = Counter(map(_encode, base)) - Counter(map(_encode, ours))
+    added = Counter(map(_encode, ours)) - Counter(map(_encode, base))
+    merged = []
+    kept = Counter()
+    for item in theirs:
+        encoded = _encode(item)
+        if removed[encoded] > 0:
+            removed[encoded] -= 1
+            continue
+        merged.append(item)
+        kept[encoded] += 1
+    for item in ours:
+        encoded = _encode(item)
+        if added[encoded] > 0:
+            added[encoded] -= 1
+            # Already there when both sides added it
+            if kept[encoded] > 0:
+                kept[encoded] -= 1
+                continue
+            merged.append(item)
+    return merged, +removed != Counter()
+
+
+def merge_month(base, ours: Optional[Dict], theirs: Optional[Dict]) -> Tuple[Optional[Dict], bool]:
+    """Three-way merge of a stored month (None: deleted), return (merged, conflict)"""
+    if base is MISSING:
+        return ours, _encode(ours) != _encode(theirs)
+    if not (isinstance(ours, dict) and isinstance(theirs, dict)):
+        return merge_value(base, ours, theirs)
+    if base is None:
+        # Created on both sides: merged as if both started from an empty month
+        base = {}
+
+    merged = {}
+    conflict = False
+    for key in list(theirs) + [key for key in ours if key not in theirs]:
+        if key == 'saved_at':
+            merged[key] = max(ours.get(key, ''), theirs.get(key, ''))
+            continue
+        base_value, ours_value, theirs_value = (base.get(key, MISSING), ours.get(key, MISSING),
+                                                theirs.get(key, MISSING))
+        if key in ITEM_LISTS and isinstance(ours_value, list) and isinstance(theirs_value, list):
+            base_items = base_value if isinstance(base_value, list) else []
+            value, field_conflict = merge_items(base_items, ours_value, theirs_value)
+        else:
+            value, field_conflict = merge_value(base_value, ours_value, theirs_value)
+        conflict = conflict or field_conflict
+        if value is not MISSING:
+            merged[key] = value
+    return merged, conflict
@@ -0,0 +1,122 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+from . import instrument
+from .storage import Store
+
+
+class SaveWorker:
+    """Background thread that writes prepared saves of a store
+
+    `submit()` takes the operations returned by `Store.prepare()` and
+    returns immediately. The worker waits until no new save has been
+    submitted for `delay` seconds, but no longer than `max_delay` after the
+    first save it has not written yet, merges everything submitted so far
+    with `Store.merge()` and commits it with a single `Store.commit()`.
+
+    `on_done` is called from the worker thread with None after a successful
+    write or with the exception of a failed one; GUI code must hand the
+    result over to its own thread before touching any widget.
+    """
+
+    def __init__(self, store: Store, delay: float = 0.5,
+                 on_done: Optional[Callable[[Optional[Exception]], None]] = None,
+                 max_delay: float = 5.0):
+        self.store = store
+        self.delay = delay
+        self.max_delay = max(max_delay, delay)
+        self.on_done = on_done
+
+        self._cond = threading.Condition()
+        self._pending = None
+        # When the oldest queued save was submitted; steady saving must
+        # not keep pushing the write back
+        self._first = 0.0
+        self._due = 0.0
+        self._writing = False
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name='financial-tracker-save',
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, ops: List):
+        """Queue prepared operations; they are written after the quiet period"""
+        if not ops:
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Save worker is closed")
+            now = time.monotonic()
+            if self._pending is None:
+                self._pending = ops
+                self._first = now
+            else:
+                self._pending = self.store.merge(self._pending, ops)
+            self._due = min(self._first + self.max_delay, now + self.delay)
+            self._cond.notify_all()
+
+    def busy(self) -> bool:
+        """Check whether a save is queued or being written"""
+        with self._cond:
+            return self._pending is not None or self._writing
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write queued saves now and wait until they are on disk
+
+        Returns False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._due = 0.0
+            self._cond.notify_all()
+            while self._pending is not None or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        """Flush queued saves and stop the thread"""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending is not None:
+                        remaining = self._due - time.monotonic()
+                        if remaining <= 0 or self._closed:
+                            break
+                        self._cond.wait(remaining)
+                    elif self._closed:
+                        return
+                    else:
+                        self._cond.wait()
+
+                ops, self._pending = self._pending, None
+                self._writing = True
+
+            error = None
+            try:
+                if instrument.enabled():
+                    instrument.record('save.bytes', self.store.payload_size(ops))
+                with instrument.timer('save.commit'):
+                    self.store.commit(ops)
+            except Exception as e:
+                error = e
+                instrument.count('save.errors')
+
+            # Report before waking flush() so callers see the result
+            if self.on_done is not None:
+                self.on_done(error)
+
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
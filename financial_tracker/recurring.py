@@ -0,0 +1,262 @@
+"""Recurring expenses stored once as rules and expanded per month
+
+A rule lives in data['recurring_rules'][rule_id]:
+
+    {
+        'start': 'YYYY_MM',       first month of the series
+        'count': 12 | None,       number of months, None for indefinite
+        'template': {...}         the expense as it was added
+    }
+
+Months only store their one-off expenses, plus the instances that differ
+from the template in that month:
+
+    month['overrides'] = {
+        rule_id: {...},           the edited expense of that month
+        rule_id: None             the expense was deleted in that month
+    }
+
+so editing an instance changes one month and not the rule, and every rule
+stays small enough to be stored on its own. The instances of every rule are
+generated when a month is viewed or aggregated and carry a 'rule_id' so
+edits can be written back as overrides.
+
+Rules are frozen (see frozen.py): changing one replaces it in the rules
+dict, so a rule that is the same object as before did not change.
+"""
+
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .frozen import freeze, thaw
+
+RULES_KEY = 'recurring_rules'
+
+
+def add_months(month_key: str, count: int) -> str:
+    """Return the YYYY_MM key `count` months after (or before) month_key"""
+    year, month = int(month_key[:4]), int(month_key[5:7])
+    index = year * 12 + month - 1 + count
+    return f"{index // 12}_{index % 12 + 1:02d}"
+
+
+def months_between(start: str, month_key: str) -> int:
+    """Number of months from start to month_key (negative if before start)"""
+    return ((int(month_key[:4]) - int(start[:4])) * 12 +
+            int(month_key[5:7]) - int(start[5:7]))
+
+
+def is_recurring(expense: Dict) -> bool:
+    """Check whether an expense repeats in later months"""
+    return bool(expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring') or
+                expense.get('recurring_months') or expense.get('auto_add'))
+
+
+def rule_count(expense: Dict) -> Optional[int]:
+    """Number of months an expense added with auto_add repeats (None: forever)"""
+    if expense.get('type') == 'Credit':
+        return max(int(expense.get('remaining_months', 1) or 1), 1)
+    if expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring'):
+        return None
+    return max(int(expense.get('recurring_months', 1) or 1), 1)
+
+
+def get_rules(data: Dict) -> Dict[str, Dict]:
+    return data.get(RULES_KEY, {})
+
+
+def create_rule(data: Dict, expense: Dict, start: str, count: Optional[int]) -> str:
+    """Store an expense as a rule starting in month `start`, return its id"""
+    rule_id = uuid.uuid4().hex[:12]
+    template = {key: value for key, value in expense.items() if key != 'rule_id'}
+    data.setdefault(RULES_KEY, {})[rule_id] = freeze({
+        'start': start,
+        'count': count,
+        'template': template
+    })
+    return rule_id
+
+
+def rule_covers(rule: Dict, month_key: str) -> bool:
+    """Check whether a rule produces an instance in the given month"""
+    offset = months_between(rule['start'], month_key)
+    if offset < 0:
+        return False
+    return rule['count'] is None or offset < rule['count']
+
+
+def generate_instance(rule: Dict, rule_id: str, month_key: str) -> Dict:
+    """The expense a rule produces in a month, ignoring overrides"""
+    instance = thaw(rule['template'])
+    template = rule['template']
+    if template.get('type') == 'Credit' and 'remaining_months' in template:
+        instance['remaining_months'] = template['remaining_months'] - months_between(
+            rule['start'], month_key)
+    instance['rule_id'] = rule_id
+    return instance
+
+
+def rule_instance(rule: Dict, rule_id: str, month_key: str,
+                  overrides: Optional[Dict] = None) -> Optional[Dict]:
+    """The expense a rule shows in a month, or None if it has none there
+
+    overrides are the month's overrides (month['overrides']).
+    """
+    if not rule_covers(rule, month_key):
+        return None
+    if overrides and rule_id in overrides:
+        override = overrides[rule_id]
+        if override is None:
+            return None
+        instance = thaw(override)
+        instance['rule_id'] = rule_id
+        return instance
+    return generate_instance(rule, rule_id, month_key)
+
+
+def expand_rules(data: Dict, month_key: str, month: Optional[Dict] = None) -> List[Dict]:
+    """Instances of every rule for a month, in the order the rules were added"""
+    if month is None:
+        # storage imports this module
+        from .storage import read_month
+
+        monthly_data = data['monthly_data']
+        month = read_month(monthly_data, month_key) if month_key in monthly_data else {}
+    overrides = month.get('overrides')
+    expenses = []
+    for rule_id, rule in get_rules(data).items():
+        instance = rule_instance(rule, rule_id, month_key, overrides)
+        if instance is not None:
+            expenses.append(instance)
+    return expenses
+
+
+def month_expenses(data: Dict, month_key: str, month: Optional[Dict] = None) -> List[Dict]:
+    """All expenses of a month: its stored one-off expenses plus rule instances"""
+    if month is None:
+        month = data['monthly_data'].get(month_key) or {}
+    return list(month.get('expenses', [])) + expand_rules(data, month_key, month)
+
+
+def store_month_expenses(data: Dict, month_key: str, expenses: Iterable[Dict],
+                         overrides: Optional[Dict] = None) -> Tuple[List[Dict], Dict]:
+    """Split the expenses of a month into its one-off expenses and overrides
+
+    overrides are the month's overrides so far; instances equal to what
+    their rule generates lose theirs, edited ones get one. Overrides of
+    rules that no longer exist are dropped.
+    """
+    rules = get_rules(data)
+    overrides = {rule_id: override for rule_id, override in (overrides or {}).items()
+                 if rule_id in rules}
+    one_off = []
+    for expense in expenses:
+        rule_id = expense.get('rule_id')
+        if rule_id is None or rule_id not in rules:
+            one_off.append({key: value for key, value in expense.items() if key != 'rule_id'})
+            continue
+
+        if expense == generate_instance(rules[rule_id], rule_id, month_key):
+            overrides.pop(rule_id, None)
+        else:
+            overrides[rule_id] = {key: value for key, value in expense.items()
+                                  if key != 'rule_id'}
+    return one_off, overrides
+
+
+def skip_instance(month: Dict, rule_id: str):
+    """Remove a rule's expense from a single month (the data of a MonthView)"""
+    month.setdefault('overrides', {})[rule_id] = None
+
+
+def end_rule(data: Dict, rule_id: str, month_key: str):
+    """Stop a rule so it has no instance from month_key on"""
+    rules = get_rules(data)
+    rule = rules.get(rule_id)
+    if rule is None:
+        return
+    count = months_between(rule['start'], month_key)
+    if count <= 0:
+        del rules[rule_id]
+        return
+    # Overrides of the months after the end stay in them, unused
+    if rule['count'] is None or rule['count'] > count:
+        rules[rule_id] = freeze(dict(rule, count=count), like=rule)
+
+
+def end_rules_named(data: Dict, name: str, month_key: str) -> int:
+    """Stop every rule for an expense name from month_key on, return how many"""
+    rule_ids = [rule_id for rule_id, rule in get_rules(data).items()
+                if rule['template'].get('name') == name and rule_covers(rule, month_key)]
+    for rule_id in rule_ids:
+        end_rule(data, rule_id, month_key)
+    return len(rule_ids)
+
+
+def init_rules(data: Dict) -> int:
+    """Add the rules key to data, migrating old copies the first time
+
+    Also freezes the rules; returns the number of rules created.
+    """
+    created = 0
+    if RULES_KEY not in data:
+        data[RULES_KEY] = {}
+        created = migrate_indefinite_copies(data)
+    data[RULES_KEY] = {rule_id: freeze(rule) for rule_id, rule in get_rules(data).items()}
+    return created
+
+
+def move_overrides_to_months(data: Dict, new_month: Callable[[], Dict]) -> List[str]:
+    """Move the overrides older versions kept inside the rules into the months
+
+    Months that do not exist yet are created with new_month(). Returns the
+    keys of the months that changed; they still have to be saved.
+    """
+    rules = get_rules(data)
+    moved = {}
+    for rule_id, rule in list(rules.items()):
+        if 'overrides' not in rule:
+            continue
+        for month_key, override in rule['overrides'].items():
+            moved.setdefault(month_key, {})[rule_id] = override
+        rules[rule_id] = freeze({key: value for key, value in rule.items() if key != 'overrides'})
+
+    from .storage import read_month
+
+    monthly_data = data['monthly_data']
+    for month_key, overrides in moved.items():
+        month = dict(read_month(monthly_data, month_key)) if month_key in monthly_data else new_month()
+        month['overrides'] = {**month.get('overrides', {}), **overrides}
+        monthly_data[month_key] = month
+    return sorted(moved)
+
+
+def migrate_indefinite_copies(data: Dict) -> int:
+    """Turn the indefinite expenses copied month by month into rules
+
+    Older versions copied an indefinite recurring expense into each month
+    when it was first viewed. The copies already stored stay as they are;
+    a rule continues every series from the month after its last copy, unless
+    that month already holds an expense of the same name (the series was
+    stopped there). Returns the number of rules created. The months are
+    only read, so a lazy mapping does not end up holding all of them.
+    """
+    from .storage import read_month
+
+    monthly_data = data['monthly_data']
+    last_copies = {}
+    for month_key in sorted(monthly_data):
+        for expense in read_month(monthly_data, month_key).get('expenses', []):
+            if expense.get('recurring_indefinite') or expense.get('is_indefinite_recurring'):
+                last_copies[expense['name']] = (month_key, expense)
+
+    created = 0
+    for name, (month_key, expense) in last_copies.items():
+        next_key = add_months(month_key, 1)
+        next_month = read_month(monthly_data, next_key) if next_key in monthly_data else None
+        if next_month is not None and any(exp.get('name') == name
+                                          for exp in next_month.get('expenses', [])):
+            continue
+        create_rule(data, expense, next_key, None)
+        created += 1
+    return created
@@ -0,0 +1,290 @@
+"""Full-text search over the expenses and incomes of all months
+
+`SearchIndex` is an inverted index: every word of an expense name, other
+income source or family member, the category and the amount point to the
+entries that contain them. A query is answered by intersecting the entries
+of its words, so it does not depend on how many months are stored.
+
+Words are compared in lowercase and without diacritics ("asigurari" finds
+"Asigurări") and every query word also matches longer words it starts
+("asig"). Numbers in a query match amounts exactly: "150" finds 150.00
+and 150.50, "150.5" only 150.50.
+
+Recurring expenses are indexed once per rule; a rule that matches is
+expanded into the stored months where it shows an instance. Instances edited
+in a month are indexed with that month.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set
+
+from . import recurring
+from .storage import month_in_range, read_month
+
+# Order of the kinds of entries within a month in the results
+KINDS = ('expense', 'other_income', 'family_income')
+
+_WORD = re.compile(r'\w+')
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def fold(text: str) -> str:
+    """Lowercase text without diacritics"""
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def amount_words(amount) -> List[str]:
+    """Words an amount is found by: '150.50' and '150'"""
+    if not isinstance(amount, (int, float)):
+        return []
+    return [f"{amount:.2f}", str(int(amount))]
+
+
+def parse_query(query: str) -> List[tuple]:
+    """(word, is_prefix) for every word of a query"""
+    terms = []
+    for part in query.split():
+        if _NUMBER.fullmatch(part):
+            if ',' in part or '.' in part:
+                terms.append((f"{float(part.replace(',', '.')):.2f}", False))
+            else:
+                terms.append((str(int(part)), False))
+            continue
+        terms.extend((word, True) for word in _WORD.findall(fold(part)))
+    return terms
+
+
+def _entries(month: Dict) -> Iterable[tuple]:
+    """(kind, position, text, amount, category) of everything stored in a month"""
+    for position, expense in enumerate(month.get('expenses', [])):
+        yield ('expense', position, expense.get('name') or '', expense.get('total_amount'),
+               expense.get('category') or 'other')
+    for position, item in enumerate(month.get('other_income', [])):
+        yield 'other_income', position, item.get('source') or '', item.get('amount'), None
+    for position, member in enumerate(month.get('family_income', [])):
+        text = ' '.join(filter(None, (member.get('name'), member.get('role'))))
+        yield 'family_income', position, text, member.get('amount'), None
+
+
+class SearchIndex:
+    """Inverted index of all months, kept in step with the data
+
+    Built on the first search. `update_month()` and `invalidate_rules()`
+    only mark what changed; it is indexed again on the next search, month
+    by month. `synonyms` maps a category key to more words it is found by,
+    e.g. its translated names.
+    """
+
+    def __init__(self, data: Dict, synonyms: Optional[Dict[str, Iterable[str]]] = None):
+        self.data = data
+        self.synonyms = {}
+        self.set_synonyms(synonyms or {})
+
+    def set_synonyms(self, synonyms: Dict[str, Iterable[str]]):
+        """Replace the extra category words; the index is built again"""
+        self.synonyms = {key: sorted({word for name in names for word in _WORD.findall(fold(name))})
+                         for key, names in synonyms.items()}
+        self._postings = None
+
+    def _ensure_current(self):
+        monthly_data = self.data['monthly_data']
+        if self._postings is None:
+            # word -> ids of the entries containing it
+            self._postings = {}
+            # id -> (month_key, kind, position, text, amount, category, rule_id)
+            self._entries = {}
+            self._month_entries = {}
+            self._rule_entries = set()
+            # month -> its overrides of recurring rules
+            self._overrides = {}
+            self._next_id = 0
+            self._vocabulary = None
+            self._keys = None
+            for month_key in monthly_data:
+                self._add_month(month_key, read_month(monthly_data, month_key))
+            self._add_rules()
+            self._stale = set()
+            self._rules_stale = False
+            return
+
+        if self._stale:
+            for month_key in self._stale:
+                self._remove(self._month_entries.pop(month_key, ()))
+                self._overrides.pop(month_key, None)
+                if month_key in monthly_data:
+                    self._add_month(month_key, read_month(monthly_data, month_key))
+            self._stale.clear()
+            self._keys = None
+        if self._rules_stale:
+            self._remove(self._rule_entries)
+            self._add_rules()
+            self._rules_stale = False
+
+    def _words(self, text: str, amount, category: Optional[str]) -> Set[str]:
+        words = set(_WORD.findall(fold(text)))
+        words.update(amount_words(amount))
+        if category is not None:
+            words.add(category)
+            words.update(self.synonyms.get(category, ()))
+        return words
+
+    def _add(self, entry: tuple, words: Iterable[str]) -> int:
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        postings = self._postings
+        for word in words:
+            ids = postings.get(word)
+            if ids is None:
+                ids = postings[word] = set()
+                self._vocabulary = None
+            ids.add(entry_id)
+        return entry_id
+
+    def _remove(self, entry_ids: Iterable[int]):
+        for entry_id in entry_ids:
+            _, _, _, text, amount, category, _ = self._entries.pop(entry_id)
+            for word in self._words(text, amount, category):
+                ids = self._postings.get(word)
+                if ids is None:
+                    continue
+                ids.discard(entry_id)
+                if not ids:
+                    del self._postings[word]
+                    self._vocabulary = None
+
+    def _add_month(self, month_key: str, month: Dict):
+        entries = [self._add((month_key, kind, position, text, amount, category, None),
+                             self._words(text, amount, category))
+                   for kind, position, text, amount, category in _entries(month)]
+        overrides = month.get('overrides')
+        if overrides:
+            self._overrides[month_key] = overrides
+            for rule_id, override in overrides.items():
+                if override:
+                    text = override.get('name') or ''
+                    category = override.get('category') or 'other'
+                    entries.append(self._add(
+                        (month_key, 'expense', None, text, override.get('total_amount'),
+                         category, rule_id),
+                        self._words(text, override.get('total_amount'), category)))
+        self._month_entries[month_key] = entries
+
+    def _add_rules(self):
+        """One entry per recurring rule with the words of its template"""
+        self._rule_entries = set()
+        for rule_id, rule in recurring.get_rules(self.data).items():
+            template = rule['template']
+            text = template.get('name') or ''
+            category = template.get('category') or 'other'
+            entry = (rule['start'], 'expense', None, text, template.get('total_amount'),
+                     category, rule_id)
+            self._rule_entries.add(self._add(entry, self._words(
+                text, template.get('total_amount'), category)))
+
+    def update_month(self, month_key: str):
+        """Mark a month as changed (or deleted)"""
+        if self._postings is not None:
+            self._stale.add(month_key)
+
+    def invalidate_rules(self):
+        """Mark the recurring rules as changed"""
+        if self._postings is not None:
+            self._rules_stale = True
+
+    def _matching(self, word: str, prefix: bool) -> Set[int]:
+        """Ids of the entries containing word, or a word starting with it"""
+        if not prefix:
+            return self._postings.get(word, set())
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        ids = set()
+        position = bisect_left(vocabulary, word)
+        while position < len(vocabulary) and vocabulary[position].startswith(word):
+            ids |= self._postings[vocabulary[position]]
+            position += 1
+        return ids
+
+    def _rule_hits(self, rule_id: str, terms: List[tuple], start: Optional[str],
+                   end: Optional[str]) -> Iterable[Dict]:
+        """Instances of a matching rule in the stored months (start to end)"""
+        rule = recurring.get_rules(self.data).get(rule_id)
+        if rule is None:
+            return
+        if self._keys is None:
+            self._keys = sorted(self.data['monthly_data'])
+        keys = self._keys
+        for position in range(bisect_left(keys, max(rule['start'], start or '')), len(keys)):
+            month_key = keys[position]
+            if end is not None and month_key > end:
+                break
+            instance = recurring.rule_instance(rule, rule_id, month_key,
+                                               self._overrides.get(month_key))
+            if instance is None:
+                if rule['count'] is not None and not recurring.rule_covers(rule, month_key):
+                    break
+                continue
+            category = instance.get('category') or 'other'
+            # Overrides may have other words than the rule as a whole
+            words = self._words(instance.get('name') or '', instance.get('total_amount'), category)
+            if all(any(w.startswith(word) for w in words) if prefix else word in words
+                   for word, prefix in terms):
+                yield _hit(month_key, 'expense', None, instance.get('name') or '',
+                           instance.get('total_amount'), category, rule_id)
+
+    def search(self, query: str, limit: Optional[int] = None, start: Optional[str] = None,
+               end: Optional[str] = None) -> List[Dict]:
+        """Entries containing every word of the query, newest month first
+
+        A hit is {'month', 'kind', 'position', 'text', 'amount', 'category',
+        'rule_id'}; position is the index in the month's list of that kind
+        (None for recurring expenses). start/end limit the months searched.
+        """
+        terms = parse_query(query)
+        if not terms:
+            return []
+        self._ensure_current()
+
+        ids = None
+        # Exact words first, they have the fewest entries
+        for word, prefix in sorted(terms, key=lambda term: term[1]):
+            matching = self._matching(word, prefix)
+            ids = matching if ids is None else ids & matching
+            if not ids:
+                return []
+
+        hits = []
+        # (month, rule_id) -> hit; a rule and its edited instances can both match
+        rule_hits = {}
+        for entry_id in ids:
+            month_key, kind, position, text, amount, category, rule_id = self._entries[entry_id]
+            if rule_id is None:
+                if month_in_range(month_key, start, end):
+                    hits.append(_hit(month_key, kind, position, text, amount, category, None))
+                continue
+            if entry_id in self._rule_entries:
+                found = self._rule_hits(rule_id, terms, start, end)
+            elif month_in_range(month_key, start, end):
+                found = self._rule_hits(rule_id, terms, month_key, month_key)
+            else:
+                continue
+            for hit in found:
+                rule_hits[hit['month'], rule_id] = hit
+        hits.extend(rule_hits.values())
+
+        # Within a month: one-off entries in order, then the recurring ones
+        hits.sort(key=lambda hit: (hit['month'], -KINDS.index(hit['kind']),
+                                   -(float('inf') if hit['position'] is None else hit['position'])),
+                  reverse=True)
+        return hits if limit is None else hits[:limit]
+
+
+def _hit(month_key, kind, position, text, amount, category, rule_id) -> Dict:
+    return {'month': month_key, 'kind': kind, 'position': position, 'text': text,
+            'amount': amount, 'category': category, 'rule_id': rule_id}
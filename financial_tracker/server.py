@@ -0,0 +1,422 @@
+"""Local HTTP/JSON API over the ledger, for phones and scripts on the LAN
+
+    python -m financial_tracker serve --host 0.0.0.0 --port 8765 --token SECRET
+
+The server runs on one asyncio event loop that owns the ledger: requests
+are handled one at a time on that loop, so writes never interleave, and
+disk writes go to a SaveWorker thread like in the application. The data
+file is read once at startup; months stay in memory and encoded responses
+are kept until the next write, so reads cost a dictionary lookup. What
+other processes (the application, the command line) save is noticed with
+one stat() per request and only the months they changed are read again.
+
+Routes (bodies are JSON, positions start at 0):
+
+    GET    /months                          stored month keys
+    GET    /months/{month}                  the month with its expenses and totals
+    GET    /months/{month}/totals
+    GET    /months/{month}/expenses
+    POST   /months/{month}/expenses         add an expense
+    PUT    /months/{month}/expenses/{n}     replace expense n
+    DELETE /months/{month}/expenses/{n}
+    GET    /months/{month}/other_income
+    POST   /months/{month}/other_income     {"source": ..., "amount": ...}
+    DELETE /months/{month}/other_income/{n}
+    GET    /months/{month}/income           {"monthly_income": ...}
+    PUT    /months/{month}/income
+    GET    /months/{month}/meal_tickets     {"worked_days": ..., "value_per_day": ...}
+    PUT    /months/{month}/meal_tickets
+    GET    /search?q=...&limit=...
+
+With a token every request needs an "Authorization: Bearer <token>" header.
+"""
+
+import asyncio
+import hmac
+import json
+import math
+import re
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from . import instrument
+from .categorize import CATEGORIES
+from .ledger import Ledger, MonthView
+from .locking import ConflictError
+from .persistence import SaveWorker
+from .storage import Store
+
+MONTH_KEY = re.compile(r'\d{4}_(0[1-9]|1[0-2])')
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1024 * 1024
+
+# Seconds an idle keep-alive connection is kept open
+IDLE_TIMEOUT = 30.0
+
+
+class ApiError(Exception):
+    """A request that cannot be served; becomes an error response"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _number(body: Dict, key: str, default=None) -> float:
+    value = body.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ApiError(400, f"'{key}' must be a number")
+    # json.loads accepts NaN and Infinity, turns 1e400 into inf and keeps
+    # integers of any size
+    try:
+        number = float(value)
+    except OverflowError:
+        number = math.inf
+    if not math.isfinite(number):
+        raise ApiError(400, f"'{key}' must be a finite number")
+    return number
+
+
+def parse_expense(body) -> Dict:
+    """Expense dict of a request body, checked like the expense dialog does"""
+    if not isinstance(body, dict):
+        raise ApiError(400, "An expense must be a JSON object")
+    name = body.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ApiError(400, "'name' is required")
+
+    expense = {key: value for key, value in body.items() if key != 'rule_id'}
+    expense['name'] = name.strip()
+    expense.setdefault('type', 'Normal')
+    if expense['type'] not in ('Normal', 'Credit'):
+        raise ApiError(400, "'type' must be 'Normal' or 'Credit'")
+    if 'total_amount' not in body and 'base_amount' not in body:
+        raise ApiError(400, "'total_amount' is required")
+    if 'total_amount' in body:
+        expense['total_amount'] = _number(body, 'total_amount')
+        expense['base_amount'] = _number(body, 'base_amount', expense['total_amount'])
+    else:
+        expense['base_amount'] = expense['total_amount'] = _number(body, 'base_amount')
+    expense.setdefault('status', 'Neachitat')
+    expense.setdefault('reserved', False)
+    if expense['type'] == 'Normal':
+        expense.setdefault('category', 'other')
+        if expense['category'] not in CATEGORIES:
+            raise ApiError(400, f"'category' must be one of {', '.join(CATEGORIES)}")
+    return expense
+
+
+def month_json(month: MonthView, stored: bool) -> Dict:
+    data = month.data
+    return {
+        'month': month.key,
+        'stored': stored,
+        'income': data['income'],
+        'meal_tickets': data['meal_tickets'],
+        'expenses': data['expenses'],
+        'other_income': data.get('other_income', []),
+        'family_income': data.get('family_income', []),
+        'totals': Ledger.calculate_totals(month)
+    }
+
+
+class LedgerServer:
+    """HTTP/JSON API for one ledger, served on the running event loop"""
+
+    def __init__(self, ledger: Ledger, store: Optional[Store] = None,
+                 token: Optional[str] = None, save_delay: float = 0.5):
+        self.ledger = ledger
+        self.store = store
+        self.token = token
+        self.worker = SaveWorker(store, save_delay, on_done=self._saved) if store else None
+        self.server = None
+        self._loop = None
+        # Encoded GET responses by request target, dropped on every write
+        self._responses = {}
+        # Set when another process saved first and the changes must be saved again
+        self._resave = False
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765):
+        """Start listening; port 0 picks a free port (see `port`)"""
+        self._loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._serve_connection, host, port)
+
+    async def close(self):
+        """Stop listening and wait for queued saves"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.worker is not None:
+            # A save refused from now on is done again below, not on the loop
+            self._loop = None
+            await asyncio.get_running_loop().run_in_executor(None, self.worker.close)
+            if self._resave:
+                self._resave = False
+                self.ledger.sync(self.store)
+                self.ledger.save(self.store)
+
+    def _saved(self, error: Optional[Exception]):
+        # Called on the save thread
+        if isinstance(error, ConflictError):
+            # Another process saved first; take its changes in and save again
+            self._resave = True
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self.sync)
+        elif error is not None:
+            print(f"Error saving data: {error}")
+
+    def sync(self):
+        """Take in what other processes saved, and save again after a refused save"""
+        if self.store is None:
+            return
+        resave, self._resave = self._resave, False
+        if not resave and not self.store.changed_elsewhere():
+            return
+        result = self.ledger.sync(self.store)
+        if result['conflicts']:
+            print(f"Also changed by another process, keeping this version: "
+                  f"{', '.join(result['conflicts'])}")
+        if resave or result['unsaved']:
+            self._changed()
+        elif result['months'] or result['keys']:
+            self._responses.clear()
+
+    # HTTP
+
+    async def _serve_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), IDLE_TIMEOUT)
+                except ApiError as e:
+                    await self._respond(writer, e.status, {'error': str(e)}, False)
+                    return
+                if request is None:
+                    return
+                method, target, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                status, payload = self.handle(method, target, headers, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader, status: int, message: str) -> bytes:
+        """One line of the request head; longer than the reader's limit is an ApiError"""
+        try:
+            return await reader.readline()
+        except ValueError:
+            raise ApiError(status, message) from None
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = await self._read_line(reader, 414, "Request line too long")
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            raise ApiError(400, "Malformed request line") from None
+
+        headers = {}
+        while True:
+            line = await self._read_line(reader, 431, "Header line too long")
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > 100:
+                raise ApiError(431, "Too many headers")
+
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise ApiError(400, "Invalid Content-Length") from None
+        if length > MAX_BODY:
+            raise ApiError(413, "Request body too large")
+        body = await reader.readexactly(length) if length > 0 else b''
+        return method.upper(), target, headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        body = payload if isinstance(payload, bytes) else _encode(payload)
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    # Requests
+
+    def handle(self, method: str, target: str, headers: Dict[str, str],
+               body: bytes) -> Tuple[int, object]:
+        """Status and JSON payload (or encoded bytes) of one request"""
+        if self.token is not None:
+            given = headers.get('authorization', '')
+            if not hmac.compare_digest(given.encode(), f"Bearer {self.token}".encode()):
+                return 401, {'error': "Missing or wrong token"}
+
+        try:
+            self.sync()
+            if method == 'GET':
+                cached = self._responses.get(target)
+                if cached is not None:
+                    instrument.count('server.cached')
+                    return 200, cached
+
+            with instrument.timer(f'server.{method.lower()}'):
+                status, payload = self._route(method, target, body)
+        except ApiError as e:
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            # A bug must not drop the connection without an answer
+            print(f"Error handling {method} {target}: {e!r}")
+            return 500, {'error': "Internal server error"}
+
+        if method == 'GET':
+            payload = self._responses[target] = _encode(payload)
+        else:
+            self._changed()
+        return status, payload
+
+    def _route(self, method: str, target: str, body: bytes) -> Tuple[int, object]:
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+
+        if parts == ['months'] and method == 'GET':
+            return 200, sorted(self.ledger.data['monthly_data'])
+        if parts == ['search'] and method == 'GET':
+            query = parse_qs(url.query)
+            try:
+                limit = int(query['limit'][0]) if 'limit' in query else None
+            except ValueError:
+                raise ApiError(400, "'limit' must be a number") from None
+            return 200, self.ledger.search_index.search(query.get('q', [''])[0], limit=limit)
+        if len(parts) < 2 or parts[0] != 'months':
+            raise ApiError(404, "Not found")
+        if not MONTH_KEY.fullmatch(parts[1]):
+            raise ApiError(404, f"Invalid month {parts[1]!r}, use YYYY_MM")
+
+        month_key, rest = parts[1], parts[2:]
+        if method == 'GET':
+            return 200, self._get(month_key, rest)
+
+        value = None
+        if body:
+            try:
+                value = json.loads(body)
+            except ValueError:
+                raise ApiError(400, "The body is not valid JSON") from None
+        month = self.ledger.open_month(month_key)
+        status, payload = self._change(month, method, rest, value)
+        self.ledger.commit_month(month)
+        return status, payload
+
+    def _get(self, month_key: str, rest) -> object:
+        month = self.ledger.open_month(month_key)
+        stored = month_key in self.ledger.data['monthly_data']
+        if not rest:
+            return month_json(month, stored)
+        if rest == ['totals']:
+            return Ledger.calculate_totals(month)
+        if len(rest) == 1 and rest[0] in ('expenses', 'other_income', 'income', 'meal_tickets'):
+            return month.data.get(rest[0], [])
+        raise ApiError(404, "Not found")
+
+    def _change(self, month: MonthView, method: str, rest, value) -> Tuple[int, object]:
+        ledger = self.ledger
+        section = rest[0] if rest else None
+        position = None
+        if len(rest) == 2:
+            try:
+                position = int(rest[1])
+            except ValueError:
+                raise ApiError(404, "Not found") from None
+        if len(rest) > 2 or (len(rest) == 2 and section not in ('expenses', 'other_income')):
+            raise ApiError(404, "Not found")
+
+        if section == 'expenses':
+            if position is None and method == 'POST':
+                expense = ledger.add_expense(month, parse_expense(value))
+                # Its position once the month is opened again: one-off
+                # expenses come before the recurring ones
+                if expense.get('rule_id'):
+                    position = len(month.expenses) - 1
+                else:
+                    position = sum(1 for item in month.expenses if not item.get('rule_id')) - 1
+                return 201, {'position': position, 'expense': expense}
+            if position is not None and not 0 <= position < len(month.expenses):
+                raise ApiError(404, f"{month.key} has no expense {position}")
+            if position is not None and method == 'PUT':
+                ledger.update_expense(month, position, parse_expense(value))
+                return 200, {'position': position, 'expense': month.expenses[position]}
+            if position is not None and method == 'DELETE':
+                return 200, {'removed': ledger.remove_expense(month, position)}
+
+        elif section == 'other_income':
+            items = month.data['other_income']
+            if position is None and method == 'POST':
+                if not isinstance(value, dict) or not isinstance(value.get('source'), str):
+                    raise ApiError(400, "'source' is required")
+                item = {'source': value['source'], 'amount': _number(value, 'amount')}
+                items.append(item)
+                return 201, {'position': len(items) - 1, 'other_income': item}
+            if position is not None and method == 'DELETE':
+                if not 0 <= position < len(items):
+                    raise ApiError(404, f"{month.key} has no other income {position}")
+                return 200, {'removed': items.pop(position)}
+
+        elif section == 'income' and position is None and method == 'PUT':
+            if not isinstance(value, dict):
+                raise ApiError(400, "Expected a JSON object")
+            month.data['income']['monthly_income'] = _number(value, 'monthly_income')
+            return 200, month.data['income']
+
+        elif section == 'meal_tickets' and position is None and method == 'PUT':
+            if not isinstance(value, dict):
+                raise ApiError(400, "Expected a JSON object")
+            tickets = month.data['meal_tickets']
+            tickets['worked_days'] = int(_number(value, 'worked_days', tickets['worked_days']))
+            tickets['value_per_day'] = _number(value, 'value_per_day', tickets['value_per_day'])
+            return 200, tickets
+
+        raise ApiError(405, f"{method} is not supported here")
+
+    def _changed(self):
+        """Drop the cached responses and queue the changed months for saving"""
+        self._responses.clear()
+        if self.worker is not None:
+            self.worker.submit(self.ledger.prepare_save(self.store))
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+async def _serve_forever(server: LedgerServer, host: str, port: int):
+    await server.start(host, port)
+    print(f"Serving the ledger on http://{host}:{server.port}")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def serve(ledger: Ledger, store: Optional[Store] = None, host: str = '127.0.0.1',
+          port: int = 8765, token: Optional[str] = None):
+    """Serve the ledger until interrupted (Ctrl+C)"""
+    server = LedgerServer(ledger, store, token)
+    try:
+        asyncio.run(_serve_forever(server, host, port))
+    except KeyboardInterrupt:
+        pass
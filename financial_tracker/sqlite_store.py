@@ -0,0 +1,431 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .storage import ENTRY_KEYS, LazyMonths, Store, TopLevelForms, default_data, dump_compact
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT NOT NULL,
+    id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (key, id)
+);
+CREATE TABLE IF NOT EXISTS months (
+    key TEXT PRIMARY KEY,
+    monthly_income REAL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS expenses (
+    month TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    type TEXT,
+    category TEXT,
+    status TEXT,
+    total_amount REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (month, position)
+);
+CREATE INDEX IF NOT EXISTS expenses_name ON expenses (name, month);
+CREATE INDEX IF NOT EXISTS expenses_status ON expenses (status, month);
+CREATE TABLE IF NOT EXISTS other_income (
+    month TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    source TEXT,
+    amount REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (month, position)
+);
+CREATE TABLE IF NOT EXISTS meal_tickets (
+    month TEXT PRIMARY KEY,
+    worked_days INTEGER,
+    value_per_day REAL,
+    data TEXT NOT NULL
+);
+"""
+
+# Month fields that get their own table; everything else stays in months.data
+ROW_TABLES = ('expenses', 'other_income')
+
+
+class SqliteStore(Store):
+    """SQLite database with one row per month, expense and other income
+
+    Months are read lazily (one indexed query per month) and saves run in a
+    single transaction. Top-level keys are rows of `meta`, except the
+    entries of ENTRY_KEYS (recurring rules), which get a row each in
+    `entries`. For every month that was written or read, the store
+    remembers the JSON of each row, so saving a month only issues UPDATEs
+    for the rows that really changed plus INSERT/DELETE for added or
+    removed positions. The database runs in WAL mode so readers never wait
+    for a writer. The rows of months another process saved are read again
+    by `pull()`, which also resets what is remembered about them.
+    """
+
+    def __init__(self, path, cache_size: int = 36):
+        super().__init__()
+        self.path = Path(path)
+        self.cache_size = cache_size
+        self._conn = None
+        self._lock = threading.RLock()
+
+        # (table, month) -> list of row JSON as last written/read
+        self._rows = {}
+        # month -> JSON of the remaining month fields as last written/read
+        self._month_rows = {}
+        self._tickets = {}
+        self._top_level = TopLevelForms()
+
+    def exists(self) -> bool:
+        if not self.path.exists():
+            return False
+        with self._lock:
+            row = self.connection().execute(
+                "SELECT EXISTS (SELECT 1 FROM meta) OR EXISTS (SELECT 1 FROM months)").fetchone()
+        return bool(row[0])
+
+    def sync_path(self) -> Path:
+        return self.path
+
+    def connection(self) -> sqlite3.Connection:
+        """Open the database on first use"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # The connection is shared with the background save thread;
+            # every use goes through self._lock
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _load(self) -> Dict:
+        with self._lock:
+            conn = self.connection()
+            data, whole = self._read_meta(conn)
+            keys = [row[0] for row in conn.execute("SELECT key FROM months")]
+
+        if not data:
+            data = default_data()
+        self._top_level = TopLevelForms(data)
+        # Databases written before ENTRY_KEYS held them whole in meta
+        self._top_level.forget(whole)
+
+        data['monthly_data'] = LazyMonths(keys, self.load_month, self.cache_size)
+        return data
+
+    @staticmethod
+    def _read_meta(conn: sqlite3.Connection, keys: Optional[set] = None) -> Tuple[Dict, set]:
+        """Top-level keys with their entries, and the entry keys stored whole in meta"""
+        values = {key: json.loads(value)
+                  for key, value in conn.execute("SELECT key, value FROM meta")
+                  if keys is None or key in keys}
+        whole = {key for key in ENTRY_KEYS if values.get(key)}
+        for key, entry_id, value in conn.execute(
+                "SELECT key, id, value FROM entries ORDER BY rowid"):
+            if key in values:
+                values[key][entry_id] = json.loads(value)
+        return values, whole
+
+    def load_month(self, month_key: str) -> Dict:
+        """Read a single month from its rows"""
+        with self._lock:
+            conn = self.connection()
+            month_row = conn.execute("SELECT data FROM months WHERE key = ?",
+                                     (month_key,)).fetchone()
+            if month_row is None:
+                raise KeyError(month_key)
+
+            month = json.loads(month_row[0])
+            self._month_rows[month_key] = month_row[0]
+
+            for table in ROW_TABLES:
+                rows = [row[0] for row in conn.execute(
+                    f"SELECT data FROM {table} WHERE month = ? ORDER BY position",
+                    (month_key,))]
+                self._rows[(table, month_key)] = rows
+                month[table] = [json.loads(row) for row in rows]
+
+            tickets = conn.execute("SELECT data FROM meal_tickets WHERE month = ?",
+                                   (month_key,)).fetchone()
+            if tickets is not None:
+                month['meal_tickets'] = json.loads(tickets[0])
+                self._tickets[month_key] = tickets[0]
+
+        return month
+
+    def prepare(self, data: Dict, months: Optional[Iterable[str]] = None) -> List:
+        """Build the SQL statements for the rows that changed"""
+        monthly_data = data['monthly_data']
+        # Other processes cannot tell what a save of everything changed
+        full = months is None
+        if months is None:
+            months = set(monthly_data)
+        else:
+            months = set(months)
+        if isinstance(monthly_data, LazyMonths):
+            months |= monthly_data.dirty()
+        months |= self._retry_months()
+
+        statements = []
+        with self._lock:
+            keys, entries = self._top_level.changed(data)
+            for key, encoded in keys.items():
+                if key in ENTRY_KEYS:
+                    self._write_entries(statements, key, entries.get(key))
+                else:
+                    statements.append(("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                       (key, encoded)))
+
+            for month_key in sorted(months):
+                if month_key in monthly_data:
+                    self._write_month(statements, month_key, monthly_data[month_key])
+                else:
+                    self._delete_month(statements, month_key)
+
+        self._hold_months(months)
+        if isinstance(monthly_data, LazyMonths):
+            monthly_data.mark_clean()
+            monthly_data.evict(keep=self.pending_months())
+        return [(sorted(months), statements, keys, full)]
+
+    def _write_entries(self, statements: List, key: str, changed: Optional[Dict]):
+        """Add statements for the entries of a key that changed (all when None)"""
+        if changed is None:
+            statements.append(("INSERT OR REPLACE INTO meta (key, value) VALUES (?, '{}')",
+                               (key,)))
+            statements.append(("DELETE FROM entries WHERE key = ?", (key,)))
+            changed = {entry_id: encoded
+                       for entry_id, (_, encoded) in self._top_level.entries[key].items()}
+        for entry_id, encoded in changed.items():
+            if encoded is None:
+                statements.append(("DELETE FROM entries WHERE key = ? AND id = ?",
+                                   (key, entry_id)))
+            else:
+                statements.append(("INSERT OR REPLACE INTO entries (key, id, value) "
+                                   "VALUES (?, ?, ?)", (key, entry_id, encoded)))
+
+    def payload_size(self, ops: List) -> int:
+        size = 0
+        for _, statements, _, _ in ops:
+            for _, params in statements:
+                for param in params:
+                    if isinstance(param, str):
+                        size += len(param.encode('utf-8'))
+                    elif isinstance(param, bytes):
+                        size += len(param)
+        return size
+
+    def _commit(self, ops: List):
+        """Run the prepared statements in a single transaction"""
+        with self._lock:
+            conn = self.connection()
+            try:
+                with conn:
+                    for _, statements, _, _ in ops:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+            except Exception:
+                # The transaction was rolled back, so the row caches no longer
+                # describe the database; they are rebuilt on the next save
+                self._forget_rows()
+                raise
+
+    def _scope(self, ops: List) -> Tuple[set, Dict[str, str], bool, bool]:
+        months = set()
+        keys = {}
+        full = False
+        for op_months, _, op_keys, op_full in ops:
+            months.update(op_months)
+            keys.update(op_keys)
+            full = full or op_full
+        return months, keys, False, full
+
+    def _reject(self, ops: List, keys: Dict[str, str]):
+        with self._lock:
+            for months, _, _, _ in ops:
+                for month_key in months:
+                    self._forget_month(month_key)
+            self._top_level.forget(keys)
+
+    def _read_changes(self, months: Optional[set], keys: Optional[set]) -> Tuple[Dict, Dict]:
+        with self._lock:
+            conn = self.connection()
+            meta, _ = self._read_meta(conn, keys)
+            if months is None:
+                months = {row[0] for row in conn.execute("SELECT key FROM months")}
+            if keys is None:
+                keys = set(meta)
+
+            changed_months = {}
+            for month_key in months:
+                self._forget_month(month_key)
+                try:
+                    changed_months[month_key] = self.load_month(month_key)
+                except KeyError:
+                    changed_months[month_key] = None
+            changed_keys = {key: meta[key] for key in keys if key in meta}
+            self._top_level.update(changed_keys)
+        return changed_months, changed_keys
+
+    def _write_month(self, statements: List, month_key: str, month: Dict):
+        """Add statements for the rows of a month that differ from what is stored"""
+        rest = {key: value for key, value in month.items()
+                if key not in ROW_TABLES and key != 'meal_tickets'}
+        rest_json = dump_compact(rest)
+        if self._month_rows.get(month_key) != rest_json:
+            income = month.get('income', {}).get('monthly_income')
+            statements.append(("INSERT OR REPLACE INTO months (key, monthly_income, data) "
+                               "VALUES (?, ?, ?)", (month_key, income, rest_json)))
+            self._month_rows[month_key] = rest_json
+
+        for table in ROW_TABLES:
+            self._write_rows(statements, table, month_key, month.get(table, []))
+
+        tickets = month.get('meal_tickets')
+        if tickets is not None:
+            tickets_json = dump_compact(tickets)
+            if self._tickets.get(month_key) != tickets_json:
+                statements.append(("INSERT OR REPLACE INTO meal_tickets "
+                                   "(month, worked_days, value_per_day, data) VALUES (?, ?, ?, ?)",
+                                   (month_key, tickets.get('worked_days'),
+                                    tickets.get('value_per_day'), tickets_json)))
+                self._tickets[month_key] = tickets_json
+
+    def _write_rows(self, statements: List, table: str, month_key: str, items: List[Dict]):
+        """Add statements that insert, update or delete only the positions that changed"""
+        cache_key = (table, month_key)
+        if cache_key not in self._rows:
+            self._rows[cache_key] = [row[0] for row in self.connection().execute(
+                f"SELECT data FROM {table} WHERE month = ? ORDER BY position", (month_key,))]
+        old_rows = self._rows[cache_key]
+        new_rows = [dump_compact(item) for item in items]
+
+        for position, row in enumerate(new_rows):
+            if position < len(old_rows) and old_rows[position] == row:
+                continue
+            statements.append((f"INSERT OR REPLACE INTO {table} VALUES ({self._placeholders(table)})",
+                               self._columns(table, month_key, position, items[position], row)))
+
+        if len(old_rows) > len(new_rows):
+            statements.append((f"DELETE FROM {table} WHERE month = ? AND position >= ?",
+                               (month_key, len(new_rows))))
+
+        self._rows[cache_key] = new_rows
+
+    @staticmethod
+    def _placeholders(table: str) -> str:
+        return ', '.join('?' * (8 if table == 'expenses' else 5))
+
+    @staticmethod
+    def _columns(table: str, month_key: str, position: int, item: Dict, row: str) -> Tuple:
+        """Indexed column values of a row followed by its full JSON"""
+        if table == 'expenses':
+            return (month_key, position, item.get('name'), item.get('type'),
+                    item.get('category'), item.get('status'), item.get('total_amount'), row)
+        return (month_key, position, item.get('source'), item.get('amount'), row)
+
+    def _delete_month(self, statements: List, month_key: str):
+        """Add statements that remove a month and all of its rows"""
+        statements.append(("DELETE FROM months WHERE key = ?", (month_key,)))
+        statements.append(("DELETE FROM meal_tickets WHERE month = ?", (month_key,)))
+        for table in ROW_TABLES:
+            statements.append((f"DELETE FROM {table} WHERE month = ?", (month_key,)))
+        self._forget_month(month_key)
+
+    def _forget_month(self, month_key: str):
+        """Drop the cached rows of a month so it is read again from the database"""
+        for table in ROW_TABLES:
+            self._rows.pop((table, month_key), None)
+        self._month_rows.pop(month_key, None)
+        self._tickets.pop(month_key, None)
+
+    def _forget_rows(self):
+        """Drop every cached row so it is read again from the database"""
+        self._rows.clear()
+        self._month_rows.clear()
+        self._tickets.clear()
+        self._top_level = TopLevelForms()
+
+    def import_data(self, data: Dict):
+        # Emptying and filling the tables is one transaction, so a failed
+        # import leaves the old data in place
+        with self.lock(), self._lock:
+            self._forget_rows()
+            # Every row is new: nothing is compared with what the tables hold
+            for month_key in data['monthly_data']:
+                for table in ROW_TABLES:
+                    self._rows[(table, month_key)] = []
+            ops = self.prepare(data, None)
+            months, statements, keys, full = ops[0]
+            deletes = [(f"DELETE FROM {table}", ())
+                       for table in ('meta', 'entries', 'months', 'meal_tickets') + ROW_TABLES]
+            ops[0] = (months, deletes + statements, keys, full)
+            self.commit(ops)
+
+    def find_expenses(self, data: Dict, name: Optional[str] = None,
+                      status: Optional[str] = None, start: Optional[str] = None,
+                      end: Optional[str] = None) -> Iterator[Tuple[str, int, Dict]]:
+        """Query stored expenses through the name/status indexes
+
+        Only data that has been saved is visible to the query.
+        """
+        conditions = []
+        params = []
+        for column, op, value in (('name', '=', name), ('status', '=', status),
+                                  ('month', '>=', start), ('month', '<=', end)):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+
+        query = "SELECT month, position, data FROM expenses"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY month, position"
+
+        with self._lock:
+            rows = self.connection().execute(query, params).fetchall()
+        for month_key, position, row in rows:
+            yield month_key, position, json.loads(row)
+
+
+def migrate_json_file(json_path, db_path) -> int:
+    """One-shot copy of a financial_data.json (and its journal) into SQLite
+
+    Returns the number of months copied.
+    """
+    from .storage import JournalStore
+
+    data = JournalStore(json_path).load()
+    store = SqliteStore(db_path)
+    try:
+        store.import_data(data)
+    finally:
+        store.close()
+    return len(data['monthly_data'])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Copy financial_data.json into an SQLite database")
+    parser.add_argument('json_path', nargs='?', default=str(Path.home() / 'financial_data.json'))
+    parser.add_argument('db_path', nargs='?', default=None)
+    args = parser.parse_args()
+
+    db_path = args.db_path or str(Path(args.json_path).with_suffix('.db'))
+    count = migrate_json_file(args.json_path, db_path)
+    print(f"Migrated {count} months from {args.json_path} to {db_path}")
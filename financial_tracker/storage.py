@@ -0,0 +1,1068 @@
+import contextlib
+import json
+import os
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .atomic import (SNAPSHOT_FORMATS, CorruptDataError, decode_record, encode_record,
+                     encode_snapshot, json_default, read_snapshot, write_file_atomic)
+from .frozen import is_frozen
+from .locking import ChangeLog, FileLock, conflicts
+from .recurring import RULES_KEY
+
+
+def default_data() -> Dict:
+    """Return the empty data structure used when no data file exists"""
+    return {
+        'monthly_data': {},
+        'settings': {
+            'language': 'ro',
+            'currency': 'LEI'
+        }
+    }
+
+
+def dump_compact(value) -> str:
+    """Serialize a value as a single compact JSON line"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+
+def month_in_range(month_key: str, start: Optional[str] = None, end: Optional[str] = None) -> bool:
+    """Check whether a YYYY_MM key lies between start and end (inclusive)"""
+    if start is not None and month_key < start:
+        return False
+    if end is not None and month_key > end:
+        return False
+    return True
+
+
+def read_month(monthly_data, month_key: str) -> Dict:
+    """A stored month; in a LazyMonths it is not kept, for passes over all months"""
+    if isinstance(monthly_data, LazyMonths):
+        return monthly_data.peek(month_key)
+    return monthly_data[month_key]
+
+
+class Store:
+    """Interface shared by all storage backends"""
+    # prepare() captures a save on the thread that owns the data, commit() writes it,
+    # possibly on another thread. Backends implement _load(), _commit(), _scope()
+    # and _read_changes().
+
+    def __init__(self):
+        # Months whose prepared writes are not committed yet; they must not
+        # be dropped from memory and re-read from disk in the meantime
+        self._pending_months = Counter()
+        # Months whose commit failed; they are written again by the next save
+        self._failed_months = set()
+        self._pending_lock = threading.Lock()
+
+        # Name of this store in the change log, to skip its own records
+        self.writer = uuid.uuid4().hex[:12]
+        # Newest change log generation whose changes are in memory
+        self.generation = 0
+        # Stored form of every top-level key as of that generation, the
+        # common base when merging another process's version of it
+        self.saved_keys = {}
+        self._file_lock = None
+        self._changes = None
+
+    def exists(self) -> bool:
+        """Check whether the store already holds data on disk"""
+        raise NotImplementedError
+
+    def load(self) -> Dict:
+        """Return the stored data (or the default structure)"""
+        with self.lock():
+            changes = self.changes()
+            if changes is not None:
+                changes.refresh()
+            data = self._load()
+            self.generation = changes.generation if changes is not None else 0
+            self.saved_keys = {key: dump_compact(value) for key, value in data.items()
+                               if key != 'monthly_data'}
+        return data
+
+    def _load(self) -> Dict:
+        raise NotImplementedError
+
+    def save(self, data: Dict, months: Optional[Iterable[str]] = None):
+        """Persist the given months, or everything when months is None"""
+        self.commit(self.prepare(data, months))
+
+    def prepare(self, data: Dict, months: Optional[Iterable[str]] = None) -> List:
+        """Capture the writes needed to persist the given months"""
+        raise NotImplementedError
+
+    def commit(self, ops: List):
+        """Perform the writes captured by `prepare()` (ConflictError: saved elsewhere first)"""
+        if not ops:
+            return
+        months, keys, exclusive, full = self._scope(ops)
+        with self.lock():
+            changes = self.changes()
+            records = []
+            if changes is not None:
+                changes.refresh()
+                records = changes.since(self.generation, self.writer)
+                conflict = conflicts(records, months, keys, exclusive)
+                if conflict is not None:
+                    self._reject(ops, keys)
+                    self._release_months(months, failed=True)
+                    raise conflict
+                generation = changes.append(self.writer, months, keys, full)
+            try:
+                self._commit(ops)
+            except Exception:
+                self._release_months(months, failed=True)
+                raise
+            self.saved_keys.update(keys)
+            if changes is not None and not records:
+                self.synced(generation)
+        self._release_months(months)
+
+    def _commit(self, ops: List):
+        raise NotImplementedError
+
+    def _scope(self, ops: List) -> Tuple[set, Dict[str, str], bool, bool]:
+        """(months, {top-level key: stored form}, exclusive, full) of a prepared save"""
+        # exclusive: it rewrites data it did not change; full: others cannot tell what changed
+        raise NotImplementedError
+
+    def _reject(self, ops: List, keys: Dict[str, str]):
+        """Forget what prepare() assumed would be on disk after a refused save"""
+
+    def merge(self, first: List, second: List) -> List:
+        """Combine two prepared saves into one, keeping their order"""
+        return first + second
+
+    def payload_size(self, ops: List) -> int:
+        """Number of encoded bytes a prepared save writes"""
+        return sum(len(part) for op in ops for part in op if isinstance(part, bytes))
+
+    def import_data(self, data: Dict):
+        """Replace the stored data with a complete data structure"""
+        self.save(data, None)
+
+    def close(self):
+        """Release any open resources"""
+
+    def sync_path(self) -> Optional[Path]:
+        """Path the .lock and .changes files are named after (None: not shared)"""
+        return None
+
+    def lock(self):
+        """Advisory lock of the data, shared with other processes"""
+        if self._file_lock is None:
+            path = self.sync_path()
+            if path is None:
+                return contextlib.nullcontext()
+            self._file_lock = FileLock(path.with_name(path.name + '.lock'))
+        return self._file_lock
+
+    def changes(self) -> Optional[ChangeLog]:
+        """Change log of the data, shared with other processes"""
+        if self._changes is None:
+            path = self.sync_path()
+            if path is not None:
+                self._changes = ChangeLog(path.with_name(path.name + '.changes'))
+        return self._changes
+
+    def changed_elsewhere(self) -> bool:
+        """Cheap check whether another process may have saved since the last look"""
+        changes = self.changes()
+        if changes is None:
+            return False
+        if changes.changed():
+            return True
+        # Records read by a commit that were not pulled yet
+        return changes.since(self.generation, self.writer) != []
+
+    def pull(self) -> Optional[Dict]:
+        """Read what other processes saved since the data was read (None: nothing)"""
+        if not self.changed_elsewhere():
+            return None
+        changes = self.changes()
+        with self.lock():
+            changes.refresh()
+            records = changes.since(self.generation, self.writer)
+            generation = changes.generation
+            if records == []:
+                self.synced(generation)
+                return None
+            if records is None or any(record.get('full') for record in records):
+                months = keys = None
+            else:
+                months = {key for record in records for key in record['months']}
+                keys = {key for record in records for key in record['keys']}
+            bases = dict(self.saved_keys)
+            month_values, key_values = self._read_changes(months, keys)
+            self.saved_keys.update({key: dump_compact(value) for key, value in key_values.items()})
+        return {'generation': generation, 'full': months is None, 'months': month_values,
+                'keys': key_values, 'bases': bases}
+
+    def _read_changes(self, months: Optional[set], keys: Optional[set]) -> Tuple[Dict, Dict]:
+        """Current stored form of some months and top-level keys (all when None), lock held"""
+        raise NotImplementedError
+
+    def synced(self, generation: int):
+        """Mark the changes up to generation as taken into memory"""
+        with self._pending_lock:
+            self.generation = max(self.generation, generation)
+
+    def _hold_months(self, months: Iterable[str]):
+        """Mark months as having uncommitted writes"""
+        with self._pending_lock:
+            self._pending_months.update(months)
+
+    def _release_months(self, months: Iterable[str], failed: bool = False):
+        """Mark the writes of months as committed (or failed)"""
+        months = list(months)
+        with self._pending_lock:
+            self._pending_months.subtract(months)
+            self._pending_months += Counter()
+            if failed:
+                self._failed_months.update(months)
+
+    def _retry_months(self) -> set:
+        """Take the months whose last commit failed"""
+        with self._pending_lock:
+            failed, self._failed_months = self._failed_months, set()
+        return failed
+
+    def pending_months(self) -> set:
+        """Months with prepared writes that are not on disk yet"""
+        with self._pending_lock:
+            return set(self._pending_months)
+
+    def unsaved_months(self) -> set:
+        """Months with writes that are not on disk yet, pending or failed"""
+        with self._pending_lock:
+            return set(self._pending_months) | self._failed_months
+
+    def find_expenses(self, data: Dict, name: Optional[str] = None,
+                      status: Optional[str] = None, start: Optional[str] = None,
+                      end: Optional[str] = None) -> Iterator[Tuple[str, int, Dict]]:
+        """Yield (month_key, index, expense) for expenses matching all filters"""
+        monthly_data = data['monthly_data']
+        for month_key in sorted(monthly_data):
+            if not month_in_range(month_key, start, end):
+                continue
+            for idx, expense in enumerate(monthly_data[month_key].get('expenses', [])):
+                if name is not None and expense.get('name') != name:
+                    continue
+                if status is not None and expense.get('status') != status:
+                    continue
+                yield month_key, idx, expense
+
+
+class JsonStore(Store):
+    """The whole data structure in a single pretty-printed JSON file"""
+
+    def __init__(self, path, generations: int = 3, fmt: str = 'json'):
+        super().__init__()
+        self.path = Path(path)
+        self.generations = generations
+        self.fmt = _check_format(fmt)
+        # Last written form of every top-level key except 'monthly_data'
+        self._top_level = TopLevelForms()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def sync_path(self) -> Path:
+        return self.path
+
+    def _read(self) -> Dict:
+        try:
+            data = read_snapshot(self.path, self.generations)
+        except FileNotFoundError:
+            return default_data()
+        if 'monthly_data' not in data:
+            data['monthly_data'] = {}
+        return data
+
+    def _load(self) -> Dict:
+        data = self._read()
+        self._top_level = TopLevelForms(data)
+        return data
+
+    def prepare(self, data: Dict, months: Optional[Iterable[str]] = None) -> List:
+        # The months are only needed to tell other processes what changed
+        if months is not None:
+            months = set(months) | self._retry_months()
+            self._hold_months(months)
+        keys, _ = self._top_level.changed(data)
+        return [('snapshot', encode_snapshot(data, self.fmt), months, keys)]
+
+    def _commit(self, ops: List):
+        write_file_atomic(self.path, ops[-1][1], self.generations)
+
+    def _scope(self, ops: List) -> Tuple[set, Dict[str, str], bool, bool]:
+        _, _, months, keys = ops[-1]
+        return months or set(), keys, True, months is None
+
+    def _reject(self, ops: List, keys: Dict[str, str]):
+        self._top_level.forget(keys)
+
+    def merge(self, first: List, second: List) -> List:
+        # Only the newest full file matters, but it covers the changes of both
+        (_, _, first_months, first_keys), (kind, raw, months, keys) = first[-1], second[-1]
+        if months is not None:
+            months = None if first_months is None else first_months | months
+        return [(kind, raw, months, {**first_keys, **keys})]
+
+    def _read_changes(self, months: Optional[set], keys: Optional[set]) -> Tuple[Dict, Dict]:
+        data = self._read()
+        changed_months, changed_keys = _pick(data, months, keys)
+        self._top_level.update(changed_keys)
+        return changed_months, changed_keys
+
+
+# Top-level keys holding a dict of entries that are stored one by one, so
+# changing one entry (a recurring rule) does not rewrite all of them
+ENTRY_KEYS = (RULES_KEY,)
+
+
+class TopLevelForms:
+    """Last written form of every top-level key except 'monthly_data'"""
+    # A frozen entry that is still the same object is not encoded again
+
+    def __init__(self, data: Optional[Dict] = None):
+        # key -> stored form
+        self.forms = {}
+        # entry key -> {entry id: (entry, stored form)}
+        self.entries = {}
+        if data is not None:
+            self.update(data)
+
+    def update(self, values: Dict):
+        """Remember values as they are on disk"""
+        for key, value in values.items():
+            if key == 'monthly_data':
+                continue
+            if key in ENTRY_KEYS and isinstance(value, dict):
+                self.entries[key] = {entry_id: (entry, dump_compact(entry))
+                                     for entry_id, entry in value.items()}
+                self.forms[key] = _join_entries(self.entries[key])
+            else:
+                self.entries.pop(key, None)
+                self.forms[key] = dump_compact(value)
+
+    def changed(self, data: Dict) -> Tuple[Dict[str, str], Dict[str, Dict[str, Optional[str]]]]:
+        """({key: stored form}, {entry key: {entry id: form or None}}) of what differs"""
+        keys = {}
+        entries = {}
+        for key, value in data.items():
+            if key == 'monthly_data':
+                continue
+            if key in ENTRY_KEYS and isinstance(value, dict):
+                known = self.entries.get(key)
+                forms, changed = _entry_forms(value, known or {})
+                self.entries[key] = forms
+                if known is not None and not changed:
+                    continue
+                keys[key] = self.forms[key] = _join_entries(forms)
+                if known is not None:
+                    entries[key] = changed
+                continue
+            self.entries.pop(key, None)
+            encoded = dump_compact(value)
+            if self.forms.get(key) != encoded:
+                keys[key] = self.forms[key] = encoded
+        return keys, entries
+
+    def forget(self, keys: Iterable[str]):
+        """Make the next save write these keys again, as a whole"""
+        for key in keys:
+            self.forms.pop(key, None)
+            self.entries.pop(key, None)
+
+
+def _entry_forms(value: Dict, known: Dict) -> Tuple[Dict, Dict[str, Optional[str]]]:
+    """({entry id: (entry, stored form)}, {changed entry id: form or None})"""
+    forms = {}
+    changed = {}
+    for entry_id, entry in value.items():
+        old = known.get(entry_id)
+        if old is not None and old[0] is entry and is_frozen(entry):
+            forms[entry_id] = old
+            continue
+        encoded = dump_compact(entry)
+        forms[entry_id] = (entry, encoded)
+        if old is None or old[1] != encoded:
+            changed[entry_id] = encoded
+    for entry_id in known:
+        if entry_id not in value:
+            changed[entry_id] = None
+    return forms, changed
+
+
+def _join_entries(forms: Dict) -> str:
+    """Stored form of a whole entry key, the same as dump_compact() of it"""
+    return '{' + ','.join(f'{dump_compact(entry_id)}:{encoded}'
+                          for entry_id, (_, encoded) in forms.items()) + '}'
+
+
+def _pick(data: Dict, months: Optional[set], keys: Optional[set]) -> Tuple[Dict, Dict]:
+    """Some months (None when missing) and top-level keys of a data structure"""
+    monthly_data = data.get('monthly_data', {})
+    if months is None:
+        months = set(monthly_data)
+    if keys is None:
+        keys = set(data) - {'monthly_data'}
+    return ({key: monthly_data.get(key) for key in months},
+            {key: data[key] for key in keys if key in data and key != 'monthly_data'})
+
+
+class JournalStore(Store):
+    """Snapshot + append-only journal storage for the tracker data"""
+    # Records always carry the full month, so replaying one over a snapshot that
+    # already contains it is harmless.
+
+    def __init__(self, path, compact_every: int = 200, min_compact_bytes: int = 64 * 1024,
+                 generations: int = 3, fmt: str = 'json'):
+        super().__init__()
+        self.path = Path(path)
+        self.generations = generations
+        self.fmt = _check_format(fmt)
+        self.journal_path = self.path.with_name(self.path.name + '.journal')
+        self.compact_every = compact_every
+        self.min_compact_bytes = min_compact_bytes
+
+        # Sizes as they will be once every prepared save is committed
+        self.journal_records = 0
+        self.journal_bytes = 0
+        self.snapshot_bytes = 0
+        self._has_snapshot = None
+        # Set when a commit failed; the next save then writes everything
+        self._force_snapshot = False
+
+        # Last written form of every top-level key except 'monthly_data'
+        self._top_level = TopLevelForms()
+        # Snapshot file as last read or written, and how much of the journal
+        # is in memory; the rest was appended by other processes
+        self._snapshot_signature = None
+        self._journal_offset = 0
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def sync_path(self) -> Path:
+        return self.path
+
+    def _snapshot_stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _load(self) -> Dict:
+        """Read the snapshot and replay the journal on top of it"""
+        data = self._read_files()
+        self._top_level = TopLevelForms(data)
+        return data
+
+    def _read_files(self) -> Dict:
+        try:
+            data = read_snapshot(self.path, self.generations)
+            self.snapshot_bytes = self.path.stat().st_size if self.path.exists() else 0
+        except FileNotFoundError:
+            data = default_data()
+        self._snapshot_signature = self._snapshot_stat()
+
+        if 'monthly_data' not in data:
+            data['monthly_data'] = {}
+
+        self._replay_journal(data)
+        return data
+
+    def _replay_journal(self, data: Dict):
+        """Apply journal records to data, dropping a torn record at the end"""
+        # Records after a damaged one cannot be applied without it: CorruptDataError
+        self.journal_records = 0
+        self.journal_bytes = 0
+        self._journal_offset = 0
+
+        if not self.journal_path.exists():
+            return
+
+        good_offset = 0
+        with open(self.journal_path, 'rb') as f:
+            line = f.readline()
+            while line:
+                next_line = f.readline()
+                try:
+                    record = decode_record(line)
+                except ValueError as e:
+                    if next_line:
+                        raise CorruptDataError(
+                            self.journal_path, [self.journal_path],
+                            f"Damaged record at offset {good_offset} of {self.journal_path} "
+                            f"({e}) with more records after it; the file was left unchanged")
+                    # A crash in the middle of an append leaves a partial last
+                    # line; everything before it is still valid
+                    print(f"Ignoring damaged journal record at offset {good_offset}")
+                    break
+
+                self._apply(data, record)
+                good_offset += len(line)
+                self.journal_records += 1
+                line = next_line
+
+        if good_offset < self.journal_path.stat().st_size:
+            # Cut the damaged tail so new records are not appended after it
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        self.journal_bytes = good_offset
+        self._journal_offset = good_offset
+
+    @staticmethod
+    def _apply(data: Dict, record: Dict):
+        """Apply a single journal record"""
+        op = record.get('op')
+        if op == 'month':
+            data['monthly_data'][record['key']] = record['value']
+        elif op == 'drop':
+            data['monthly_data'].pop(record['key'], None)
+        elif op == 'set':
+            data[record['key']] = record['value']
+        elif op == 'entry':
+            data.setdefault(record['key'], {})[record['id']] = record['value']
+        elif op == 'drop_entry':
+            data.get(record['key'], {}).pop(record['id'], None)
+
+    def prepare(self, data: Dict, months: Optional[Iterable[str]] = None) -> List:
+        """Build journal records for the changed months and keys, or a full snapshot"""
+        if self._has_snapshot is None:
+            self._has_snapshot = self.path.exists()
+        if months is not None:
+            months = set(months) | self._retry_months()
+            self._hold_months(months)
+        if months is None or not self._has_snapshot or self._force_snapshot:
+            return self._prepare_snapshot(data, months)
+
+        monthly_data = data.get('monthly_data', {})
+        lines = []
+
+        for key in sorted(months):
+            if key in monthly_data:
+                record = {'op': 'month', 'key': key, 'value': monthly_data[key]}
+            else:
+                record = {'op': 'drop', 'key': key}
+            lines.append(encode_record(record))
+
+        keys, entries = self._top_level.changed(data)
+        for key in keys:
+            if key not in entries:
+                lines.append(encode_record({'op': 'set', 'key': key, 'value': data[key]}))
+                continue
+            # Only the entries that changed, one record each
+            for entry_id, encoded in entries[key].items():
+                if encoded is None:
+                    record = {'op': 'drop_entry', 'key': key, 'id': entry_id}
+                else:
+                    record = {'op': 'entry', 'key': key, 'id': entry_id,
+                              'value': data[key][entry_id]}
+                lines.append(encode_record(record))
+
+        if not lines:
+            return []
+
+        payload = b''.join(lines)
+        self.journal_records += len(lines)
+        self.journal_bytes += len(payload)
+
+        if self.needs_compaction():
+            return self._prepare_snapshot(data, months, keys)
+        return [('append', payload, months, keys)]
+
+    def _prepare_snapshot(self, data: Dict, months: Optional[set] = None,
+                          keys: Optional[Dict[str, str]] = None) -> List:
+        """Prepare a full snapshot that replaces snapshot and journal"""
+        raw = encode_snapshot(data, self.fmt)
+        keys = {**(keys or {}), **self._top_level.changed(data)[0]}
+
+        self._has_snapshot = True
+        self._force_snapshot = False
+        self.snapshot_bytes = len(raw)
+        self.journal_records = 0
+        self.journal_bytes = 0
+        return [('snapshot', raw, months, keys)]
+
+    def merge(self, first: List, second: List) -> List:
+        ops = first + second
+        # A snapshot contains everything written before it
+        for idx in range(len(ops) - 1, -1, -1):
+            if ops[idx][0] == 'snapshot':
+                months, keys, _, full = self._scope(ops[:idx + 1])
+                return [('snapshot', ops[idx][1], None if full else months, keys)] + ops[idx + 1:]
+        return ops
+
+    def _scope(self, ops: List) -> Tuple[set, Dict[str, str], bool, bool]:
+        months = set()
+        keys = {}
+        exclusive = full = False
+        for kind, _, op_months, op_keys in ops:
+            months |= op_months or set()
+            keys.update(op_keys)
+            if kind == 'snapshot':
+                exclusive = True
+                full = full or op_months is None
+        return months, keys, exclusive, full
+
+    def _reject(self, ops: List, keys: Dict[str, str]):
+        self._top_level.forget(keys)
+        if any(kind == 'snapshot' for kind, _, _, _ in ops):
+            self._force_snapshot = True
+
+    def _commit(self, ops: List):
+        """Write a prepared snapshot and/or append prepared journal records"""
+        try:
+            appends = []
+            for kind, payload, _, _ in ops:
+                if kind == 'snapshot':
+                    self._append(appends)
+                    appends = []
+                    write_file_atomic(self.path, payload, self.generations)
+                    self._snapshot_signature = self._snapshot_stat()
+                    # The snapshot now holds everything, so the journal can be dropped
+                    if self.journal_path.exists():
+                        self.journal_path.unlink()
+                    self._journal_offset = 0
+                else:
+                    appends.append(payload)
+            self._append(appends)
+        except Exception:
+            # Some records never reached the disk; a full snapshot of the
+            # data in memory is the simplest way to get consistent again
+            self._force_snapshot = True
+            raise
+
+    def _append(self, payloads: List[bytes]):
+        """Append records to the journal with a single write and fsync"""
+        if not payloads:
+            return
+        payload = b''.join(payloads)
+        with open(self.journal_path, 'ab') as f:
+            # Records of other processes in between are read by the next pull
+            in_memory = f.tell() == self._journal_offset
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        if in_memory:
+            self._journal_offset += len(payload)
+
+    def _read_changes(self, months: Optional[set], keys: Optional[set]) -> Tuple[Dict, Dict]:
+        """Read the records appended by other processes, or everything after a compaction"""
+        if months is not None and self._snapshot_stat() == self._snapshot_signature:
+            tail = self._read_tail(months, keys)
+            if tail is not None:
+                return tail
+        changed_months, changed_keys = _pick(self._read_files(), months, keys)
+        self._top_level.update(changed_keys)
+        return changed_months, changed_keys
+
+    def _read_tail(self, months: set, keys: set) -> Optional[Tuple[Dict, Dict]]:
+        """Months and keys from the journal records not in memory yet (None: not all there)"""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return None
+        end = chunk.rfind(b'\n') + 1
+        tail = {'monthly_data': {}}
+        found = set()
+        lines = chunk[:end].splitlines()
+        for line in lines:
+            try:
+                record = decode_record(line)
+            except ValueError:
+                return None
+            key = record.get('key')
+            if record.get('op') in ('entry', 'drop_entry') and key not in tail:
+                # Entry records change the key as it was last read
+                tail[key] = json.loads(self.saved_keys.get(key, '{}'))
+            self._apply(tail, record)
+            found.add(record.get('key'))
+        if not months <= found or not keys <= found:
+            return None
+
+        self._journal_offset += end
+        self.journal_records += len(lines)
+        self.journal_bytes += end
+        changed_months, changed_keys = _pick(tail, months, keys)
+        self._top_level.update(changed_keys)
+        return changed_months, changed_keys
+
+    def needs_compaction(self) -> bool:
+        """Check whether the journal should be folded into the snapshot"""
+        if self.journal_records >= self.compact_every:
+            return True
+        return self.journal_bytes > max(self.snapshot_bytes, self.min_compact_bytes)
+
+    def compact(self, data: Dict):
+        """Write a full snapshot and start an empty journal"""
+        self.commit(self._prepare_snapshot(data))
+
+
+class LazyMonths(MutableMapping):
+    """Mapping of month keys to month data that reads months on first access"""
+    # Only assigned or deleted months are dirty(); evict() drops clean ones only
+
+    def __init__(self, keys: Iterable[str], loader, cache_size: int = 36):
+        self._keys = set(keys)
+        self._loader = loader
+        self._loaded = OrderedDict()
+        self._dirty = set()
+        self.cache_size = cache_size
+
+    def __getitem__(self, key):
+        if key in self._loaded:
+            self._loaded.move_to_end(key)
+            return self._loaded[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        value = self._loader(key)
+        self._loaded[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._keys.add(key)
+        self._loaded[key] = value
+        self._loaded.move_to_end(key)
+        self._dirty.add(key)
+
+    def __delitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        self._keys.discard(key)
+        self._loaded.pop(key, None)
+        self._dirty.add(key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(sorted(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def is_loaded(self, key) -> bool:
+        """Check whether a month is already in memory"""
+        return key in self._loaded
+
+    def peek(self, key):
+        """Read a month without keeping it in memory (for one pass over all months)"""
+        if key in self._loaded:
+            return self._loaded[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._loader(key)
+
+    def refresh(self, key, value):
+        """Take in a month another process saved (None: deleted) without marking it dirty"""
+        self._dirty.discard(key)
+        if value is None:
+            self._keys.discard(key)
+            self._loaded.pop(key, None)
+            return
+        self._keys.add(key)
+        if key in self._loaded:
+            self._loaded[key] = value
+
+    def replace(self, key, value):
+        """Put an equal copy in place of a loaded month, leaving it dirty or clean"""
+        if key in self._loaded:
+            self._loaded[key] = value
+
+    def dirty(self) -> set:
+        """Months assigned or deleted since the last `mark_clean()`"""
+        return set(self._dirty)
+
+    def mark_clean(self):
+        """Forget all pending changes (after they have been written)"""
+        self._dirty.clear()
+
+    def evict(self, keep: Iterable[str] = ()):
+        """Drop least recently used clean months beyond the cache size"""
+        keep = set(keep)
+        for key in list(self._loaded):
+            if len(self._loaded) <= self.cache_size:
+                break
+            if key not in self._dirty and key not in keep:
+                del self._loaded[key]
+
+
+class ShardedStore(Store):
+    """One JSON file per month plus a small manifest"""
+    # manifest.json, months/YYYY_MM.json and entries/KEY/ID.json; the manifest
+    # is written last, so it never lists a file that is not there yet.
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, directory, cache_size: int = 36, generations: int = 3,
+                 fmt: str = 'json'):
+        super().__init__()
+        self.directory = Path(directory)
+        self.generations = generations
+        self.fmt = _check_format(fmt)
+        self.manifest_path = self.directory / 'manifest.json'
+        self.months_dir = self.directory / 'months'
+        self.entries_dir = self.directory / 'entries'
+        self.cache_size = cache_size
+        self._manifest_text = None
+        # Last written form of every top-level key except 'monthly_data'
+        self._top_level = TopLevelForms()
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    def sync_path(self) -> Path:
+        return self.manifest_path
+
+    def shard_path(self, month_key: str) -> Path:
+        """Path of the file holding a single month"""
+        return self.months_dir / f"{month_key}.json"
+
+    def load_month(self, month_key: str) -> Dict:
+        """Read a single month shard"""
+        return read_snapshot(self.shard_path(month_key))
+
+    def entry_path(self, key: str, entry_id: str) -> Path:
+        """Path of the file holding a single entry of a top-level key"""
+        return self.entries_dir / key / f"{entry_id}.json"
+
+    def _read_top_level(self, manifest: Dict, keys: Optional[set] = None) -> Dict:
+        """Top-level keys of a manifest with their entries read for `keys` (all when None)"""
+        top_level = manifest.get('top_level', {})
+        for key, entry_ids in manifest.get('entries', {}).items():
+            if keys is not None and key not in keys:
+                continue
+            top_level[key] = {entry_id: read_snapshot(self.entry_path(key, entry_id))
+                              for entry_id in entry_ids}
+        return top_level
+
+    def _read_manifest(self) -> Dict:
+        if not self.exists():
+            return {}
+        manifest = read_snapshot(self.manifest_path, self.generations)
+        self._manifest_text = dump_compact(manifest)
+        return manifest
+
+    def _load(self) -> Dict:
+        """Read the manifest and return data with lazily loaded months"""
+        if not self.exists():
+            data = default_data()
+            data['monthly_data'] = LazyMonths((), self.load_month, self.cache_size)
+            return data
+
+        manifest = self._read_manifest()
+        data = self._read_top_level(manifest)
+        self._top_level = TopLevelForms(data)
+        # Manifests written before ENTRY_KEYS held them whole
+        self._top_level.forget(key for key in ENTRY_KEYS
+                               if key in manifest.get('top_level', {}))
+        data['monthly_data'] = LazyMonths(manifest.get('months', []), self.load_month,
+                                          self.cache_size)
+        return data
+
+    def _manifest(self, data: Dict) -> Dict:
+        """Build the manifest for the given data"""
+        top_level = {key: value for key, value in data.items()
+                     if key != 'monthly_data' and key not in ENTRY_KEYS}
+        return {
+            'version': self.MANIFEST_VERSION,
+            'months': sorted(data['monthly_data']),
+            'entries': {key: sorted(data[key]) for key in ENTRY_KEYS if key in data},
+            'top_level': top_level
+        }
+
+    def prepare(self, data: Dict, months: Optional[Iterable[str]] = None) -> List:
+        """Serialize the given months (all months when None) and the manifest"""
+        monthly_data = data['monthly_data']
+
+        ops = []
+        if months is None:
+            months = set(monthly_data)
+            # Tells other processes that anything may have changed
+            ops.append(('replace', None, None))
+        else:
+            months = set(months)
+        if isinstance(monthly_data, LazyMonths):
+            months |= monthly_data.dirty()
+        months |= self._retry_months()
+
+        for key in sorted(months):
+            if key in monthly_data:
+                ops.append(('write', key, encode_snapshot(monthly_data[key], self.fmt)))
+            else:
+                ops.append(('delete', key, None))
+
+        keys, entries = self._top_level.changed(data)
+        for key in keys:
+            if key not in ENTRY_KEYS:
+                continue
+            changed = entries.get(key)
+            if changed is None:
+                # Written as a whole: every entry, and the files of the
+                # others are removed
+                changed = dict.fromkeys(data[key], '')
+                ops.append(('clear_entries', key, frozenset(data[key])))
+            for entry_id, encoded in changed.items():
+                if encoded is None:
+                    ops.append(('drop_entry', (key, entry_id), None))
+                else:
+                    ops.append(('entry', (key, entry_id),
+                                encode_snapshot(data[key][entry_id], self.fmt)))
+
+        manifest = self._manifest(data)
+        manifest_text = dump_compact(manifest)
+        if manifest_text != self._manifest_text:
+            ops.append(('manifest', keys, encode_snapshot(manifest, self.fmt)))
+            self._manifest_text = manifest_text
+        elif keys:
+            # Only entries changed; other processes still need to know
+            ops.append(('keys', keys, None))
+
+        self._hold_months(months)
+        if isinstance(monthly_data, LazyMonths):
+            monthly_data.mark_clean()
+            monthly_data.evict(keep=self.pending_months())
+        return ops
+
+    def merge(self, first: List, second: List) -> List:
+        # Later writes of a month (or of the manifest) replace earlier ones
+        merged = OrderedDict()
+        keys = {}
+        for op in first + second:
+            if op[0] in ('write', 'delete', 'entry', 'drop_entry'):
+                target = op[1]
+            elif op[0] == 'clear_entries':
+                target = (op[0], op[1])
+            else:
+                target = op[0]
+            if op[0] in ('manifest', 'keys'):
+                keys.update(op[1])
+                op = (op[0], dict(keys), op[2])
+            merged.pop(target, None)
+            merged[target] = op
+        return list(merged.values())
+
+    def _scope(self, ops: List) -> Tuple[set, Dict[str, str], bool, bool]:
+        months = {key for kind, key, _ in ops if kind in ('write', 'delete')}
+        keys = {}
+        for kind, op_keys, _ in ops:
+            if kind in ('manifest', 'keys'):
+                keys.update(op_keys)
+        # The manifest lists every month, so it must not be written over
+        # months another process added or removed
+        exclusive = any(kind == 'manifest' for kind, _, _ in ops)
+        full = any(kind == 'replace' for kind, _, _ in ops)
+        return months, keys, exclusive, full
+
+    def _reject(self, ops: List, keys: Dict[str, str]):
+        self._manifest_text = None
+        self._top_level.forget(keys)
+
+    def _commit(self, ops: List):
+        """Write month shards and entries first and the manifest that lists them last"""
+        # Entry files are removed after the manifest that no longer lists them
+        try:
+            for kind, key, raw in ops:
+                if kind == 'write':
+                    write_file_atomic(self.shard_path(key), raw)
+                elif kind == 'delete' and self.shard_path(key).exists():
+                    self.shard_path(key).unlink()
+                elif kind == 'entry':
+                    write_file_atomic(self.entry_path(*key), raw)
+            for kind, key, raw in ops:
+                if kind == 'manifest':
+                    write_file_atomic(self.manifest_path, raw, self.generations)
+            for kind, key, raw in ops:
+                if kind == 'drop_entry' and self.entry_path(*key).exists():
+                    self.entry_path(*key).unlink()
+                elif kind == 'clear_entries' and (self.entries_dir / key).is_dir():
+                    for path in (self.entries_dir / key).glob('*.json'):
+                        if path.stem not in raw:
+                            path.unlink()
+        except Exception:
+            self._manifest_text = None
+            raise
+
+    def _read_changes(self, months: Optional[set], keys: Optional[set]) -> Tuple[Dict, Dict]:
+        manifest = self._read_manifest()
+        stored = set(manifest.get('months', []))
+        top_level = self._read_top_level(manifest, keys)
+        if months is None:
+            months = stored
+        if keys is None:
+            keys = set(top_level)
+        changed_keys = {key: top_level[key] for key in keys if key in top_level}
+        self._top_level.update(changed_keys)
+        return ({key: self.load_month(key) if key in stored else None for key in months},
+                changed_keys)
+
+
+STORAGE_MODES = ('json', 'journal', 'sharded', 'sqlite')
+
+
+def _check_format(fmt: str) -> str:
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown data format: {fmt}")
+    return fmt
+
+
+def create_store(data_file, mode: str, fmt: str = 'json') -> Store:
+    """Create the store of the given mode that lives next to a data file"""
+    data_file = Path(data_file)
+    if mode == 'json':
+        return JsonStore(data_file, fmt=fmt)
+    if mode == 'journal':
+        return JournalStore(data_file, fmt=fmt)
+    if mode == 'sharded':
+        return ShardedStore(data_file.with_suffix(''), fmt=fmt)
+    if mode == 'sqlite':
+        # Imported here so the JSON based modes never load sqlite3
+        from .sqlite_store import SqliteStore
+        return SqliteStore(data_file.with_suffix('.db'))
+    raise ValueError(f"Unknown storage mode: {mode}")
+
+
+def migrate(source: Store, target: Store):
+    """Copy all data from one store into another"""
+    target.import_data(source.load())
+
+
+def open_store(data_file, mode: Optional[str] = None, fmt: Optional[str] = None) -> Store:
+    """Create the store for a data file (mode: argument, environment, or what is on disk)"""
+    data_file = Path(data_file)
+
+    if fmt is None:
+        fmt = os.environ.get('FINANCIAL_TRACKER_FORMAT', 'json')
+    if mode is None:
+        mode = os.environ.get('FINANCIAL_TRACKER_STORAGE')
+    if mode is None:
+        mode = 'journal'
+        for candidate in ('sqlite', 'sharded'):
+            probe = create_store(data_file, candidate)
+            found = probe.exists()
+            probe.close()
+            if found:
+                mode = candidate
+                break
+
+    store = create_store(data_file, mode, fmt)
+
+    if mode in ('sharded', 'sqlite') and not store.exists() and data_file.exists():
+        print(f"Migrating {data_file} to {mode} storage")
+        migrate(JournalStore(data_file), store)
+    return store
@@ -0,0 +1,144 @@
+"""Realistic synthetic data for benchmarks and load tests
+
+The data is built through the Ledger the same way the application builds
+it: credits and indefinite recurring expenses become rules when they are
+added, every month gets one-off expenses (a share of them bills with
+bill_total/bill_paid), other income, meal tickets, and some recurring
+expenses are marked as paid in individual months (overrides).
+"""
+
+import random
+from typing import Dict, List
+
+from .ledger import Ledger
+from .recurring import add_months
+
+CATEGORIES = ['housing', 'utilities', 'food', 'transport', 'health', 'entertainment',
+              'bills', 'other']
+NAMES = ['Supermarket', 'Farmacie', 'Benzina', 'Restaurant', 'Haine', 'Cadouri', 'Taxi',
+         'Cinema', 'Carti', 'Service auto', 'Piata', 'Cafenea', 'Electronice', 'Vacanta']
+BILL_NAMES = ['Curent', 'Gaz', 'Apa', 'Internet', 'Telefon', 'Intretinere']
+INDEFINITE_NAMES = ['Chirie', 'Abonament sala', 'Netflix', 'Spotify', 'Asigurare casa',
+                    'Gradinita', 'Abonament transport']
+CREDIT_TYPES = ['mortgage', 'personal', 'car', 'overdraft', 'credit_card']
+STATUSES = ['Achitat', 'Neachitat', 'Rezervat']
+
+
+def month_keys(start: str, count: int) -> List[str]:
+    """`count` consecutive YYYY_MM keys starting with start"""
+    return [add_months(start, offset) for offset in range(count)]
+
+
+def _amount(rng: random.Random, low: float, high: float) -> float:
+    return round(rng.uniform(low, high), 2)
+
+
+def make_expense(rng: random.Random, bill_ratio: float = 0.2) -> Dict:
+    """A one-off Normal expense, a bill with payment tracking for bill_ratio of them"""
+    if rng.random() < bill_ratio:
+        bill_total = _amount(rng, 50, 600)
+        bill_paid = round(bill_total * rng.choice([0, 0.5, 1]), 2)
+        return {
+            'name': rng.choice(BILL_NAMES),
+            'type': 'Normal',
+            'base_amount': bill_total,
+            'total_amount': bill_total,
+            'status': 'Achitat' if bill_paid >= bill_total else 'Neachitat',
+            'reserved': False,
+            'category': 'bills',
+            'bill_total': bill_total,
+            'bill_paid': bill_paid,
+            'bill_remaining': round(bill_total - bill_paid, 2)
+        }
+    amount = _amount(rng, 5, 900)
+    return {
+        'name': rng.choice(NAMES),
+        'type': 'Normal',
+        'base_amount': amount,
+        'total_amount': amount,
+        'status': rng.choice(STATUSES),
+        'reserved': False,
+        'category': rng.choice(CATEGORIES)
+    }
+
+
+def make_credit(rng: random.Random, remaining_months: int) -> Dict:
+    """A Credit expense as added from the dialog (auto_add)"""
+    base_amount = _amount(rng, 200, 3000)
+    insurance = _amount(rng, 0, 80)
+    return {
+        'name': f"Credit {rng.choice(['BT', 'BCR', 'ING', 'BRD', 'Raiffeisen'])}",
+        'type': 'Credit',
+        'credit_type': rng.choice(CREDIT_TYPES),
+        'base_amount': base_amount,
+        'insurance': insurance,
+        'advance_payment': 0.0,
+        'total_amount': round(base_amount + insurance, 2),
+        'status': 'Neachitat',
+        'reserved': False,
+        'remaining_months': remaining_months,
+        'auto_add': True
+    }
+
+
+def make_indefinite(rng: random.Random, name: str) -> Dict:
+    """An indefinite recurring expense as added from the dialog"""
+    amount = _amount(rng, 30, 2500)
+    return {
+        'name': name,
+        'type': 'Normal',
+        'base_amount': amount,
+        'total_amount': amount,
+        'status': 'Neachitat',
+        'reserved': False,
+        'category': rng.choice(CATEGORIES),
+        'recurring_indefinite': True,
+        'auto_add': True
+    }
+
+
+def generate(years: int = 1, expenses_per_month: int = 30, credits: int = 2,
+             indefinite: int = 4, bill_ratio: float = 0.2, paid_ratio: float = 0.7,
+             start: str = '2000_01', seed: int = 1) -> Dict:
+    """Build a complete data structure covering `years` years
+
+    `expenses_per_month` counts every expense shown in a month, recurring
+    ones included. A new credit starts every time one ends, so `credits`
+    loans are always running; `paid_ratio` of the recurring expenses are
+    marked as paid in each month.
+    """
+    rng = random.Random(seed)
+    ledger = Ledger()
+    keys = month_keys(start, years * 12)
+    credit_ends = {}
+
+    for index, month_key in enumerate(keys):
+        month = ledger.open_month(month_key)
+
+        if index == 0:
+            for name in rng.sample(INDEFINITE_NAMES, min(indefinite, len(INDEFINITE_NAMES))):
+                ledger.add_expense(month, make_indefinite(rng, name))
+
+        # Keep `credits` loans running
+        running = sum(1 for end in credit_ends.values() if end > month_key)
+        for _ in range(credits - running):
+            remaining = rng.choice([12, 24, 60, 120, 360])
+            expense = ledger.add_expense(month, make_credit(rng, remaining))
+            credit_ends[expense['rule_id']] = add_months(month_key, remaining)
+
+        for position, expense in enumerate(month.expenses):
+            if expense.get('rule_id') and rng.random() < paid_ratio:
+                paid = dict(expense, status='Achitat')
+                ledger.update_expense(month, position, paid)
+
+        for _ in range(max(expenses_per_month - len(month.expenses), 0)):
+            ledger.add_expense(month, make_expense(rng, bill_ratio))
+
+        month.data['income'] = {'monthly_income': _amount(rng, 3000, 12000)}
+        month.data['other_income'] = [{'source': 'Bonus', 'amount': _amount(rng, 100, 1500)}
+                                      for _ in range(rng.randint(0, 2))]
+        month.data['meal_tickets'] = {'worked_days': rng.randint(18, 23),
+                                      'value_per_day': rng.choice([30.0, 35.0, 40.0])}
+        ledger.commit_month(month)
+
+    return ledger.data
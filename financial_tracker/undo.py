@@ -0,0 +1,121 @@
+"""Undo and redo of the changes made through the Ledger"""
+
+# A step keeps only deltas between stored forms, and is refused with UndoError
+# when the data no longer looks the way the step left it.
+
+import copy
+from collections import deque
+from typing import Dict, Optional
+
+from .locking import MISSING
+
+
+class UndoError(Exception):
+    """The data no longer matches the step being undone or redone"""
+
+
+def diff(old, new):
+    """Delta turning old into new, None when they are equal"""
+    if old is new or (old is not MISSING and new is not MISSING and old == new):
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key in list(old) + [key for key in new if key not in old]:
+            delta = diff(old.get(key, MISSING), new.get(key, MISSING))
+            if delta is not None:
+                changes[key] = delta
+        return 'dict', changes
+    if isinstance(old, list) and isinstance(new, list):
+        shortest = min(len(old), len(new))
+        start = 0
+        while start < shortest and (old[start] is new[start] or old[start] == new[start]):
+            start += 1
+        end = 0
+        while end < shortest - start and (old[-1 - end] is new[-1 - end]
+                                          or old[-1 - end] == new[-1 - end]):
+            end += 1
+        return 'list', start, old[start:len(old) - end], new[start:len(new) - end]
+    return 'set', old, new
+
+
+def patch(value, delta, reverse: bool = False):
+    """Apply a delta (backwards with reverse) to value and return the result"""
+    if delta is None:
+        return value
+    kind = delta[0]
+    if kind == 'dict':
+        if not isinstance(value, dict):
+            raise UndoError("Expected a dict")
+        result = dict(value)
+        for key, child in delta[1].items():
+            changed = patch(value.get(key, MISSING), child, reverse)
+            if changed is MISSING:
+                result.pop(key, None)
+            else:
+                result[key] = changed
+        return result
+
+    if kind == 'list':
+        _, start, old, new = delta
+        before, after = (new, old) if reverse else (old, new)
+        if not isinstance(value, list) or value[start:start + len(before)] != before:
+            raise UndoError("The list changed since")
+        # Copies, so later edits of the data never reach the history (frozen
+        # parts are not copied, they cannot be edited)
+        result = list(value)
+        result[start:start + len(before)] = copy.deepcopy(after)
+        return result
+
+    _, old, new = delta
+    before, after = (new, old) if reverse else (old, new)
+    if before is MISSING or value is MISSING:
+        if value is not before:
+            raise UndoError("The value changed since")
+    elif value != before:
+        raise UndoError("The value changed since")
+    return after if after is MISSING else copy.deepcopy(after)
+
+
+class Step:
+    """What one commit changed"""
+
+    def __init__(self, month: str, months: Dict[str, tuple], rules: Dict[str, tuple]):
+        self.month = month
+        self.months = months
+        self.rules = rules
+
+
+class UndoHistory:
+    """Undo and redo stacks of Steps, each holding at most `limit` steps"""
+
+    def __init__(self, limit: int = 100):
+        self.limit = limit
+        self._undo = deque(maxlen=limit)
+        self._redo = deque(maxlen=limit)
+
+    def record(self, step: Step):
+        """Add the step of a new change; what was undone can no longer be redone"""
+        self._undo.append(step)
+        self._redo.clear()
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def pop(self, redo: bool = False) -> Optional[Step]:
+        """Take the newest step to undo (or redo), None when there is none"""
+        stack = self._redo if redo else self._undo
+        return stack.pop() if stack else None
+
+    def push(self, step: Step, redo: bool = False):
+        """Put an undone step on the redo stack (or a redone one back)"""
+        (self._redo if redo else self._undo).append(step)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    def __len__(self) -> int:
+        return len(self._undo)
@@ -0,0 +1,71 @@
+import unittest
+
+from financial_tracker.aggregates import MonthAggregate
+from financial_tracker.ledger import Ledger
+
+
+def _expense(name: str, amount: float, status: str, category: str = 'food') -> dict:
+    return {'name': name, 'type': 'Normal', 'total_amount': amount, 'status': status,
+            'category': category}
+
+
+class MonthAggregateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.expenses = [_expense('Lidl', 100.0, 'Achitat'),
+                         _expense('Chirie', 900.0, 'Neachitat', 'bills'),
+                         _expense('Vacanta', 300.0, 'Rezervat', None),
+                         _expense('Apa', 0.1, 'Paid', 'bills')]
+        self.aggregate = MonthAggregate(self.expenses)
+
+    def test_totals(self):
+        self.assertEqual(self.aggregate.count, 4)
+        self.assertEqual(self.aggregate.totals(),
+                         {'total_expenses': 1300.1, 'paid_amount': 100.1,
+                          'unpaid_amount': 900.0, 'reserved_amount': 300.0})
+        # Expenses without a category count as 'other'
+        self.assertEqual(self.aggregate.by_category,
+                         {'food': 100.0, 'bills': 900.1, 'other': 300.0})
+
+    def test_updates_match_a_rebuild(self):
+        self.aggregate.replace(self.expenses[1], _expense('Chirie', 950.0, 'Achitat', 'bills'))
+        self.aggregate.remove(self.expenses[0])
+        self.aggregate.add(_expense('Omv', 200.0, 'Neachitat', 'transport'))
+        expected = MonthAggregate([_expense('Chirie', 950.0, 'Achitat', 'bills'),
+                                   self.expenses[2], self.expenses[3],
+                                   _expense('Omv', 200.0, 'Neachitat', 'transport')])
+        self.assertEqual(self.aggregate.count, expected.count)
+        self.assertAlmostEqual(self.aggregate.total, expected.total)
+        for group, amount in expected.by_status.items():
+            self.assertAlmostEqual(self.aggregate.by_status[group], amount)
+        self.assertEqual(set(self.aggregate.by_category), {'bills', 'other', 'transport'})
+
+    def test_empty_buckets_are_exactly_zero(self):
+        for expense in self.expenses:
+            self.aggregate.remove(expense)
+        self.assertEqual(self.aggregate.totals(),
+                         {'total_expenses': 0.0, 'paid_amount': 0.0,
+                          'unpaid_amount': 0.0, 'reserved_amount': 0.0})
+        self.assertEqual(self.aggregate.by_category, {})
+
+
+class LedgerTotalsTest(unittest.TestCase):
+
+    def test_kept_in_step_with_the_month(self):
+        ledger = Ledger()
+        month = ledger.open_month('2025_01')
+        ledger.add_expense(month, _expense('Lidl', 100.0, 'Achitat'))
+        ledger.add_expense(month, _expense('Chirie', 900.0, 'Neachitat', 'bills'))
+        ledger.update_expense(month, 0, _expense('Lidl', 120.0, 'Neachitat'))
+        ledger.remove_expense(month, 1)
+        ledger.commit_month(month)
+
+        totals = Ledger.calculate_totals(ledger.open_month('2025_01'))
+        self.assertEqual((totals['total_expenses'], totals['paid_amount'],
+                          totals['unpaid_amount']), (120.0, 0.0, 120.0))
+        self.assertEqual(totals['remaining_after_expenses'],
+                         totals['monthly_income'] - 120.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from financial_tracker.analytics import by_year, report, rolling_mean
+from financial_tracker.ledger import Ledger
+
+
+def _expense(name: str, amount: float, category: str, status: str = 'Neachitat', **fields) -> dict:
+    return dict({'name': name, 'type': 'Normal', 'total_amount': amount, 'status': status,
+                 'category': category}, **fields)
+
+
+class ExpenseColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = Ledger()
+        self._add('2024_12', _expense('Cadouri', 300.0, 'other', 'Achitat'))
+        self._add('2025_01', _expense('Lidl', 100.0, 'food'),
+                  _expense('Chirie', 900.0, 'bills', auto_add=True, recurring_months=3))
+        self._add('2025_02', _expense('Lidl', 50.0, 'food', 'Achitat'))
+        self.columns = self.ledger.analytics
+
+    def _add(self, month_key: str, *expenses):
+        month = self.ledger.open_month(month_key)
+        for expense in expenses:
+            self.ledger.add_expense(month, expense)
+        self.ledger.commit_month(month)
+
+    def test_sums(self):
+        self.assertEqual(self.columns.months(), ['2024_12', '2025_01', '2025_02'])
+        # Recurring expenses count in every month they reach
+        self.assertEqual(self.columns.expense_totals(), [300.0, 1000.0, 950.0])
+        self.assertEqual(self.columns.sums_by('category'),
+                         {'other': [300.0, 0.0, 0.0], 'food': [0.0, 100.0, 50.0],
+                          'bills': [0.0, 900.0, 900.0]})
+        self.assertEqual(self.columns.sums_by('status'),
+                         {'paid': [300.0, 0.0, 50.0], 'unpaid': [0.0, 1000.0, 900.0]})
+        self.assertEqual(self.columns.income()['meal_tickets'], [700.0, 700.0, 700.0])
+
+    def test_kept_in_step_with_the_ledger(self):
+        self.columns.expense_totals()
+        self._add('2025_02', _expense('Omv', 25.0, 'transport'))
+        self.assertEqual(self.columns.expense_totals(), [300.0, 1000.0, 975.0])
+
+        # Stopping the rule changes the months after it
+        self.ledger.remove_recurring_from_future_months('Chirie', '2025_01')
+        self.assertEqual(self.columns.expense_totals(), [300.0, 1000.0, 75.0])
+        self.assertEqual(self.columns.sums_by('category')['bills'], [0.0, 900.0, 0.0])
+
+    def test_report(self):
+        result = report(self.columns)
+        self.assertEqual(result['periods'], ['2024', '2025'])
+        self.assertEqual(result['expenses'], [300.0, 1950.0])
+        self.assertEqual(result['groups']['bills'], [0.0, 1800.0])
+        self.assertEqual(result['remaining'], [1700.0, 2050.0])
+
+        result = report(self.columns, period='month', window=2, start='2025_01')
+        self.assertEqual(result['periods'], ['2025_01', '2025_02'])
+        self.assertEqual(result['expenses_average'], [1000.0, 975.0])
+        # Groups without expenses in the selected months are left out
+        self.assertNotIn('other', result['groups'])
+
+
+class SeriesTest(unittest.TestCase):
+
+    def test_by_year(self):
+        self.assertEqual(by_year(['2024_12', '2025_01', '2025_02'], [1.0, 2.0, 3.0]),
+                         {'2024': 1.0, '2025': 5.0})
+
+    def test_rolling_mean(self):
+        self.assertEqual(rolling_mean([2.0, 4.0, 6.0, 8.0], 2), [2.0, 3.0, 5.0, 7.0])
+        self.assertEqual(rolling_mean([], 3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker.atomic import (CorruptDataError, decode_record, encode_record,
+                                      encode_snapshot, generation_path, read_snapshot,
+                                      verify_checksum, write_file_atomic)
+
+
+class WriteFileAtomicTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / 'data.json'
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_keeps_older_generations(self):
+        for number in range(4):
+            write_file_atomic(self.path, f"version {number}", generations=2)
+        self.assertEqual(self.path.read_text(), "version 3")
+        self.assertEqual(generation_path(self.path, 1).read_text(), "version 2")
+        self.assertEqual(generation_path(self.path, 2).read_text(), "version 1")
+        self.assertFalse(generation_path(self.path, 3).exists())
+
+    def test_leaves_no_temporary_file(self):
+        write_file_atomic(self.path, b"data")
+        self.assertEqual([p.name for p in self.path.parent.iterdir()], ['data.json'])
+
+
+class ChecksumTest(unittest.TestCase):
+
+    def test_snapshot_checksum(self):
+        raw = encode_snapshot({'settings': {'currency': 'LEI'}})
+        self.assertEqual(verify_checksum(raw), (True, True))
+        damaged = raw.replace(b'LEI', b'EUR')
+        self.assertEqual(verify_checksum(damaged), (True, False))
+
+    def test_plain_json_has_no_checksum(self):
+        self.assertEqual(verify_checksum(b'{"settings": {}}'), (False, True))
+
+    def test_record_round_trip(self):
+        record = {'op': 'month', 'key': '2025_01', 'value': {'name': 'Chirie', 'amount': 1.5}}
+        line = encode_record(record)
+        self.assertTrue(line.endswith(b'\n'))
+        self.assertEqual(decode_record(line), record)
+
+    def test_damaged_record(self):
+        line = encode_record({'op': 'drop', 'key': '2025_01'})
+        with self.assertRaises(ValueError):
+            decode_record(line.replace(b'2025_01', b'2025_02'))
+        with self.assertRaises(ValueError):
+            decode_record(line[:len(line) // 2])
+
+    def test_record_without_checksum(self):
+        self.assertEqual(decode_record(b'{"op":"drop","key":"2025_01"}\n'),
+                         {'op': 'drop', 'key': '2025_01'})
+
+
+class ReadSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / 'data.json'
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, version: int):
+        write_file_atomic(self.path, encode_snapshot({'version': version}), generations=2)
+
+    def test_reads_current_copy(self):
+        self._write(1)
+        self._write(2)
+        self.assertEqual(read_snapshot(self.path, 2), {'version': 2})
+
+    def test_falls_back_to_older_copy(self):
+        self._write(1)
+        self._write(2)
+        # A torn write of the current copy
+        self.path.write_bytes(self.path.read_bytes()[:10])
+        self.assertEqual(read_snapshot(self.path, 2), {'version': 1})
+
+    def test_falls_back_when_current_copy_is_missing(self):
+        self._write(1)
+        self._write(2)
+        # A crash between the rotation renames
+        self.path.unlink()
+        self.assertEqual(read_snapshot(self.path, 2), {'version': 1})
+
+    def test_no_valid_copy(self):
+        self._write(1)
+        self.path.write_bytes(self.path.read_bytes().replace(b'1', b'7'))
+        with self.assertRaises(CorruptDataError) as caught:
+            read_snapshot(self.path, 2)
+        # Kept aside so a new save cannot overwrite it
+        self.assertFalse(self.path.exists())
+        self.assertEqual(caught.exception.moved_to, [self.path.with_name('data.json.corrupt')])
+        self.assertTrue(caught.exception.moved_to[0].exists())
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            read_snapshot(self.path, 2)
+
+    def test_compact_format(self):
+        write_file_atomic(self.path, encode_snapshot({'version': 3}, 'compact'))
+        self.assertEqual(read_snapshot(self.path), {'version': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker import categorize
+from financial_tracker.categorize import Categorizer, make_rule, recategorize, trie_pattern
+from financial_tracker.ledger import Ledger
+from financial_tracker.storage import JournalStore
+from financial_tracker.undo import UndoHistory
+
+
+def _expense(name: str, amount: float, **fields) -> dict:
+    return dict({'name': name, 'type': 'Normal', 'total_amount': amount,
+                 'status': 'Neachitat', 'category': 'other'}, **fields)
+
+
+class TriePatternTest(unittest.TestCase):
+
+    def test_matches_every_keyword(self):
+        regex = re.compile(trie_pattern(['bolt', 'bolt food', 'omv', 'orange']))
+        for keyword in ('bolt', 'bolt food', 'omv', 'orange'):
+            self.assertEqual(regex.fullmatch(keyword).group(), keyword)
+        self.assertIsNone(regex.search('lidl'))
+
+    def test_longest_keyword_first(self):
+        regex = re.compile(trie_pattern(['bolt', 'bolt food']))
+        self.assertEqual(regex.search('comanda bolt food').group(), 'bolt food')
+
+    def test_special_characters(self):
+        regex = re.compile(trie_pattern(['e.on', 'h&m']))
+        self.assertIsNotNone(regex.search('factura e.on'))
+        self.assertIsNone(regex.search('factura eXon'))
+
+
+class CategorizerTest(unittest.TestCase):
+
+    def test_first_rule_wins(self):
+        categorizer = Categorizer([make_rule('bolt food', 'food'), make_rule('bolt', 'transport')])
+        self.assertEqual(categorizer.category('Bolt Food Cluj'), 'food')
+        self.assertEqual(categorizer.category('Bolt ride'), 'transport')
+        # A shorter keyword of an earlier rule wins over the longer one
+        categorizer = Categorizer([make_rule('bolt', 'transport'), make_rule('bolt food', 'food')])
+        self.assertEqual(categorizer.category('Bolt Food Cluj'), 'transport')
+
+    def test_later_keyword_in_the_name(self):
+        categorizer = Categorizer([make_rule('lidl', 'food'), make_rule('card', 'other')])
+        self.assertEqual(categorizer.category('plata card lidl'), 'food')
+
+    def test_regex_and_amount_range(self):
+        categorizer = Categorizer([make_rule('lidl', 'entertainment', min_amount=1000.0),
+                                   make_rule(r'^rata\b', 'bills', match='regex'),
+                                   make_rule('lidl', 'food')])
+        self.assertEqual(categorizer.category('Lidl', 50.0), 'food')
+        self.assertEqual(categorizer.category('Lidl', 1500.0), 'entertainment')
+        self.assertEqual(categorizer.category('Rata casa'), 'bills')
+        self.assertIsNone(categorizer.category('Chirie rata'))
+
+    def test_empty_pattern_matches_everything(self):
+        categorizer = Categorizer([make_rule('lidl', 'food'), make_rule('', 'other'),
+                                   make_rule('omv', 'transport')])
+        self.assertEqual(categorizer.category('Lidl'), 'food')
+        self.assertEqual(categorizer.category('OMV'), 'other')
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            make_rule('x', 'unknown')
+        with self.assertRaises(ValueError):
+            make_rule('(', 'food', match='regex')
+        with self.assertRaises(ValueError):
+            make_rule('x', 'food', min_amount=10.0, max_amount=1.0)
+
+
+class RecategorizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = Ledger()
+        month = self.ledger.open_month('2025_01')
+        self.ledger.add_expense(month, _expense('Lidl', 50.0))
+        self.ledger.add_expense(month, _expense('Chirie', 900.0))
+        self.ledger.commit_month(month)
+        month = self.ledger.open_month('2025_02')
+        self.ledger.add_expense(month, _expense('Netflix', 40.0, auto_add=True,
+                                                recurring_indefinite=True))
+        self.ledger.commit_month(month)
+
+    def _categories(self, month_key: str):
+        return {expense['name']: expense.get('category')
+                for expense in self.ledger.open_month(month_key).expenses}
+
+    def test_changes_expenses_and_rules(self):
+        self.assertEqual(recategorize(self.ledger), 2)
+        self.assertEqual(self._categories('2025_01'), {'Lidl': 'food', 'Chirie': 'other'})
+        self.assertEqual(self._categories('2025_04'), {'Netflix': 'entertainment'})
+        self.assertIn('2025_01', self.ledger.dirty_months)
+        self.assertEqual(recategorize(self.ledger), 0)
+
+    def test_range_and_only_other(self):
+        categorize.set_rules(self.ledger.data, [make_rule('chirie', 'bills')])
+        self.assertEqual(recategorize(self.ledger, start='2025_02'), 1)
+        self.assertEqual(self._categories('2025_01')['Chirie'], 'other')
+        self.assertEqual(recategorize(self.ledger, end='2025_01', only_other=True), 2)
+        self.assertEqual(self._categories('2025_01'), {'Lidl': 'food', 'Chirie': 'bills'})
+
+    def test_undo_and_redo(self):
+        ledger = self.ledger
+        ledger.history = UndoHistory()
+        recategorize(ledger)
+
+        # The whole recategorization is one step
+        ledger.undo()
+        self.assertEqual(self._categories('2025_01'), {'Lidl': 'other', 'Chirie': 'other'})
+        self.assertEqual(self._categories('2025_04'), {'Netflix': 'other'})
+        self.assertIsNone(ledger.undo())
+
+        ledger.redo()
+        self.assertEqual(self._categories('2025_01'), {'Lidl': 'food', 'Chirie': 'other'})
+        self.assertEqual(self._categories('2025_04'), {'Netflix': 'entertainment'})
+
+
+class RecategorizeSyncTest(unittest.TestCase):
+    """Recategorizing while another program saves the same month"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        path = Path(self._tmp.name) / 'financial_data.json'
+        ledger = Ledger.from_store(JournalStore(path))
+        month = ledger.open_month('2025_01')
+        ledger.add_expense(month, _expense('Lidl', 50.0))
+        ledger.commit_month(month)
+        ledger.save(JournalStore(path))
+
+        self.first_store, self.second_store = JournalStore(path), JournalStore(path)
+        self.first = Ledger.from_store(self.first_store)
+        self.second = Ledger.from_store(self.second_store)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_both_changes_are_kept(self):
+        month = self.second.open_month('2025_01')
+        self.second.add_expense(month, _expense('Chirie', 900.0))
+        self.second.commit_month(month)
+        self.second.save(self.second_store)
+
+        recategorize(self.first)
+        result = self.first.sync(self.first_store)
+        self.assertEqual(result['conflicts'], [])
+        self.first.save(self.first_store)
+
+        stored = JournalStore(self.first_store.path).load()['monthly_data']['2025_01']
+        categories = {expense['name']: expense['category'] for expense in stored['expenses']}
+        self.assertEqual(categories, {'Lidl': 'food', 'Chirie': 'other'})
+
+
+if __name__ == '__main__':
+    unittest.main()
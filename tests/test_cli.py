@@ -0,0 +1,96 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from financial_tracker.cli import main
+from financial_tracker.ledger import Ledger
+from financial_tracker.storage import open_store
+
+
+class CliTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+        self.data_file = self.dir / 'financial_data.json'
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            status = main(['--data', str(self.data_file)] + list(argv))
+        return status, out.getvalue(), err.getvalue()
+
+    def _names(self, month_key: str):
+        store = open_store(self.data_file)
+        try:
+            month = Ledger.from_store(store).open_month(month_key)
+        finally:
+            store.close()
+        return [expense['name'] for expense in month.expenses]
+
+    def test_add_and_summary(self):
+        status, out, _ = self._run('add', 'Cinema', '45', '--month', '2025-03',
+                                   '--category', 'entertainment')
+        self.assertEqual(status, 0)
+        self.assertIn('2025_03', out)
+        status, out, _ = self._run('--json', 'summary', '2025_03')
+        self.assertEqual(status, 0)
+        summary = json.loads(out)
+        self.assertEqual((summary['month'], summary['total_expenses']), ('2025_03', 45.0))
+
+    def test_recurring_add(self):
+        self._run('add', 'Chirie', '900', '--month', '2025_01', '--months', '3')
+        self.assertEqual(self._names('2025_03'), ['Chirie'])
+        self.assertEqual(self._names('2025_04'), [])
+
+    def test_invalid_amounts(self):
+        for text in ('nan', 'inf', '-Infinity', 'abc'):
+            status, _, err = self._run('add', 'Cinema', text, '--month', '2025_03')
+            self.assertEqual(status, 2, text)
+            self.assertIn('amount', err)
+        self.assertFalse(self.data_file.exists())
+
+    def test_batch_stops_at_an_error(self):
+        commands = self.dir / 'commands.txt'
+        commands.write_text('# comment\n'
+                            'add Paine 5 --month 2025_01\n'
+                            'add Lapte nan --month 2025_01\n', encoding='utf-8')
+        status, _, err = self._run('batch', str(commands))
+        self.assertEqual(status, 1)
+        self.assertIn('line 3', err)
+        # Nothing of the batch is saved
+        self.assertFalse(self.data_file.exists())
+
+        commands.write_text('add Paine 5 --month 2025_01\n'
+                            'remove 7 --month 2025_01\n', encoding='utf-8')
+        status, _, err = self._run('batch', str(commands))
+        self.assertEqual((status, 'line 2' in err), (1, True))
+
+    def test_batch_reports_unexpected_errors(self):
+        commands = self.dir / 'commands.txt'
+        commands.write_text('add Paine 5 --month 2025_01\nsummary 2025_01\n', encoding='utf-8')
+        with mock.patch.object(Ledger, 'calculate_totals', side_effect=KeyError('income')):
+            status, _, err = self._run('batch', str(commands))
+        self.assertEqual(status, 1)
+        self.assertIn("line 2: KeyError: 'income'", err)
+        self.assertNotIn('Traceback', err)
+
+    def test_batch(self):
+        commands = self.dir / 'commands.txt'
+        commands.write_text('add Paine 5 --month 2025_01\n'
+                            'add Lapte 7.5 --month 2025_01\n'
+                            'remove --name Paine --month 2025_01\n', encoding='utf-8')
+        self.assertEqual(self._run('batch', str(commands))[0], 0)
+        self.assertEqual(self._names('2025_01'), ['Lapte'])
+        self.assertEqual(self._run('batch', str(self.dir / 'missing.txt'))[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
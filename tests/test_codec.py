@@ -0,0 +1,78 @@
+import json
+import math
+import unittest
+
+from financial_tracker import codec
+from financial_tracker.atomic import decode_snapshot, encode_snapshot
+from financial_tracker.frozen import freeze
+from financial_tracker.synthetic import generate
+
+
+class CodecTest(unittest.TestCase):
+
+    def _round_trip(self, value):
+        decoded = codec.decode(codec.encode(value))
+        self.assertEqual(decoded, value)
+        # Floats stay floats and ints stay ints
+        self.assertEqual(json.dumps(decoded), json.dumps(value))
+        return decoded
+
+    def test_scalars(self):
+        for value in (None, True, False, 0, 1, -1, 127, 128, -129, 2 ** 63, -(2 ** 70),
+                      '', 'Întreținere ăîșț', '€ 😀'):
+            self._round_trip(value)
+
+    def test_floats(self):
+        for value in (0.0, -0.0, 1.0, -3.0, 12.5, 1234.56, -0.01, 0.1 + 0.2, 1e300,
+                      2.0 ** 60, 1e-7, 35.0):
+            with self.subTest(value=value):
+                decoded = self._round_trip(value)
+                self.assertEqual(math.copysign(1, decoded), math.copysign(1, value))
+
+    def test_nested(self):
+        self._round_trip({'monthly_data': {'2025_01': {
+            'income': {'monthly_income': 2000.0},
+            'expenses': [{'name': 'Chirie', 'total_amount': 1500.0, 'tags': []},
+                         {'name': 'Chirie', 'total_amount': 99.99, 'paid': None}],
+            'other_income': []}},
+            'settings': {'language': 'ro'}, 'empty': {}})
+
+    def test_frozen_values(self):
+        value = {'expenses': [{'name': 'a', 'total_amount': 1.5}]}
+        self.assertEqual(codec.decode(codec.encode(freeze(value))), value)
+
+    def test_rejects_other_types(self):
+        with self.assertRaises(TypeError):
+            codec.encode({'when': object()})
+        with self.assertRaises(ValueError):
+            codec.decode(b'{}')
+
+    def test_truncated_or_garbled(self):
+        raw = codec.encode({'expenses': [{'name': 'Întreținere', 'total_amount': 0.1 + 0.2,
+                                          'count': 300}]})
+        for end in range(len(codec.MAGIC), len(raw)):
+            with self.subTest(end=end):
+                with self.assertRaisesRegex(ValueError, 'Truncated'):
+                    codec.decode(raw[:end])
+        # A string longer than the data, a string that is not UTF-8, a bad string index
+        for body in (b'\x01\x05ab', b'\x01\x02\xc3\x28\x07\x00', b'\x00\x07\x03'):
+            with self.subTest(body=body):
+                with self.assertRaisesRegex(ValueError, 'Truncated'):
+                    codec.decode(codec.MAGIC + body)
+
+    def test_synthetic_data(self):
+        data = generate(years=2, seed=1)
+        self.assertEqual(codec.decode(codec.encode(data)), json.loads(json.dumps(data)))
+
+    def test_snapshot_formats(self):
+        data = {'monthly_data': {'2025_01': {'expenses': [{'total_amount': 10.25}]}}}
+        for fmt in ('json', 'compact'):
+            with self.subTest(fmt=fmt):
+                raw = encode_snapshot(data, fmt)
+                self.assertEqual(decode_snapshot(raw), data)
+                with self.assertRaises(ValueError):
+                    decode_snapshot(raw[:-1] + bytes([raw[-1] ^ 1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import csv
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker.exporters import (TABLES, export, iter_rows, read_columnar,
+                                         read_columnar_rows)
+from financial_tracker.ledger import Ledger
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+        self.ledger = Ledger()
+        for number, month_key in enumerate(('2024_12', '2025_01', '2025_02'), 1):
+            month = self.ledger.open_month(month_key)
+            for position in range(number):
+                self.ledger.add_expense(month, {'name': f'Cheltuială {position}', 'type': 'Normal',
+                                                'total_amount': 10.5 * position,
+                                                'status': 'Neachitat', 'category': 'food'})
+            month.data['other_income'].append({'source': 'Bonus', 'amount': 100.0})
+            self.ledger.commit_month(month)
+        month = self.ledger.open_month('2025_01')
+        self.ledger.add_expense(month, {'name': 'Chirie', 'type': 'Normal', 'total_amount': 900.0,
+                                        'status': 'Achitat', 'auto_add': True,
+                                        'recurring_indefinite': True})
+        self.ledger.commit_month(month)
+        self.data = self.ledger.data
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_rows(self):
+        rows = list(iter_rows(self.data, 'expenses'))
+        self.assertEqual(len(rows), 1 + 3 + 4)
+        # Recurring expenses appear in every month they reach
+        self.assertEqual([row[0] for row in rows if row[2] == 'Chirie'], ['2025_01', '2025_02'])
+        self.assertEqual(len(list(iter_rows(self.data, 'income', start='2025_01'))), 2)
+        with self.assertRaises(ValueError):
+            list(iter_rows(self.data, 'unknown'))
+
+    def test_csv(self):
+        counts = export(self.data, self.dir, chunk_rows=2)
+        self.assertEqual(counts, {'expenses': 8, 'other_income': 3, 'income': 3, 'meal_tickets': 3})
+        with open(self.dir / 'expenses.csv', newline='', encoding='utf-8') as f:
+            lines = list(csv.reader(f))
+        self.assertEqual(lines[0], [name for name, _ in TABLES['expenses']])
+        self.assertEqual(lines[1][:3], ['2024_12', '0', 'Cheltuială 0'])
+        self.assertEqual(len(lines), 9)
+
+    def test_columnar_round_trip(self):
+        export(self.data, self.dir, fmt='columnar', tables=['expenses'], chunk_rows=3)
+        path = self.dir / 'expenses.ftc'
+        expected = [dict(zip([name for name, _ in TABLES['expenses']], row))
+                    for row in iter_rows(self.data, 'expenses')]
+        rows = list(read_columnar_rows(path))
+        # Missing numbers come back as None
+        self.assertEqual(rows, expected)
+        groups = list(read_columnar(path, ['month', 'total_amount']))
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(set(groups[0]), {'month', 'total_amount'})
+        with self.assertRaises(ValueError):
+            list(read_columnar(path, ['nope']))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            export(self.data, self.dir, fmt='xlsx')
+        with self.assertRaises(ValueError):
+            export(self.data, self.dir, tables=['nope'])
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+from financial_tracker.importers import (StatementError, import_file, import_transactions,
+                                         parse_amount, read_csv, read_ofx)
+from financial_tracker.ledger import Ledger
+from financial_tracker.undo import UndoHistory
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250103120000<TRNAMT>-45.50<FITID>A1<NAME>LIDL CLUJ</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250215<TRNAMT>3000.00<FITID>A2<NAME>SALARIU</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_amounts(self):
+        self.assertEqual(parse_amount('1,234.56'), 1234.56)
+        self.assertEqual(parse_amount('1.234,56 RON'), 1234.56)
+        self.assertEqual(parse_amount('-12,5'), -12.5)
+
+
+class ReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, name: str, text: str) -> Path:
+        path = self.dir / name
+        path.write_text(text, encoding='utf-8')
+        return path
+
+    def test_csv_with_debit_and_credit(self):
+        path = self._write('extras.csv', 'Data;Descriere;Debit;Credit\n'
+                                         '03.01.2025;Lidl;45,50;\n'
+                                         '\n'
+                                         '15.02.2025;Salariu;;3000\n')
+        transactions = list(read_csv(path))
+        self.assertEqual([(t['date'], t['amount'], t['description']) for t in transactions],
+                         [(date(2025, 1, 3), -45.5, 'Lidl'), (date(2025, 2, 15), 3000.0, 'Salariu')])
+
+    def test_csv_errors(self):
+        path = self._write('bad.csv', 'Date,Amount,Description\n2025-01-03,abc,Lidl\n')
+        with self.assertRaises(StatementError):
+            list(read_csv(path))
+        path = self._write('nodate.csv', 'Amount,Description\n1,Lidl\n')
+        with self.assertRaises(StatementError):
+            list(read_csv(path))
+
+    def test_ofx(self):
+        path = self._write('extras.ofx', OFX)
+        transactions = list(read_ofx(path))
+        self.assertEqual([(t['date'], t['amount'], t['id']) for t in transactions],
+                         [(date(2025, 1, 3), -45.5, 'A1'), (date(2025, 2, 15), 3000.0, 'A2')])
+
+
+class ImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = Ledger()
+
+    def _transaction(self, day: date, amount: float, description: str, id=None) -> dict:
+        return {'date': day, 'amount': amount, 'description': description, 'id': id}
+
+    def test_expenses_and_income(self):
+        result = import_transactions(self.ledger, [
+            self._transaction(date(2025, 1, 3), -45.5, 'Lidl'),
+            self._transaction(date(2025, 2, 15), 3000.0, 'Salariu'),
+            self._transaction(date(2025, 2, 16), 0.0, 'Nimic')])
+        self.assertEqual(result, {'expenses': 1, 'income': 1, 'skipped': 1, 'months': 2})
+        expense, = self.ledger.open_month('2025_01').expenses
+        self.assertEqual((expense['name'], expense['total_amount'], expense['category'],
+                          expense['status']), ('Lidl', 45.5, 'food', 'Achitat'))
+        income, = self.ledger.open_month('2025_02').data['other_income']
+        self.assertEqual((income['source'], income['amount']), ('Salariu', 3000.0))
+        self.assertEqual(self.ledger.dirty_months, {'2025_01', '2025_02'})
+
+    def test_import_again_skips_duplicates(self):
+        transactions = [self._transaction(date(2025, 1, 3), -10.0, 'Cafea'),
+                        self._transaction(date(2025, 1, 3), -10.0, 'Cafea'),
+                        self._transaction(date(2025, 2, 1), -5.0, 'Bilet'),
+                        # Back to a month the statement already moved past
+                        self._transaction(date(2025, 1, 9), -7.0, 'Paine', id='X1')]
+        self.assertEqual(import_transactions(self.ledger, transactions)['expenses'], 4)
+        self.assertEqual(len(self.ledger.open_month('2025_01').expenses), 3)
+
+        result = import_transactions(self.ledger, transactions)
+        self.assertEqual(result.get('expenses', 0), 0)
+        self.assertEqual(result['duplicates'], 4)
+        # One more identical transaction on that day is new
+        result = import_transactions(self.ledger, transactions[:3] + transactions[:1])
+        self.assertEqual(result['expenses'], 1)
+
+    def test_one_undo_step(self):
+        self.ledger.history = UndoHistory()
+        import_transactions(self.ledger, [self._transaction(date(2025, 1, 3), -1.0, 'a'),
+                                          self._transaction(date(2025, 2, 3), -2.0, 'b'),
+                                          self._transaction(date(2025, 3, 3), -3.0, 'c')])
+        self.ledger.undo()
+        self.assertEqual(self.ledger.data['monthly_data'], {})
+        self.assertIsNone(self.ledger.undo())
+
+    def test_nothing_added_when_reading_fails(self):
+        month = self.ledger.open_month('2025_01')
+        self.ledger.add_expense(month, {'name': 'Chirie', 'total_amount': 900.0,
+                                        'status': 'Neachitat'})
+        self.ledger.commit_month(month)
+        self.ledger.dirty_months.clear()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'extras.csv'
+            path.write_text('Date,Amount,Description\n2025-01-03,-1,Lidl\n'
+                            '2025-02-03,-2,Omv\n2025-03-03,x,Bad\n', encoding='utf-8')
+            with self.assertRaises(StatementError):
+                import_file(self.ledger, path)
+        self.assertEqual([expense['name'] for expense in self.ledger.open_month('2025_01').expenses],
+                         ['Chirie'])
+        self.assertEqual(sorted(self.ledger.data['monthly_data']), ['2025_01'])
+        self.assertEqual(self.ledger.dirty_months, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
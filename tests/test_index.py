@@ -0,0 +1,54 @@
+import unittest
+
+from financial_tracker.index import ExpenseIndex
+from financial_tracker.storage import LazyMonths, read_month
+
+
+def _month(*names) -> dict:
+    return {'expenses': [{'name': name, 'total_amount': 1.0} for name in names]}
+
+
+class ExpenseIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {'monthly_data': {'2025_01': _month('Chirie', 'Paine', 'Chirie'),
+                                      '2025_02': _month('Paine'),
+                                      '2025_03': _month('Chirie')}}
+        self.index = ExpenseIndex(self.data)
+
+    def test_occurrences(self):
+        self.assertEqual(self.index.occurrences('Chirie'),
+                         [('2025_01', [0, 2]), ('2025_03', [0])])
+        self.assertEqual(self.index.occurrences('Chirie', start='2025_02'), [('2025_03', [0])])
+        self.assertEqual(self.index.occurrences('Paine', end='2025_01'), [('2025_01', [1])])
+        self.assertEqual(self.index.occurrences('Apa'), [])
+
+    def test_update_month(self):
+        self.index.occurrences('Paine')
+        self.data['monthly_data']['2025_02'] = _month('Apa', 'Paine')
+        self.index.update_month('2025_02', self.data['monthly_data']['2025_02']['expenses'])
+        self.assertEqual(self.index.occurrences('Paine'), [('2025_01', [1]), ('2025_02', [1])])
+        self.assertEqual(self.index.occurrences('Apa'), [('2025_02', [0])])
+
+        del self.data['monthly_data']['2025_03']
+        self.index.update_month('2025_03', None)
+        self.assertEqual(self.index.occurrences('Chirie'), [('2025_01', [0, 2])])
+
+    def test_update_before_first_use(self):
+        # Nothing is read until the index is needed
+        self.data['monthly_data']['2025_04'] = _month('Apa')
+        self.index.update_month('2025_04', self.data['monthly_data']['2025_04']['expenses'])
+        self.assertEqual(self.index.occurrences('Apa'), [('2025_04', [0])])
+
+    def test_lazy_months_are_not_kept(self):
+        months = self.data['monthly_data']
+        lazy = LazyMonths(months, months.__getitem__, cache_size=1)
+        self.assertEqual(ExpenseIndex({'monthly_data': lazy}).occurrences('Paine'),
+                         [('2025_01', [1]), ('2025_02', [0])])
+        self.assertFalse(any(lazy.is_loaded(key) for key in months))
+        self.assertEqual(read_month(lazy, '2025_02'), months['2025_02'])
+        self.assertEqual(read_month(months, '2025_02'), months['2025_02'])
+
+
+if __name__ == '__main__':
+    unittest.main()
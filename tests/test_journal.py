@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker.atomic import CorruptDataError
+from financial_tracker.storage import JournalStore, default_data
+
+
+def _month(amount: float) -> dict:
+    return {'income': {'monthly_income': amount}, 'expenses': [], 'other_income': []}
+
+
+class JournalStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / 'financial_data.json'
+        self.store = JournalStore(self.path)
+        data = default_data()
+        data['monthly_data']['2025_01'] = _month(1.0)
+        # The first save writes the snapshot, the others append records
+        self.store.save(data)
+        for number, key in enumerate(('2025_02', '2025_03', '2025_04'), 2):
+            data['monthly_data'][key] = _month(float(number))
+            self.store.save(data, [key])
+        self.data = data
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _lines(self):
+        return self.store.journal_path.read_bytes().splitlines(keepends=True)
+
+    def test_replay(self):
+        self.assertEqual(len(self._lines()), 3)
+        loaded = JournalStore(self.path).load()
+        self.assertEqual(loaded['monthly_data'], self.data['monthly_data'])
+
+    def test_replay_deletion(self):
+        del self.data['monthly_data']['2025_02']
+        self.store.save(self.data, ['2025_02'])
+        loaded = JournalStore(self.path).load()
+        self.assertEqual(sorted(loaded['monthly_data']), ['2025_01', '2025_03', '2025_04'])
+
+    def test_torn_last_record_is_dropped(self):
+        lines = self._lines()
+        torn = b''.join(lines[:-1]) + lines[-1][:20]
+        self.store.journal_path.write_bytes(torn)
+        loaded = JournalStore(self.path).load()
+        self.assertEqual(sorted(loaded['monthly_data']), ['2025_01', '2025_02', '2025_03'])
+        # Cut off, so new records are not appended after it
+        self.assertEqual(self.store.journal_path.read_bytes(), b''.join(lines[:-1]))
+
+    def test_damaged_record_before_the_last_one(self):
+        lines = self._lines()
+        lines[1] = lines[1].replace(b'3.0', b'9.0')
+        damaged = b''.join(lines)
+        self.store.journal_path.write_bytes(damaged)
+        with self.assertRaises(CorruptDataError):
+            JournalStore(self.path).load()
+        self.assertEqual(self.store.journal_path.read_bytes(), damaged)
+
+    def test_compaction(self):
+        store = JournalStore(self.path, compact_every=2)
+        data = store.load()
+        data['monthly_data']['2025_05'] = _month(5.0)
+        store.save(data, ['2025_05'])
+        self.assertFalse(store.journal_path.exists())
+        self.assertEqual(JournalStore(self.path).load()['monthly_data'], data['monthly_data'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker.ledger import Ledger
+from financial_tracker.locking import MISSING, ConflictError, merge_items, merge_month, merge_value
+from financial_tracker.storage import JournalStore
+
+
+def _expense(name: str, amount: float) -> dict:
+    return {'name': name, 'total_amount': amount, 'status': 'Neachitat'}
+
+
+class MergeItemsTest(unittest.TestCase):
+
+    def test_additions_on_both_sides(self):
+        base = [_expense('a', 1.0)]
+        merged, conflict = merge_items(base, base + [_expense('b', 2.0)],
+                                       base + [_expense('c', 3.0)])
+        self.assertEqual([item['name'] for item in merged], ['a', 'c', 'b'])
+        self.assertFalse(conflict)
+
+    def test_same_addition_on_both_sides(self):
+        base = [_expense('a', 1.0)]
+        ours = theirs = base + [_expense('b', 2.0)]
+        merged, conflict = merge_items(base, ours, theirs)
+        self.assertEqual(merged, ours)
+        self.assertFalse(conflict)
+
+    def test_removal_and_addition(self):
+        base = [_expense('a', 1.0), _expense('b', 2.0)]
+        merged, conflict = merge_items(base, [_expense('b', 2.0)],
+                                       base + [_expense('c', 3.0)])
+        self.assertEqual([item['name'] for item in merged], ['b', 'c'])
+        self.assertFalse(conflict)
+
+    def test_both_edited_the_same_item(self):
+        base = [_expense('a', 1.0)]
+        merged, conflict = merge_items(base, [_expense('a', 5.0)], [_expense('a', 7.0)])
+        # Both versions are kept
+        self.assertEqual([item['total_amount'] for item in merged], [7.0, 5.0])
+        self.assertTrue(conflict)
+
+
+class MergeValueTest(unittest.TestCase):
+
+    def test_one_side_changed(self):
+        self.assertEqual(merge_value({'a': 1}, {'a': 1}, {'a': 2}), ({'a': 2}, False))
+        self.assertEqual(merge_value({'a': 1}, {'a': 3}, {'a': 1}), ({'a': 3}, False))
+
+    def test_dict_merged_entry_by_entry(self):
+        base = {'r1': {'count': 1}, 'r2': {'count': 2}}
+        ours = {'r1': {'count': 10}, 'r2': {'count': 2}, 'r3': {'count': 3}}
+        theirs = {'r1': {'count': 1}}
+        merged, conflict = merge_value(base, ours, theirs)
+        self.assertEqual(merged, {'r1': {'count': 10}, 'r3': {'count': 3}})
+        self.assertFalse(conflict)
+
+    def test_conflict_keeps_ours(self):
+        self.assertEqual(merge_value('ro', 'en', 'de'), ('en', True))
+
+    def test_missing_key(self):
+        self.assertEqual(merge_value(MISSING, MISSING, {'a': 1}), ({'a': 1}, False))
+
+
+class MergeMonthTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = {'income': {'monthly_income': 100.0},
+                     'expenses': [_expense('a', 1.0)], 'other_income': []}
+
+    def test_changes_of_both_sides(self):
+        ours = dict(self.base, income={'monthly_income': 200.0})
+        theirs = dict(self.base, expenses=self.base['expenses'] + [_expense('b', 2.0)])
+        merged, conflict = merge_month(self.base, ours, theirs)
+        self.assertEqual(merged['income'], {'monthly_income': 200.0})
+        self.assertEqual([item['name'] for item in merged['expenses']], ['a', 'b'])
+        self.assertFalse(conflict)
+
+    def test_created_on_both_sides(self):
+        ours = dict(self.base, expenses=[_expense('a', 1.0)])
+        theirs = dict(self.base, expenses=[_expense('b', 2.0)])
+        merged, conflict = merge_month(None, ours, theirs)
+        self.assertEqual([item['name'] for item in merged['expenses']], ['b', 'a'])
+        self.assertFalse(conflict)
+
+    def test_deleted_by_them(self):
+        self.assertEqual(merge_month(self.base, self.base, None), (None, False))
+
+    def test_unknown_base_keeps_ours(self):
+        theirs = dict(self.base, income={'monthly_income': 1.0})
+        self.assertEqual(merge_month(MISSING, self.base, theirs), (self.base, True))
+
+
+class LedgerSyncTest(unittest.TestCase):
+    """Two programs saving the same month of one data file"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        path = Path(self._tmp.name) / 'financial_data.json'
+        self.first_store, self.second_store = JournalStore(path), JournalStore(path)
+        self.first = Ledger.from_store(self.first_store)
+        self.second = Ledger.from_store(self.second_store)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _add(self, ledger: Ledger, name: str, amount: float):
+        month = ledger.open_month('2025_01')
+        ledger.add_expense(month, _expense(name, amount))
+        ledger.commit_month(month)
+
+    def test_saves_of_the_same_month_are_merged(self):
+        self._add(self.first, 'a', 1.0)
+        self.first.save(self.first_store)
+        self._add(self.second, 'b', 2.0)
+        # The second one has not seen the first save yet
+        with self.assertRaises(ConflictError):
+            self.second.save(self.second_store)
+
+        result = self.second.sync(self.second_store)
+        self.assertEqual(result['conflicts'], [])
+        self.second.save(self.second_store)
+        self.first.sync(self.first_store)
+
+        for ledger in (self.first, self.second):
+            names = [expense['name'] for expense in ledger.open_month('2025_01').expenses]
+            self.assertEqual(sorted(names), ['a', 'b'])
+        stored = JournalStore(self.first_store.path).load()['monthly_data']['2025_01']
+        self.assertEqual(sorted(expense['name'] for expense in stored['expenses']), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker.ledger import Ledger
+from financial_tracker.recurring import RULES_KEY, add_months, migrate_indefinite_copies
+from financial_tracker.storage import JournalStore, default_data
+from financial_tracker.undo import UndoHistory
+
+
+def _expense(name: str, amount: float, **fields) -> dict:
+    return dict({'name': name, 'type': 'Normal', 'total_amount': amount,
+                 'status': 'Neachitat'}, **fields)
+
+
+class RecurringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = Ledger()
+
+    def _add(self, month_key: str, *expenses):
+        month = self.ledger.open_month(month_key)
+        for expense in expenses:
+            self.ledger.add_expense(month, expense)
+        self.ledger.commit_month(month)
+        return month
+
+    def _names(self, month_key: str):
+        return [expense['name'] for expense in self.ledger.open_month(month_key).expenses]
+
+    def test_add_months(self):
+        self.assertEqual(add_months('2025_11', 3), '2026_02')
+        self.assertEqual(add_months('2025_01', -1), '2024_12')
+
+    def test_fixed_count(self):
+        self._add('2025_11', _expense('Curs', 100.0, auto_add=True, recurring_months=3))
+        self.assertEqual([self._names(key) for key in ('2025_10', '2025_11', '2026_01', '2026_02')],
+                         [[], ['Curs'], ['Curs'], []])
+        # Only the month it was added in is stored
+        self.assertEqual(sorted(self.ledger.data['monthly_data']), ['2025_11'])
+
+    def test_credit_counts_down(self):
+        self._add('2025_01', _expense('Credit', 500.0, type='Credit', remaining_months=3,
+                                      auto_add=True))
+        remaining = [[expense['remaining_months'] for expense in
+                      self.ledger.open_month(key).expenses]
+                     for key in ('2025_01', '2025_02', '2025_03', '2025_04')]
+        self.assertEqual(remaining, [[3], [2], [1], []])
+
+    def test_overrides(self):
+        self._add('2025_01', _expense('Chirie', 900.0, auto_add=True, recurring_indefinite=True))
+        month = self.ledger.open_month('2025_02')
+        self.ledger.update_expense(month, 0, dict(month.expenses[0], total_amount=950.0))
+        self.ledger.commit_month(month)
+        month = self.ledger.open_month('2025_03')
+        self.ledger.remove_expense(month, 0)
+        self.ledger.commit_month(month)
+
+        amounts = [[expense['total_amount'] for expense in self.ledger.open_month(key).expenses]
+                   for key in ('2025_01', '2025_02', '2025_03', '2025_04')]
+        self.assertEqual(amounts, [[900.0], [950.0], [], [900.0]])
+        rule_id, = self.ledger.data[RULES_KEY]
+        self.assertIsNone(self.ledger.data['monthly_data']['2025_03']['overrides'][rule_id])
+
+    def test_stop_in_a_later_month(self):
+        self._add('2025_01', _expense('Chirie', 900.0, auto_add=True, recurring_indefinite=True))
+        month = self.ledger.open_month('2025_03')
+        expense = dict(month.expenses[0], recurring_indefinite=False)
+        expense.pop('is_indefinite_recurring')
+        self.ledger.update_expense(month, 0, expense)
+        self.ledger.commit_month(month)
+        self.assertEqual([self._names(key) for key in ('2025_02', '2025_03', '2025_04')],
+                         [['Chirie'], ['Chirie'], []])
+
+    def test_new_months_take_income_of_the_month_it_was_added_in(self):
+        month = self.ledger.open_month('2025_01')
+        month.data['income']['monthly_income'] = 3100.0
+        month.data['meal_tickets'] = {'worked_days': 21, 'value_per_day': 40.0}
+        self.ledger.add_expense(month, _expense('Curs', 100.0, auto_add=True, recurring_months=2))
+        self.ledger.commit_month(month)
+
+        reached = self.ledger.open_month('2025_02').data
+        self.assertEqual(reached['income'], {'monthly_income': 3100.0})
+        self.assertEqual(reached['meal_tickets'], {'worked_days': 21, 'value_per_day': 40.0})
+        # Months the expense does not reach start from the defaults
+        self.assertEqual(self.ledger.open_month('2025_03').data['income'],
+                         {'monthly_income': 2000.0})
+
+    def test_months_with_the_name_do_not_get_it_again(self):
+        self.ledger.history = UndoHistory()
+        self._add('2025_03', _expense('Chirie', 800.0))
+        self._add('2025_01', _expense('Chirie', 900.0, auto_add=True, recurring_months=4))
+        amounts = [[expense['total_amount'] for expense in self.ledger.open_month(key).expenses]
+                   for key in ('2025_01', '2025_02', '2025_03', '2025_04')]
+        self.assertEqual(amounts, [[900.0], [900.0], [800.0], [900.0]])
+
+        # Instances of another rule count too
+        self._add('2025_04', _expense('Apa', 5.0))
+        self._add('2025_02', _expense('Chirie', 1.0, auto_add=True, recurring_indefinite=True))
+        self.assertEqual(self._names('2025_03'), ['Chirie'])
+        self.assertEqual(self._names('2025_04'), ['Apa', 'Chirie'])
+        self.assertEqual(self._names('2025_05'), ['Chirie'])
+
+        self.ledger.undo()
+        self.ledger.undo()
+        self.assertEqual(self._names('2025_04'), ['Chirie'])
+        self.ledger.undo()
+        self.assertNotIn('overrides', self.ledger.data['monthly_data']['2025_03'])
+
+    def test_migrate_indefinite_copies(self):
+        copy = _expense('Internet', 50.0, recurring_indefinite=True)
+        data = {'monthly_data': {
+            '2024_11': {'expenses': [copy]},
+            '2024_12': {'expenses': [copy, _expense('Apa', 10.0, is_indefinite_recurring=True)]},
+            # The series of Apa was stopped here
+            '2025_01': {'expenses': [_expense('Apa', 12.0)]}
+        }}
+        self.assertEqual(migrate_indefinite_copies(data), 1)
+        rule, = data[RULES_KEY].values()
+        self.assertEqual((rule['start'], rule['count'], rule['template']['name']),
+                         ('2025_01', None, 'Internet'))
+
+        ledger = Ledger(data)
+        self.assertEqual([expense['name'] for expense in ledger.open_month('2025_03').expenses],
+                         ['Internet'])
+        self.assertEqual(ledger.migrated_rules, 0)
+
+
+class RuleStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / 'financial_data.json'
+        # The first save writes the snapshot, the others append records
+        JournalStore(self.path).save(default_data())
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_changed_rule_gets_its_own_record(self):
+        store = JournalStore(self.path)
+        ledger = Ledger.from_store(store)
+        month = ledger.open_month('2025_05')
+        for name in ('Chirie', 'Internet'):
+            ledger.add_expense(month, {'name': name, 'type': 'Normal', 'total_amount': 10.0,
+                                       'status': 'Neachitat', 'auto_add': True,
+                                       'recurring_indefinite': True})
+        ledger.commit_month(month)
+        ledger.save(store)
+
+        # Stopping one of them rewrites only that rule
+        size = store.journal_path.stat().st_size
+        month = ledger.open_month('2025_06')
+        expense = dict(month.expenses[0], recurring_indefinite=False)
+        expense.pop('is_indefinite_recurring')
+        ledger.update_expense(month, 0, expense)
+        ledger.commit_month(month)
+        ledger.save(store)
+        with open(store.journal_path, 'rb') as f:
+            f.seek(size)
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record['op'] for record in records if record['key'] == RULES_KEY],
+                         ['entry'])
+
+        loaded = Ledger.from_store(JournalStore(self.path))
+        self.assertEqual(loaded.data[RULES_KEY], ledger.data[RULES_KEY])
+        self.assertEqual([expense['name'] for expense in loaded.open_month('2025_07').expenses],
+                         ['Internet'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from financial_tracker.ledger import Ledger
+from financial_tracker.search import SearchIndex, fold, parse_query
+
+
+def _expense(name: str, amount: float, category: str = 'other', **fields) -> dict:
+    return dict({'name': name, 'type': 'Normal', 'total_amount': amount,
+                 'status': 'Neachitat', 'category': category}, **fields)
+
+
+class QueryTest(unittest.TestCase):
+
+    def test_fold(self):
+        self.assertEqual(fold('Asigurări ȘCOALĂ'), 'asigurari scoala')
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query('Asig 150 150,5'),
+                         [('asig', True), ('150', False), ('150.50', False)])
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = Ledger()
+        self._add('2025_01', _expense('Asigurări auto', 150.5, 'bills'),
+                  _expense('Lidl', 150.0, 'food'))
+        month = self.ledger.open_month('2025_02')
+        self.ledger.add_expense(month, _expense('Netflix', 40.0, 'entertainment', auto_add=True,
+                                                recurring_indefinite=True))
+        month.data['other_income'].append({'source': 'Bonus anual', 'amount': 500.0})
+        self.ledger.commit_month(month)
+        self._add('2025_04', _expense('Omv', 200.0, 'transport'))
+        self.index = self.ledger.search_index
+
+    def _add(self, month_key: str, *expenses):
+        month = self.ledger.open_month(month_key)
+        for expense in expenses:
+            self.ledger.add_expense(month, expense)
+        self.ledger.commit_month(month)
+
+    def _found(self, query: str, **options):
+        return [(hit['month'], hit['text']) for hit in self.index.search(query, **options)]
+
+    def test_words_prefixes_and_amounts(self):
+        self.assertEqual(self._found('asigurari'), [('2025_01', 'Asigurări auto')])
+        self.assertEqual(self._found('asig auto'), [('2025_01', 'Asigurări auto')])
+        self.assertEqual(self._found('150'), [('2025_01', 'Asigurări auto'), ('2025_01', 'Lidl')])
+        self.assertEqual(self._found('150.5'), [('2025_01', 'Asigurări auto')])
+        self.assertEqual(self._found('bonus'), [('2025_02', 'Bonus anual')])
+        self.assertEqual(self._found('food'), [('2025_01', 'Lidl')])
+        self.assertEqual(self._found('nimic'), [])
+        self.assertEqual(self._found(''), [])
+
+    def test_recurring_expense_in_every_stored_month(self):
+        self.assertEqual(self._found('netflix'), [('2025_04', 'Netflix'), ('2025_02', 'Netflix')])
+        self.assertEqual(self._found('netflix', end='2025_03'), [('2025_02', 'Netflix')])
+        self.assertEqual(self._found('netflix', limit=1), [('2025_04', 'Netflix')])
+
+        # An instance edited in one month is found by its own words
+        month = self.ledger.open_month('2025_04')
+        self.ledger.update_expense(month, 1, dict(month.expenses[1], name='Netflix Premium'))
+        self.ledger.commit_month(month)
+        self.assertEqual(self._found('premium'), [('2025_04', 'Netflix Premium')])
+        self.assertEqual(self._found('netflix'),
+                         [('2025_04', 'Netflix Premium'), ('2025_02', 'Netflix')])
+
+    def test_kept_in_step_with_the_ledger(self):
+        self.assertEqual(self._found('omv'), [('2025_04', 'Omv')])
+        month = self.ledger.open_month('2025_04')
+        self.ledger.remove_expense(month, 0)
+        self.ledger.commit_month(month)
+        self.assertEqual(self._found('omv'), [])
+
+        self.ledger.remove_recurring_from_future_months('Netflix', '2025_02')
+        self.assertEqual(self._found('netflix'), [('2025_02', 'Netflix')])
+
+    def test_synonyms(self):
+        index = SearchIndex(self.ledger.data, {'food': ['Mâncare']})
+        self.assertEqual([hit['text'] for hit in index.search('mancare')], ['Lidl'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import unittest
+
+from financial_tracker.ledger import Ledger
+from financial_tracker.server import LedgerServer
+
+AUTH = {'authorization': 'Bearer secret'}
+
+
+def _json(payload):
+    return json.loads(payload) if isinstance(payload, bytes) else payload
+
+
+class HandleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LedgerServer(Ledger(), token='secret')
+
+    def _request(self, method: str, target: str, body=None):
+        data = b'' if body is None else json.dumps(body).encode()
+        status, payload = self.server.handle(method, target, AUTH, data)
+        return status, _json(payload)
+
+    def test_token(self):
+        self.assertEqual(self.server.handle('GET', '/months', {}, b'')[0], 401)
+        self.assertEqual(self.server.handle('GET', '/months', {'authorization': 'Bearer x'},
+                                            b'')[0], 401)
+
+    def test_expenses(self):
+        status, payload = self._request('POST', '/months/2025_01/expenses',
+                                        {'name': 'Lidl', 'total_amount': 12.5,
+                                         'status': 'Neachitat'})
+        self.assertEqual((status, payload['position']), (201, 0))
+        self.assertEqual(self._request('GET', '/months'), (200, ['2025_01']))
+        status, totals = self._request('GET', '/months/2025_01/totals')
+        self.assertEqual((status, totals['total_expenses']), (200, 12.5))
+
+        # Cached responses are dropped on every write
+        self._request('PUT', '/months/2025_01/expenses/0',
+                      {'name': 'Lidl', 'total_amount': 20.0, 'status': 'Achitat'})
+        self.assertEqual(self._request('GET', '/months/2025_01/totals')[1]['paid_amount'], 20.0)
+        status, results = self._request('GET', '/search?q=lidl')
+        self.assertEqual((status, [result['month'] for result in results]), (200, ['2025_01']))
+        self.assertEqual(self._request('DELETE', '/months/2025_01/expenses/0')[0], 200)
+        self.assertEqual(self._request('GET', '/months/2025_01/expenses'), (200, []))
+
+    def test_errors(self):
+        self.assertEqual(self._request('GET', '/months/2025_13')[0], 404)
+        self.assertEqual(self._request('GET', '/nope')[0], 404)
+        self.assertEqual(self._request('DELETE', '/months/2025_01/expenses/5')[0], 404)
+        self.assertEqual(self._request('POST', '/months/2025_01/expenses',
+                                       {'name': 'Lidl', 'total_amount': 'x'})[0], 400)
+        status, _ = self.server.handle('PUT', '/months/2025_01/income', AUTH,
+                                       b'{"monthly_income": NaN}')
+        self.assertEqual(status, 400)
+        self.assertEqual(self.server.ledger.data['monthly_data'], {})
+
+
+class ConnectionTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = LedgerServer(Ledger())
+        await self.server.start(port=0)
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def _send(self, head: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.port)
+        writer.write(head)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def test_request(self):
+        response = await self._send(b'GET /months HTTP/1.1\r\nConnection: close\r\n\r\n')
+        self.assertTrue(response.startswith(b'HTTP/1.1 200 OK\r\n'))
+        self.assertTrue(response.endswith(b'\r\n\r\n[]'))
+
+    async def test_line_longer_than_the_limit(self):
+        response = await self._send(b'GET /' + b'a' * 100000 + b' HTTP/1.1\r\n\r\n')
+        self.assertTrue(response.startswith(b'HTTP/1.1 414 '))
+        response = await self._send(b'GET /months HTTP/1.1\r\nX-Long: ' + b'a' * 100000
+                                    + b'\r\n\r\n')
+        self.assertTrue(response.startswith(b'HTTP/1.1 431 '))
+
+    async def test_too_many_headers(self):
+        headers = b''.join(b'X-%d: 1\r\n' % number for number in range(200))
+        response = await self._send(b'GET /months HTTP/1.1\r\n' + headers + b'\r\n')
+        self.assertTrue(response.startswith(b'HTTP/1.1 431 '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker.ledger import Ledger
+from financial_tracker.recurring import RULES_KEY
+from financial_tracker.storage import LazyMonths, ShardedStore, default_data, open_store
+
+
+def _month(amount: float) -> dict:
+    return {'income': {'monthly_income': amount}, 'expenses': [], 'other_income': []}
+
+
+class LazyMonthsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stored = {key: _month(float(number))
+                       for number, key in enumerate(('2025_01', '2025_02', '2025_03'))}
+        self.reads = []
+        self.months = LazyMonths(self.stored, self._load, cache_size=1)
+
+    def _load(self, key):
+        self.reads.append(key)
+        return self.stored[key]
+
+    def test_read_on_first_access(self):
+        self.assertEqual(list(self.months), ['2025_01', '2025_02', '2025_03'])
+        self.assertIn('2025_02', self.months)
+        self.assertEqual(self.reads, [])
+        self.assertEqual(self.months['2025_02'], self.stored['2025_02'])
+        self.months['2025_02']
+        self.assertEqual(self.reads, ['2025_02'])
+        with self.assertRaises(KeyError):
+            self.months['2025_04']
+
+    def test_dirty_and_evict(self):
+        self.months['2025_01']
+        self.months['2025_02']
+        self.months['2025_04'] = _month(4.0)
+        del self.months['2025_03']
+        self.assertEqual(self.months.dirty(), {'2025_03', '2025_04'})
+        self.assertEqual(len(self.months), 3)
+
+        # Dirty months stay in memory whatever the cache size
+        self.months.evict()
+        self.assertEqual([key for key in self.months if self.months.is_loaded(key)], ['2025_04'])
+        self.months.mark_clean()
+        self.months.evict()
+        self.assertEqual(self.months.dirty(), set())
+        self.assertTrue(self.months.is_loaded('2025_04'))
+
+
+class ShardedStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self._tmp.name) / 'financial_data'
+        self.store = ShardedStore(self.dir)
+        self.data = default_data()
+        for number, key in enumerate(('2025_01', '2025_02', '2025_03'), 1):
+            self.data['monthly_data'][key] = _month(float(number))
+        self.store.save(self.data)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(sorted(path.name for path in (self.dir / 'months').iterdir()),
+                         ['2025_01.json', '2025_02.json', '2025_03.json'])
+        loaded = ShardedStore(self.dir).load()
+        months = loaded['monthly_data']
+        self.assertIsInstance(months, LazyMonths)
+        self.assertFalse(any(months.is_loaded(key) for key in months))
+        self.assertEqual(dict(months), self.data['monthly_data'])
+        self.assertEqual(loaded['settings'], self.data['settings'])
+
+    def test_only_dirty_months_are_written(self):
+        store = ShardedStore(self.dir)
+        data = store.load()
+        data['monthly_data']['2025_02'] = _month(20.0)
+        del data['monthly_data']['2025_03']
+        ops = store.prepare(data, [])
+        self.assertEqual([(kind, key) for kind, key, _ in ops if kind in ('write', 'delete')],
+                         [('write', '2025_02'), ('delete', '2025_03')])
+        store.commit(ops)
+
+        loaded = ShardedStore(self.dir).load()['monthly_data']
+        self.assertEqual(sorted(loaded), ['2025_01', '2025_02'])
+        self.assertEqual(loaded['2025_02']['income']['monthly_income'], 20.0)
+        self.assertFalse((self.dir / 'months' / '2025_03.json').exists())
+
+    def test_one_file_per_recurring_rule(self):
+        ledger = Ledger.from_store(self.store)
+        month = ledger.open_month('2025_03')
+        for name in ('Chirie', 'Internet'):
+            ledger.add_expense(month, {'name': name, 'type': 'Normal', 'total_amount': 10.0,
+                                       'status': 'Neachitat', 'auto_add': True,
+                                       'recurring_indefinite': True})
+        ledger.commit_month(month)
+        ledger.save(self.store)
+        rule_ids = sorted(ledger.data[RULES_KEY])
+        self.assertEqual(sorted(path.stem for path in (self.dir / 'entries' / RULES_KEY).iterdir()),
+                         rule_ids)
+
+        ledger.remove_recurring_from_future_months('Chirie', '2025_03')
+        ledger.save(self.store)
+        loaded = Ledger.from_store(ShardedStore(self.dir))
+        self.assertEqual(loaded.data[RULES_KEY], ledger.data[RULES_KEY])
+        self.assertEqual([expense['name'] for expense in loaded.open_month('2025_04').expenses],
+                         ['Internet'])
+
+    def test_open_store_picks_up_the_directory(self):
+        store = open_store(self.dir.with_suffix('.json'))
+        self.assertIsInstance(store, ShardedStore)
+        self.assertEqual(sorted(store.load()['monthly_data']), ['2025_01', '2025_02', '2025_03'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from financial_tracker.ledger import Ledger
+from financial_tracker.recurring import RULES_KEY
+from financial_tracker.sqlite_store import SqliteStore, migrate_json_file
+from financial_tracker.storage import JournalStore, LazyMonths, default_data
+
+
+def _expense(name: str, amount: float, status: str = 'Neachitat') -> dict:
+    return {'name': name, 'type': 'Normal', 'total_amount': amount, 'status': status,
+            'category': 'other'}
+
+
+def _month(*expenses) -> dict:
+    return {'income': {'monthly_income': 2000.0}, 'expenses': list(expenses),
+            'other_income': [{'source': 'Bonus', 'amount': 100.0}],
+            'meal_tickets': {'worked_days': 20, 'value_per_day': 40.0}}
+
+
+class SqliteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        # Cleanups run last to first: the stores below are closed before this
+        self.addCleanup(self._tmp.cleanup)
+        self.path = Path(self._tmp.name) / 'financial_data.db'
+        self.store = SqliteStore(self.path)
+        self.data = default_data()
+        self.data['monthly_data']['2025_01'] = _month(_expense('Chirie', 900.0, 'Achitat'),
+                                                      _expense('Lidl', 120.5))
+        self.data['monthly_data']['2025_02'] = _month(_expense('Lidl', 80.0))
+        self.store.save(self.data)
+
+    def tearDown(self):
+        self.store.close()
+
+    def _open(self) -> SqliteStore:
+        store = SqliteStore(self.path)
+        self.addCleanup(store.close)
+        return store
+
+    def test_round_trip(self):
+        loaded = self._open().load()
+        self.assertIsInstance(loaded['monthly_data'], LazyMonths)
+        self.assertEqual(dict(loaded['monthly_data']), self.data['monthly_data'])
+        self.assertEqual(loaded['settings'], self.data['settings'])
+
+    def test_only_changed_rows_are_written(self):
+        store = self._open()
+        data = store.load()
+        month = data['monthly_data']['2025_01']
+        month['expenses'][1] = _expense('Lidl', 130.0)
+        data['monthly_data']['2025_01'] = month
+        (months, statements, _, _), = store.prepare(data, [])
+        self.assertEqual(months, ['2025_01'])
+        self.assertEqual([(sql.split(' (')[0], params[:2]) for sql, params in statements],
+                         [('INSERT OR REPLACE INTO expenses VALUES', ('2025_01', 1))])
+        store.commit([(months, statements, {}, False)])
+
+        # Removing an expense deletes the positions after the list
+        month['expenses'].pop(0)
+        data['monthly_data']['2025_01'] = month
+        store.save(data, ['2025_01'])
+        expenses = self._open().load()['monthly_data']['2025_01']['expenses']
+        self.assertEqual(expenses, [_expense('Lidl', 130.0)])
+
+    def test_deleted_month(self):
+        del self.data['monthly_data']['2025_02']
+        self.store.save(self.data, ['2025_02'])
+        self.assertEqual(list(self._open().load()['monthly_data']), ['2025_01'])
+
+    def test_find_expenses(self):
+        found = [(month_key, position) for month_key, position, _ in
+                 self.store.find_expenses(self.data, name='Lidl')]
+        self.assertEqual(found, [('2025_01', 1), ('2025_02', 0)])
+        found = [expense['name'] for _, _, expense in
+                 self.store.find_expenses(self.data, status='Neachitat', start='2025_02')]
+        self.assertEqual(found, ['Lidl'])
+
+    def test_recurring_rules(self):
+        store = self._open()
+        ledger = Ledger.from_store(store)
+        month = ledger.open_month('2025_02')
+        ledger.add_expense(month, dict(_expense('Internet', 50.0), auto_add=True,
+                                       recurring_indefinite=True))
+        ledger.commit_month(month)
+        ledger.save(store)
+        loaded = Ledger.from_store(self._open())
+        self.assertEqual(loaded.data[RULES_KEY], ledger.data[RULES_KEY])
+        self.assertEqual([expense['name'] for expense in loaded.open_month('2025_05').expenses],
+                         ['Internet'])
+
+    def test_migrate_json_file(self):
+        json_path = Path(self._tmp.name) / 'migrated.json'
+        JournalStore(json_path).save(self.data)
+        db_path = json_path.with_suffix('.db')
+        self.assertEqual(migrate_json_file(json_path, db_path), 2)
+        store = SqliteStore(db_path)
+        self.addCleanup(store.close)
+        self.assertEqual(dict(store.load()['monthly_data']), self.data['monthly_data'])
+
+
+if __name__ == '__main__':
+    unittest.main()
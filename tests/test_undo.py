@@ -0,0 +1,121 @@
+import unittest
+
+from financial_tracker.frozen import freeze
+from financial_tracker.ledger import Ledger
+from financial_tracker.locking import MISSING
+from financial_tracker.recurring import RULES_KEY
+from financial_tracker.undo import UndoError, UndoHistory, diff, patch
+
+
+def _expense(name: str, amount: float, **fields) -> dict:
+    return dict({'name': name, 'type': 'Normal', 'total_amount': amount,
+                 'status': 'Neachitat'}, **fields)
+
+
+class DiffPatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old = {'income': {'monthly_income': 100.0},
+                    'expenses': [_expense('a', 1.0), _expense('b', 2.0), _expense('c', 3.0)]}
+
+    def test_equal_values(self):
+        self.assertIsNone(diff(self.old, dict(self.old)))
+
+    def test_round_trip(self):
+        new = {'income': {'monthly_income': 150.0},
+               'expenses': [_expense('a', 1.0), _expense('c', 3.0), _expense('d', 4.0)],
+               'other_income': []}
+        delta = diff(self.old, new)
+        self.assertEqual(patch(self.old, delta), new)
+        self.assertEqual(patch(new, delta, reverse=True), self.old)
+
+    def test_list_delta_keeps_only_the_changed_items(self):
+        new = dict(self.old, expenses=[self.old['expenses'][0], self.old['expenses'][2]])
+        kind, start, removed, added = diff(self.old, new)[1]['expenses']
+        self.assertEqual((kind, start, removed, added), ('list', 1, [_expense('b', 2.0)], []))
+
+    def test_removed_key(self):
+        new = {'expenses': self.old['expenses']}
+        delta = diff(self.old, new)
+        self.assertEqual(delta[1]['income'][0], 'set')
+        self.assertIs(delta[1]['income'][2], MISSING)
+        self.assertEqual(patch(self.old, delta), new)
+
+    def test_patch_leaves_its_input_alone(self):
+        frozen = freeze(self.old)
+        new = dict(self.old, income={'monthly_income': 1.0})
+        patched = patch(frozen, diff(self.old, new))
+        self.assertEqual(patched, new)
+        self.assertEqual(frozen, self.old)
+        # What did not change is shared
+        self.assertIs(patched['expenses'], frozen['expenses'])
+
+    def test_changed_since(self):
+        new = dict(self.old, income={'monthly_income': 1.0})
+        delta = diff(self.old, new)
+        with self.assertRaises(UndoError):
+            patch(dict(self.old, income={'monthly_income': 2.0}), delta, reverse=True)
+        edited = dict(self.old, expenses=[_expense('x', 9.0)])
+        with self.assertRaises(UndoError):
+            patch(edited, diff(self.old, dict(self.old, expenses=[])))
+
+
+class LedgerUndoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = Ledger()
+        self.ledger.history = UndoHistory()
+
+    def _names(self, month_key: str):
+        return [expense['name'] for expense in self.ledger.open_month(month_key).expenses]
+
+    def test_undo_and_redo_across_months(self):
+        ledger = self.ledger
+        month = ledger.open_month('2025_01')
+        ledger.add_expense(month, _expense('a', 1.0))
+        ledger.commit_month(month)
+        month = ledger.open_month('2025_02')
+        ledger.add_expense(month, _expense('b', 2.0))
+        ledger.commit_month(month)
+
+        self.assertEqual(ledger.undo().month, '2025_02')
+        self.assertEqual(self._names('2025_02'), [])
+        self.assertEqual(ledger.undo().month, '2025_01')
+        self.assertNotIn('2025_01', ledger.data['monthly_data'])
+        self.assertIsNone(ledger.undo())
+
+        ledger.redo()
+        ledger.redo()
+        self.assertEqual(self._names('2025_01'), ['a'])
+        self.assertEqual(self._names('2025_02'), ['b'])
+        self.assertEqual(ledger.dirty_months, {'2025_01', '2025_02'})
+
+    def test_undo_of_a_recurring_expense(self):
+        ledger = self.ledger
+        month = ledger.open_month('2025_01')
+        ledger.add_expense(month, _expense('Chirie', 10.0, auto_add=True,
+                                           recurring_indefinite=True))
+        ledger.commit_month(month)
+        self.assertEqual(self._names('2025_03'), ['Chirie'])
+
+        ledger.undo()
+        self.assertEqual(ledger.data[RULES_KEY], {})
+        self.assertEqual(self._names('2025_03'), [])
+        ledger.redo()
+        self.assertEqual(self._names('2025_03'), ['Chirie'])
+
+    def test_undo_refuses_changed_data(self):
+        ledger = self.ledger
+        month = ledger.open_month('2025_01')
+        ledger.add_expense(month, _expense('a', 1.0))
+        ledger.commit_month(month)
+        # Changed without going through the ledger
+        stored = ledger.data['monthly_data']['2025_01']
+        ledger.data['monthly_data']['2025_01'] = dict(stored, expenses=[_expense('z', 5.0)])
+        with self.assertRaises(UndoError):
+            ledger.undo()
+        self.assertIsNone(ledger.undo())
+
+
+if __name__ == '__main__':
+    unittest.main()